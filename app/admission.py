@@ -0,0 +1,354 @@
+"""
+Admission control and per-agent bulkheads
+- AdmissionController: global in-flight limit for /chat with a bounded FIFO
+  wait queue; sheds load with 503 + Retry-After when the queue is full or the
+  wait exceeds ADMISSION_QUEUE_TIMEOUT.
+- Bulkhead: per-agent concurrency limit around graph nodes so a burst of
+  Prophet fits or SQL queries cannot starve cheap General_Agent chats or
+  exhaust MySQL connections; rejects with 429 + Retry-After when saturated.
+  Graph nodes queue for their slot on the event loop (abulkheaded), so
+  waiting requests don't occupy the executor threads nodes run on.
+
+Configuration (environment):
+  MAX_IN_FLIGHT=64  ADMISSION_MAX_QUEUE=128  ADMISSION_QUEUE_TIMEOUT=10
+  AGENT_CONCURRENCY="SQL_Agent=8,Forecast_Agent=2"   (overrides defaults)
+  AGENT_MAX_WAITING=32  AGENT_QUEUE_TIMEOUT=30
+"""
+import os
+import math
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional
+
+from app.metrics import metrics
+
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 64))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 128))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+AGENT_MAX_WAITING = int(os.getenv("AGENT_MAX_WAITING", 32))
+AGENT_QUEUE_TIMEOUT = float(os.getenv("AGENT_QUEUE_TIMEOUT", 30))
+
+# Prophet fits are CPU-bound: keep them to half the cores by default
+DEFAULT_AGENT_CONCURRENCY = {
+    "SQL_Agent": 8,
+    "Forecast_Agent": max(1, (os.cpu_count() or 2) // 2),
+    "RAG_Agent": 4,
+    "Web_Agent": 16,
+    "General_Agent": 32,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and Retry-After seconds."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _clamp_retry(seconds: float) -> int:
+    return int(min(max(math.ceil(seconds), 1), 60))
+
+
+class AdmissionController:
+    """Global in-flight limit with a bounded wait queue (runs on the event loop)."""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        # EWMA of request service time, used for Retry-After hints
+        self._service_time = 1.0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        return _clamp_retry(self._service_time * (self.queue_depth + 1) / max(self.max_in_flight, 1))
+
+    def _publish(self):
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        metrics.set_gauge("admission_queue_depth", self.queue_depth)
+
+    def _reject(self, reason: str, label: str):
+        metrics.inc("admission_rejected_total", reason=label)
+        raise AdmissionRejected(503, reason, self.retry_after())
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject("Server busy: admission queue is full", "queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._publish()
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(f"Server busy: no capacity within {self.queue_timeout:.0f}s", "queue_timeout")
+        except BaseException:
+            # Cancelled (client went away) after the slot was already handed over
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            metrics.inc("admission_queue_wait_seconds_total", time.perf_counter() - queued_at)
+            self._publish()
+
+    def release(self):
+        # Hand the slot directly to the next live waiter (FIFO)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        metrics.inc("admission_admitted_total")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._service_time = 0.9 * self._service_time + 0.1 * (time.perf_counter() - started)
+            self.release()
+
+
+class _SlotWaiter:
+    """A caller queued for a bulkhead slot: a blocked thread or an awaiting coroutine."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+class Bulkhead:
+    """
+    Per-agent concurrency limit around graph nodes, with a FIFO of waiters.
+    Graph nodes wait for a slot on the event loop (aacquire, via abulkheaded)
+    and only then take an executor thread, so a queued burst for one agent
+    can't tie up the default executor the other agents run on. acquire()
+    still blocks the calling thread, for nodes run outside the graph
+    (speculative runs, sync callers).
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int = AGENT_MAX_WAITING, timeout: float = AGENT_QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self._service_time = 1.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def saturated(self) -> bool:
+        return self.active >= self.limit and self.waiting >= self.max_waiting
+
+    def retry_after(self) -> int:
+        return _clamp_retry(self._service_time * (self.waiting + 1) / max(self.limit, 1))
+
+    def _publish(self):
+        metrics.set_gauge("bulkhead_active", self.active, agent=self.name)
+        metrics.set_gauge("bulkhead_waiting", self.waiting, agent=self.name)
+
+    def _reject(self, reason: str, label: str):
+        metrics.inc("bulkhead_rejected_total", agent=self.name, reason=label)
+        raise AdmissionRejected(429, reason, self.retry_after())
+
+    def _enter(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_SlotWaiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter); rejects when the queue is full."""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self._publish()
+                return None
+            if self.waiting >= self.max_waiting:
+                self._reject(f"{self.name} is saturated, try again later", "queue_full")
+            waiter = _SlotWaiter(loop)
+            self._waiters.append(waiter)
+            self._publish()
+            return waiter
+
+    def _abandon(self, waiter: _SlotWaiter) -> bool:
+        """Leave the queue after a timeout/cancel; True if the slot was handed over in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._publish()
+            return False
+
+    def release(self, started: Optional[float] = None):
+        with self._lock:
+            if started is not None:
+                self._service_time = 0.9 * self._service_time + 0.1 * (time.perf_counter() - started)
+            if self._waiters:
+                # Hand the slot straight to the next waiter (FIFO); active stays the same
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self.active -= 1
+            self._publish()
+
+    def _timed_out(self):
+        self._reject(f"{self.name} is saturated (waited {self.timeout:.0f}s)", "queue_timeout")
+
+    @contextmanager
+    def acquire(self):
+        waiter = self._enter()
+        if waiter is not None and not waiter.event.wait(self.timeout) and not self._abandon(waiter):
+            self._timed_out()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(started)
+
+    async def aacquire(self):
+        """Wait for a slot without holding a thread; pair with release()."""
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(waiter):
+                self._timed_out()
+        except BaseException:
+            # Cancelled (request gone): give back a slot that was already handed over
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def state(self) -> Dict[str, int]:
+        return {"limit": self.limit, "active": self.active, "waiting": self.waiting, "max_waiting": self.max_waiting}
+
+
+def _parse_agent_concurrency(spec: str) -> Dict[str, int]:
+    limits = dict(DEFAULT_AGENT_CONCURRENCY)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+admission = AdmissionController()
+bulkheads: Dict[str, Bulkhead] = {
+    name: Bulkhead(name, limit)
+    for name, limit in _parse_agent_concurrency(os.getenv("AGENT_CONCURRENCY", "")).items()
+}
+
+
+def bulkheaded(agent: str):
+    """Decorator that runs a graph node inside the agent's bulkhead (blocking the calling thread while queued)."""
+    def decorator(fn):
+        bulkhead = bulkheads.get(agent)
+        if bulkhead is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(state):
+            with bulkhead.acquire():
+                return fn(state)
+        return wrapper
+    return decorator
+
+
+def abulkheaded(agent: str):
+    """
+    Async counterpart of bulkheaded for a sync node: queue for the slot on the
+    event loop, then run the node on the default executor. The slot is held
+    until the thread finishes, even if the request is cancelled meanwhile.
+    """
+    def decorator(fn):
+        bulkhead = bulkheads.get(agent)
+
+        @functools.wraps(fn)
+        async def wrapper(state):
+            loop = asyncio.get_running_loop()
+            if bulkhead is None:
+                return await loop.run_in_executor(None, contextvars.copy_context().run, fn, state)
+            await bulkhead.aacquire()
+            started = time.perf_counter()
+            try:
+                future = loop.run_in_executor(None, contextvars.copy_context().run, fn, state)
+            except BaseException:
+                bulkhead.release(started)
+                raise
+
+            def done(f):
+                bulkhead.release(started)
+                if not f.cancelled():
+                    f.exception()  # retrieved here if nobody awaits it any more
+            future.add_done_callback(done)
+            return await asyncio.shield(future)
+        return wrapper
+    return decorator
+
+
+def likely_agents(query: str) -> List[str]:
+    """Cheap guess of the agents a query will hit, for early rejection before any LLM call."""
+    from app.routing import keyword_route
+
+    lower = (query or "").lower()
+    agents = []
+    routed = keyword_route(query)
+    if routed:
+        agents.append(routed)
+    if "forecast" in lower or "predict" in lower:
+        agents.append("Forecast_Agent")
+    return agents
+
+
+def check_agents(query: str):
+    """Fail fast with 429 when an agent this query needs is already saturated."""
+    for agent in likely_agents(query):
+        bulkhead = bulkheads.get(agent)
+        if bulkhead is not None and bulkhead.saturated():
+            metrics.inc("bulkhead_rejected_total", agent=agent, reason="early")
+            raise AdmissionRejected(429, f"{agent} is saturated, try again later", bulkhead.retry_after())
+
+
+def admission_state() -> Dict[str, object]:
+    return {
+        "in_flight": admission.in_flight,
+        "max_in_flight": admission.max_in_flight,
+        "queue_depth": admission.queue_depth,
+        "max_queue": admission.max_queue,
+        "bulkheads": {name: b.state() for name, b in bulkheads.items()},
+    }
@@ -1,6 +1,4 @@
 # Note: File renamed from forecasting_agent.py to forecast_agent.py
-import pandas as pd
-from prophet import Prophet
 from langchain_core.tools import tool
 from langgraph.prebuilt import create_react_agent
 from dotenv import load_dotenv
@@ -8,6 +6,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app.llm_provider import get_llm
+from app.tracing import span
+from app.deadline import DeadlineExceeded, check_deadline
 
 @tool
 def generate_forecast(data: list, periods: int = 90):
@@ -26,6 +26,10 @@ def generate_forecast(data: list, periods: int = 90):
         if not data or len(data) == 0:
             return "Error: No data provided. I need historical time-series data with date and value columns."
 
+        # Heavy deps are loaded on first forecast, not at API startup
+        import pandas as pd
+        from prophet import Prophet
+
         df = pd.DataFrame(data)
         
         # Intelligent column mapping
@@ -55,13 +59,17 @@ def generate_forecast(data: list, periods: int = 90):
         # Convert ds to datetime
         df['ds'] = pd.to_datetime(df['ds'])
         
-        # Fit Prophet model
+        # Fit Prophet model (can't be interrupted, so don't start one for a request that's out of time)
+        check_deadline("prophet.fit")
         m = Prophet()
-        m.fit(df)
+        with span("prophet.fit", rows=len(df)):
+            m.fit(df)
         
         # Generate future dataframe
+        check_deadline("prophet.predict")
         future = m.make_future_dataframe(periods=periods)
-        forecast = m.predict(future)
+        with span("prophet.predict", periods=periods):
+            forecast = m.predict(future)
         
         # Get last predicted value
         last_val = forecast.iloc[-1]['yhat']
@@ -69,6 +77,8 @@ def generate_forecast(data: list, periods: int = 90):
         
         return f"✅ Forecast Success!\n- Predicted value in {periods} days: **{last_val:.2f}**\n- Overall trend: {trend}\n- Confidence interval: [{forecast.iloc[-1]['yhat_lower']:.2f}, {forecast.iloc[-1]['yhat_upper']:.2f}]"
         
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return f"❌ Forecast Error: {str(e)}"
 
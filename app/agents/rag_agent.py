@@ -1,36 +1,202 @@
 import os
-from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+import hmac
+import json
+import shutil
+import secrets
+import hashlib
+import tempfile
+import threading
+import contextlib
 from langchain_core.tools import Tool
 from langgraph.prebuilt import create_react_agent
 
 from app.llm_provider import get_llm
+from app.tracing import span
+from app.fakes import mock_enabled
+from app.embeddings import EMBEDDING_MODEL, create_embeddings, get_embedding_backend
 
 # GLOBAL CACHE (So we don't rebuild index on every request)
 _vectorstore_cache = None
+_embeddings_cache = None
+_index_lock = threading.Lock()
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process lock only
+    fcntl = None
+
+# Built indexes are persisted here and reused while the corpus is unchanged.
+# FAISS.load_local unpickles, so a persisted index is only loaded when its
+# files match the HMAC-SHA256 in its manifest. The key is FAISS_INDEX_KEY, or
+# a random key generated once into FAISS_INDEX_KEY_FILE (0600); set
+# FAISS_INDEX_KEY (or keep the key file outside the writable cache) so that
+# write access to the cache alone can't forge an index.
+INDEX_DIR = os.getenv("FAISS_INDEX_DIR", os.path.join(os.getcwd(), ".cache", "faiss_index"))
+INDEX_KEY_FILE = os.getenv("FAISS_INDEX_KEY_FILE", INDEX_DIR.rstrip(os.sep) + ".key")
+INDEX_FILES = ("index.faiss", "index.pkl")
+
+def _get_embeddings():
+    global _embeddings_cache
+    if _embeddings_cache is None:
+        # Create Embeddings (Free Local Model - No API Cost)
+        with span("rag.load_embedding_model"):
+            if mock_enabled():
+                # Offline: hash-based vectors, no model download
+                from langchain_core.embeddings import DeterministicFakeEmbedding
+                _embeddings_cache = DeterministicFakeEmbedding(size=384)
+            else:
+                # EMBEDDING_BACKEND: torch (default), onnx or onnx-int8 (see app/embeddings.py)
+                _embeddings_cache = create_embeddings()
+    return _embeddings_cache
+
+def _corpus_fingerprint(data_dir: str) -> str:
+    """Hash of file names, sizes and mtimes under data/ plus the embedding setup."""
+    # Vectors from different backends aren't interchangeable, so each gets its own index
+    h = hashlib.sha1(f"{EMBEDDING_MODEL}|{get_embedding_backend()}|mock={mock_enabled()}".encode())
+    for root, _, files in sorted(os.walk(data_dir)):
+        for name in sorted(files):
+            if name.lower().endswith((".pdf", ".txt")):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                h.update(f"{os.path.relpath(path, data_dir)}|{st.st_size}|{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+def _index_key() -> bytes:
+    key = os.getenv("FAISS_INDEX_KEY")
+    if key:
+        return key.encode()
+    try:
+        with open(INDEX_KEY_FILE, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(INDEX_KEY_FILE) or ".", exist_ok=True)
+    try:
+        fd = os.open(INDEX_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:  # another worker created it first
+        with open(INDEX_KEY_FILE, "rb") as f:
+            return f.read()
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_bytes(32))
+    with open(INDEX_KEY_FILE, "rb") as f:
+        return f.read()
+
+def _sign_index(index_dir: str) -> dict:
+    key = _index_key()
+    signatures = {}
+    for name in INDEX_FILES:
+        with open(os.path.join(index_dir, name), "rb") as f:
+            signatures[name] = hmac.new(key, f.read(), hashlib.sha256).hexdigest()
+    return signatures
+
+def _verified(index_dir: str, manifest: dict) -> bool:
+    expected = manifest.get("hmac") or {}
+    try:
+        actual = _sign_index(index_dir)
+    except FileNotFoundError:
+        return False
+    return all(hmac.compare_digest(actual[n], expected.get(n, "")) for n in INDEX_FILES)
+
+@contextlib.contextmanager
+def _index_file_lock(exclusive: bool):
+    """Shared lock to read the persisted index, exclusive to build/replace it (all worker processes)."""
+    os.makedirs(os.path.dirname(INDEX_DIR.rstrip(os.sep)) or ".", exist_ok=True)
+    with open(INDEX_DIR.rstrip(os.sep) + ".lock", "a") as f:  # closing releases the flock
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+def _save_index(store, manifest: dict):
+    """Write into a temp dir next to INDEX_DIR, then swap it in (caller holds the exclusive lock)."""
+    parent = os.path.dirname(INDEX_DIR.rstrip(os.sep)) or "."
+    tmp = tempfile.mkdtemp(prefix=".faiss_index-", dir=parent)
+    try:
+        store.save_local(tmp)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({**manifest, "hmac": _sign_index(tmp)}, f)
+        old = None
+        if os.path.exists(INDEX_DIR):
+            old = tempfile.mkdtemp(prefix=".faiss_index-old-", dir=parent)
+            os.replace(INDEX_DIR, os.path.join(old, "index"))
+        os.replace(tmp, INDEX_DIR)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+def _load_persisted(fingerprint: str, embeddings):
+    """The persisted index if it matches the corpus and its signature, else None."""
+    from langchain_community.vectorstores import FAISS
+
+    try:
+        with open(os.path.join(INDEX_DIR, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("fingerprint") != fingerprint:
+        return None
+    if not _verified(INDEX_DIR, manifest):
+        print("[RAG] ⚠️ Persisted index failed its signature check, rebuilding it")
+        return None
+    try:
+        with span("rag.load_faiss_index"):
+            # Safe to unpickle: the files are the ones this deployment signed
+            store = FAISS.load_local(INDEX_DIR, embeddings, allow_dangerous_deserialization=True)
+    except (FileNotFoundError, ValueError, RuntimeError):
+        return None
+    print(f"[RAG] ✅ Loaded persisted index ({manifest.get('chunks')} chunks).")
+    return store
 
 def _get_vectorstore():
     global _vectorstore_cache
     if _vectorstore_cache is not None:
         return _vectorstore_cache
 
+    with _index_lock:
+        if _vectorstore_cache is None:
+            _vectorstore_cache = _load_or_build_index()
+    return _vectorstore_cache
+
+def _load_or_build_index():
     data_dir = os.path.join(os.getcwd(), "data")
     if not os.path.isdir(data_dir):
         print(f"[RAG] ⚠️ Data directory not found: {data_dir}")
         return None
 
+    # Heavy deps (loaders, FAISS, sentence-transformers/torch) are loaded on first use
+    fingerprint = _corpus_fingerprint(data_dir)
+    embeddings = _get_embeddings()
+
+    # 0. Reuse the persisted index if the corpus hasn't changed
+    with _index_file_lock(exclusive=False):
+        store = _load_persisted(fingerprint, embeddings)
+    if store is not None:
+        return store
+
+    # One worker builds; the others wait here and then load what it saved
+    with _index_file_lock(exclusive=True):
+        store = _load_persisted(fingerprint, embeddings)
+        if store is not None:
+            return store
+        return _build_index(data_dir, fingerprint, embeddings)
+
+def _build_index(data_dir: str, fingerprint: str, embeddings):
+    from langchain_community.vectorstores import FAISS
+
     print("[RAG] 🔄 Indexing Confidential Documents...")
+    from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     
     # 1. Load Documents (Supports PDF and TXT)
     # Ensure you have a 'data/' folder with your files
-    loader = DirectoryLoader(data_dir, glob="**/*.pdf", loader_cls=PyPDFLoader)
-    docs = loader.load()
-    
-    # Also load text files
-    txt_loader = DirectoryLoader(data_dir, glob="**/*.txt", loader_cls=TextLoader)
-    docs.extend(txt_loader.load())
+    with span("rag.load_documents"):
+        loader = DirectoryLoader(data_dir, glob="**/*.pdf", loader_cls=PyPDFLoader)
+        docs = loader.load()
+        
+        # Also load text files
+        txt_loader = DirectoryLoader(data_dir, glob="**/*.txt", loader_cls=TextLoader)
+        docs.extend(txt_loader.load())
 
     if not docs:
         print("[RAG] ⚠️ No documents found in ./data folder!")
@@ -38,15 +204,20 @@ def _get_vectorstore():
 
     # 2. Split into Chunks (Standard 1000 char chunks)
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(docs)
+    with span("rag.split", documents=len(docs)):
+        splits = text_splitter.split_documents(docs)
 
-    # 3. Create Embeddings (Free Local Model - No API Cost)
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-    # 4. Build Vector DB
-    _vectorstore_cache = FAISS.from_documents(splits, embeddings)
+    # 3. Build Vector DB
+    with span("rag.build_faiss_index", chunks=len(splits)):
+        store = FAISS.from_documents(splits, embeddings)
     print(f"[RAG] ✅ Indexed {len(splits)} chunks.")
-    return _vectorstore_cache
+
+    # 4. Persist for the next process (other workers, restarts, pre-fork master)
+    try:
+        _save_index(store, {"fingerprint": fingerprint, "chunks": len(splits)})
+    except OSError as e:
+        print(f"[RAG] ⚠️ Could not persist index: {e}")
+    return store
 
 def get_rag_agent():
     vectorstore = _get_vectorstore()
@@ -61,7 +232,8 @@ def get_rag_agent():
     
     def search_docs(query: str) -> str:
         """Search internal documents and return results."""
-        docs = retriever.invoke(query)
+        with span("faiss.search"):
+            docs = retriever.invoke(query)
         return "\n".join([doc.page_content for doc in docs]) if docs else "No documents found."
     
     tool = Tool(
@@ -1,7 +1,7 @@
 import os
+import contextvars
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from langchain_community.utilities import SQLDatabase
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 import json
@@ -10,23 +10,126 @@ import json
 load_dotenv()
 
 from app.llm_provider import get_llm
+from app.fakes import mock_enabled, get_mock_database
+from app.admission import bulkheads
+from app.tables import TABLE_MAX_ROWS, TABLE_PREVIEW_ROWS, Table, table_store
+from app.deadline import current_deadline
+
+# GLOBAL CACHE (engine + reflected schema are reused across requests)
+_db_cache = None
+
+def get_database():
+    global _db_cache
+    if _db_cache is not None:
+        return _db_cache
+
+    if mock_enabled():
+        # Offline: seeded in-memory SQLite stand-in for MySQL
+        _db_cache = get_mock_database()
+        return _db_cache
+
+    from langchain_community.utilities import SQLDatabase
 
-def get_sql_agent():
-    # 1. Connect to Database
     user = os.getenv("MYSQL_USER", "root")
     password = os.getenv("MYSQL_PASSWORD", "owais")
     host = os.getenv("MYSQL_HOST", "localhost")
     port = os.getenv("MYSQL_PORT", "3306")
     db_name = os.getenv("MYSQL_DATABASE", "employees")
     
-    db = SQLDatabase.from_uri(f"mysql+pymysql://{user}:{password}@{host}:{port}/{db_name}")
+    # Size the pool to the SQL_Agent bulkhead so bursts queue in the app, not on MySQL
+    pool_size = bulkheads["SQL_Agent"].limit if "SQL_Agent" in bulkheads else 5
+    _db_cache = SQLDatabase.from_uri(
+        f"mysql+pymysql://{user}:{password}@{host}:{port}/{db_name}",
+        engine_args={"pool_size": pool_size, "max_overflow": 0, "pool_pre_ping": True},
+    )
+    return _db_cache
+
+def get_engine():
+    """SQLAlchemy engine behind the agent's database (shared pool; MySQL or the mock SQLite)."""
+    return get_database()._engine
+
+# Deadline of the statement running in this context (SQLite progress handler)
+_statement_deadline: contextvars.ContextVar = contextvars.ContextVar("sentinel_statement_deadline", default=None)
+
+def _sqlite_progress() -> int:
+    """Called by SQLite in the thread running the statement; non-zero aborts it."""
+    deadline = _statement_deadline.get()
+    return 1 if deadline is not None and deadline.expired else 0
+
+@contextmanager
+def statement_deadline(conn, deadline):
+    """Bound the statement by the request's remaining time (MySQL MAX_EXECUTION_TIME, SQLite progress handler)."""
+    if deadline is None:
+        yield
+        return
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        conn.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME={max(1, int(deadline.remaining() * 1000))}")
+        try:
+            yield
+        finally:
+            # Pooled connection: don't leak this request's limit to the next one
+            conn.exec_driver_sql("SET SESSION MAX_EXECUTION_TIME=0")
+    elif dialect == "sqlite":
+        # The mock DB is one connection shared by every request (StaticPool): install one
+        # handler that reads the deadline of whichever context is running the statement
+        conn.connection.driver_connection.set_progress_handler(_sqlite_progress, 10000)
+        token = _statement_deadline.set(deadline)
+        try:
+            yield
+        finally:
+            _statement_deadline.reset(token)
+    else:
+        yield
+
+def make_query_tool(db):
+    """
+    Drop-in replacement for the toolkit's sql_db_query that also captures the
+    result set: the LLM gets a preview, the full table rides along as the
+    ToolMessage artifact (see app/tables.py).
+    """
+    from langchain_core.tools import tool
+    from sqlalchemy import text
+
+    @tool("sql_db_query", response_format="content_and_artifact")
+    def sql_db_query(query: str):
+        """Input to this tool is a detailed and correct SQL query, output is a result from the database. If the query is not correct, an error message will be returned. If an error is returned, rewrite the query, check the query, and try again. If you encounter an issue with Unknown column 'xxxx' in 'field list', use sql_db_schema to query the correct table fields."""
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("sql")
+        try:
+            with db._engine.begin() as conn, statement_deadline(conn, deadline):
+                result = conn.execute(text(query))
+                if not result.returns_rows:
+                    return "", None
+                columns = list(result.keys())
+                rows = [tuple(r) for r in result.fetchmany(TABLE_MAX_ROWS + 1)]
+        except Exception as e:
+            return f"Error: {e}", None
+
+        truncated = len(rows) > TABLE_MAX_ROWS
+        table = table_store.put(Table(query, columns, rows[:TABLE_MAX_ROWS], truncated))
+        print(f"[SQL_TOOL] Captured {table.total_rows} row(s) x {len(columns)} col(s) as table {table.id}")
+        content = str(rows[:TABLE_PREVIEW_ROWS])
+        if table.total_rows > TABLE_PREVIEW_ROWS:
+            content += (f"\n(showing the first {TABLE_PREVIEW_ROWS} of {table.total_rows} rows; "
+                        f"the full result is attached to the response as table {table.id}, "
+                        f"so summarize instead of listing every row)")
+        return content, table.summary()
+
+    return sql_db_query
+
+def get_sql_agent():
+    # 1. Connect to Database
+    db = get_database()
 
     # 2. Use shared LLM provider (llama3.2:3b)
     llm = get_llm(temperature=0)
 
     # 3. Create Toolkit (Auto-handles schema & execution)
+    from langchain_community.agent_toolkits import SQLDatabaseToolkit
     toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-    tools = toolkit.get_tools()
+    tools = [t for t in toolkit.get_tools() if t.name != "sql_db_query"] + [make_query_tool(db)]
 
     # 4. Create the React Agent
     return create_react_agent(llm, tools)
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+In-flight request coalescing
+Concurrent /chat requests with the same normalized query and session context
+attach to a single graph execution and share its result, so dashboard
+refreshes and client retries don't repeat identical LLM/SQL/search work.
+Only requests that overlap in time are merged; nothing is cached afterwards.
+When every caller of an execution has gone away (client disconnects), the
+execution itself is cancelled. A caller that joins someone else's execution
+waits at most its own timeout; it then gets FollowerTimeout carrying the
+leader's progress object so it can answer with what is there so far.
+Callers decide whether a shared result is good enough for them: main
+re-runs a follower whose leader only produced a partial (timed-out) answer.
+"""
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.metrics import metrics
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query."""
+    return " ".join((query or "").lower().split())
+
+
+def coalesce_key(query: str, session_id: Optional[str] = None) -> str:
+    raw = f"{session_id or ''}\x00{normalize_query(query)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class FollowerTimeout(Exception):
+    """A coalesced follower ran out of its own time before the shared execution finished."""
+
+    def __init__(self, progress: Any):
+        super().__init__("coalesced request timed out before the shared execution finished")
+        self.progress = progress
+
+
+class RequestCoalescer:
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._progress: Dict[asyncio.Task, Any] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._progress.pop(task, None)
+        metrics.set_gauge("coalesce_in_flight", len(self._inflight))
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]], timeout: Optional[float] = None,
+                  progress: Any = None) -> Tuple[Any, bool]:
+        """
+        Run factory() once per key among concurrent callers.
+        Returns (result, shared) where shared is True for callers that joined
+        an execution started by someone else. A leader registers progress (an
+        object its execution updates); a follower waits at most timeout seconds
+        and then raises FollowerTimeout with the leader's progress.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            metrics.inc("coalesce_followers_total")
+        else:
+            metrics.inc("coalesce_leaders_total")
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._progress[task] = progress
+            task.add_done_callback(lambda t: self._done(key, t))
+            metrics.set_gauge("coalesce_in_flight", len(self._inflight))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shield: one caller disconnecting must not cancel the work others are waiting on
+            if not shared or timeout is None:
+                return await asyncio.shield(task), shared
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), max(0.0, timeout)), shared
+            except asyncio.TimeoutError:
+                metrics.inc("coalesce_follower_timeouts_total")
+                raise FollowerTimeout(self._progress.get(task)) from None
+        finally:
+            left = self._waiters[task] - 1
+            if left:
+                self._waiters[task] = left
+            else:
+                del self._waiters[task]
+                if not task.done():
+                    # ...but once nobody is waiting, stop it
+                    metrics.inc("coalesce_abandoned_total")
+                    task.cancel()
+
+
+coalescer = RequestCoalescer()
@@ -0,0 +1,213 @@
+"""
+Per-request deadlines and cancellation
+Every /chat request gets a Deadline (X-Sentinel-Timeout header or ?timeout=,
+otherwise REQUEST_TIMEOUT seconds) that travels through graph state. Graph
+nodes run in worker threads that can't be killed, so work stops
+cooperatively at the next boundary once the deadline passes or the request
+is cancelled (client disconnected):
+  - with_deadline(node): checks before a node runs and exposes the deadline
+    to code inside it via current_deadline() (SQL tool, Prophet fits)
+  - DeadlineCallbackHandler: fails the next LLM, tool or retriever call and
+    remembers the latest intermediate output for a partial answer
+The API stops waiting at the deadline and answers with the best partial
+result it has (see main._run_chat).
+
+Configuration (environment):
+  REQUEST_TIMEOUT=50  (below the UI's 60 s client timeout)
+  MAX_REQUEST_TIMEOUT=300
+"""
+import os
+import time
+import functools
+import contextvars
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.metrics import metrics
+
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 50))
+MAX_REQUEST_TIMEOUT = float(os.getenv("MAX_REQUEST_TIMEOUT", 300))
+
+# Deadline of the graph node running in this thread/context (None outside requests)
+_current_deadline: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("sentinel_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised inside the graph when its request timed out or was cancelled."""
+
+    def __init__(self, stage: str, reason: str = "timeout"):
+        super().__init__(f"Request {reason} before {stage}")
+        self.stage = stage
+        self.reason = reason
+
+
+class Deadline:
+    """
+    Absolute deadline plus a cancel flag, shared by reference between the API
+    and worker threads. A child (e.g. speculative work) can be cancelled on
+    its own and also expires with its parent.
+    """
+
+    def __init__(self, timeout: float = REQUEST_TIMEOUT, parent: Optional["Deadline"] = None):
+        self.parent = parent
+        self.started = time.monotonic()
+        self.at = parent.at if parent is not None else self.started + timeout
+        self.timeout = self.at - self.started
+        self.cancel_reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+
+    def child(self) -> "Deadline":
+        return Deadline(parent=self)
+
+    def remaining(self) -> float:
+        if self.expired:
+            return 0.0
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        if self.parent is not None and self.parent.expired:
+            return True
+        return self.cancel_reason is not None or time.monotonic() >= self.at
+
+    @property
+    def ended_at(self) -> float:
+        return min(self.at, self.cancelled_at) if self.cancelled_at is not None else self.at
+
+    def cancel(self, reason: str):
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+            self.cancelled_at = time.monotonic()
+            metrics.inc("deadline_cancelled_total", reason=reason)
+
+    def check(self, stage: str):
+        if self.expired:
+            reason = self.cancel_reason or (self.parent.cancel_reason if self.parent is not None else None) or "timeout"
+            metrics.inc("deadline_exceeded_total", stage=stage, reason=reason)
+            raise DeadlineExceeded(stage, reason)
+
+
+def parse_timeout(value: Optional[str]) -> float:
+    """Seconds from a header/query value, clamped to MAX_REQUEST_TIMEOUT; ValueError if malformed."""
+    if value is None or value == "":
+        return REQUEST_TIMEOUT
+    seconds = float(value)
+    if not seconds > 0:
+        raise ValueError(f"timeout must be a positive number of seconds, got {value!r}")
+    return min(seconds, MAX_REQUEST_TIMEOUT)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def check_deadline(stage: str):
+    """No-op outside a request; raises DeadlineExceeded once the current request's time is up."""
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def with_deadline(name: str):
+    """Decorator for graph nodes: skip the node when the request is already out of time."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(state):
+            deadline = state.get("deadline")
+            if deadline is None:
+                return fn(state)
+            deadline.check(name)
+            token = _current_deadline.set(deadline)
+            started = time.monotonic()
+            try:
+                return fn(state)
+            finally:
+                _current_deadline.reset(token)
+                # Work nobody was waiting for any more (finished after the deadline/cancel)
+                late = time.monotonic() - max(started, deadline.ended_at)
+                if deadline.expired and late > 0:
+                    metrics.inc("deadline_overrun_seconds_total", late, node=name)
+        return wrapper
+    return decorator
+
+
+class DeadlineCallbackHandler(BaseCallbackHandler):
+    """
+    Fails LLM/tool/retriever calls started after the deadline, and keeps the
+    latest intermediate output (LLM text, tool result, captured SQL tables)
+    so a timed-out request can still return something useful.
+    """
+
+    # Raise from inside the worker that is about to make the call
+    run_inline = True
+    raise_error = True
+
+    def __init__(self, deadline: Deadline):
+        self.deadline = deadline
+        self.last_text: Optional[str] = None
+        self.last_tool: Optional[tuple] = None
+        self.tables: List[Dict[str, Any]] = []
+        self._routing_runs = set()
+
+    def _check(self, stage: str):
+        self.deadline.check(stage)
+        # Work running under a child deadline (speculative agent runs) can be cancelled on its own
+        inner = _current_deadline.get()
+        if inner is not None and inner is not self.deadline:
+            inner.check(stage)
+
+    def _abandoned(self) -> bool:
+        """Output from cancelled child work (a mispredicted speculative run) is not an answer."""
+        inner = _current_deadline.get()
+        return inner is not None and inner is not self.deadline and inner.cancel_reason is not None
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        self._check("llm")
+        if tags and "routing" in tags:
+            self._routing_runs.add(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._check("llm")
+        if tags and "routing" in tags:
+            self._routing_runs.add(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        if run_id in self._routing_runs:
+            self._routing_runs.discard(run_id)
+            return  # a Supervisor decision, not an answer
+        if self._abandoned():
+            return
+        generations = getattr(response, "generations", None) or []
+        text = generations[0][0].text if generations and generations[0] else ""
+        if text and text.strip():
+            self.last_text = text
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._routing_runs.discard(run_id)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._check(f"tool:{name}")
+
+    def on_tool_end(self, output, **kwargs):
+        if self._abandoned():
+            return
+        name = getattr(output, "name", None) or kwargs.get("name") or "tool"
+        content = getattr(output, "content", output)
+        artifact = getattr(output, "artifact", None)
+        if name == "sql_db_query" and isinstance(artifact, dict) and "table_id" in artifact:
+            self.tables.append(artifact)
+        if content:
+            self.last_tool = (name, str(content)[:2000])
+
+    def on_retriever_start(self, serialized, query, **kwargs):
+        self._check("retriever")
+
+    def partial_answer(self) -> Optional[str]:
+        if self.last_text:
+            return self.last_text
+        if self.last_tool:
+            name, content = self.last_tool
+            return f"Latest intermediate result ({name}):\n{content}"
+        return None
@@ -0,0 +1,154 @@
+"""
+Embedding backends for RAG
+EMBEDDING_BACKEND selects how all-MiniLM-L6-v2 runs on CPU:
+  torch      - HuggingFaceEmbeddings / sentence-transformers, fp32 (default)
+  onnx       - exported ONNX graph on ONNX Runtime, fp32
+  onnx-int8  - same graph with int8 dynamic quantization of the weights
+
+The ONNX backends tokenize with the model's fast tokenizer, sort inputs by
+length and pack them into batches under a token budget (dynamic batch size,
+per-batch padding), then mean-pool + L2-normalize exactly like the
+sentence-transformers pipeline. Exported models are cached on disk.
+
+Tuning: EMBEDDING_THREADS (ORT intra-op threads), EMBEDDING_BATCH_TOKENS,
+EMBEDDING_MAX_BATCH, EMBEDDING_CACHE_DIR.
+"""
+import os
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.getcwd(), ".cache", "onnx"))
+# all-MiniLM-L6-v2 was trained with 256-token inputs (sentence-transformers max_seq_length)
+MAX_SEQ_LENGTH = 256
+
+
+def get_embedding_backend() -> str:
+    backend = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Use one of: {', '.join(EMBEDDING_BACKENDS)}")
+    return backend
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL, quantize: bool = False, cache_dir: str = EMBEDDING_CACHE_DIR) -> str:
+    """Export the model to ONNX (and optionally int8-quantize it) once; returns the model directory."""
+    base_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(base_dir, "model.onnx")
+    if not os.path.exists(fp32_path):
+        print(f"[EMBED] 🔄 Exporting {model_name} to ONNX...")
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(base_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(base_dir)
+    if not quantize:
+        return base_dir
+
+    int8_dir = base_dir + "__int8"
+    int8_path = os.path.join(int8_dir, "model.onnx")
+    if not os.path.exists(int8_path):
+        print(f"[EMBED] 🔄 Quantizing {model_name} to int8 (dynamic)...")
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from transformers import AutoTokenizer
+
+        os.makedirs(int8_dir, exist_ok=True)
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        AutoTokenizer.from_pretrained(base_dir).save_pretrained(int8_dir)
+    return int8_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an exported MiniLM graph on ONNX Runtime."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, quantize: bool = False,
+                 intra_op_threads: Optional[int] = None, batch_tokens: Optional[int] = None,
+                 max_batch: Optional[int] = None, cache_dir: str = EMBEDDING_CACHE_DIR):
+        from transformers import AutoTokenizer
+
+        self.model_dir = export_onnx(model_name, quantize, cache_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self.threads = intra_op_threads or int(os.getenv("EMBEDDING_THREADS", 0)) or (os.cpu_count() or 1)
+        self._session = None
+        self._session_pid = None
+
+        # Batches are sized by total (padded) tokens rather than a fixed row count
+        self.batch_tokens = batch_tokens or int(os.getenv("EMBEDDING_BATCH_TOKENS", 8192))
+        self.max_batch = max_batch or int(os.getenv("EMBEDDING_MAX_BATCH", 128))
+        self.quantized = quantize
+
+    @property
+    def session(self):
+        # ORT thread pools don't survive fork(): create the session lazily, once per process
+        if self._session is None or self._session_pid != os.getpid():
+            import onnxruntime as ort
+
+            opts = ort.SessionOptions()
+            opts.intra_op_num_threads = self.threads
+            opts.inter_op_num_threads = 1
+            opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            self._session = ort.InferenceSession(os.path.join(self.model_dir, "model.onnx"), opts,
+                                                 providers=["CPUExecutionProvider"])
+            self._session_pid = os.getpid()
+            self.input_names = {i.name for i in self._session.get_inputs()}
+        return self._session
+
+    def _batches(self, lengths: List[int]) -> List[List[int]]:
+        """Group indices (sorted by length) so batch_size * longest <= batch_tokens."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches, current, longest = [], [], 0
+        for i in order:
+            new_longest = max(longest, lengths[i])
+            if current and (new_longest * (len(current) + 1) > self.batch_tokens or len(current) >= self.max_batch):
+                batches.append(current)
+                current, new_longest = [], lengths[i]
+            current.append(i)
+            longest = new_longest
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed(self, texts: List[str]):
+        import numpy as np
+
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+        encoded = self.tokenizer(texts, truncation=True, max_length=MAX_SEQ_LENGTH, padding=False)
+        ids = encoded["input_ids"]
+        out = [None] * len(texts)
+        for batch in self._batches([len(x) for x in ids]):
+            width = max(len(ids[i]) for i in batch)
+            input_ids = np.zeros((len(batch), width), dtype=np.int64)
+            attention = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :len(ids[i])] = ids[i]
+                attention[row, :len(ids[i])] = 1
+            session = self.session
+            feeds = {"input_ids": input_ids, "attention_mask": attention}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+            # Mean pooling over real tokens, then L2 normalize (sentence-transformers parity)
+            mask = attention[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for row, i in enumerate(batch):
+                out[i] = pooled[row]
+        return np.stack(out)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def create_embeddings(backend: Optional[str] = None, model_name: str = EMBEDDING_MODEL) -> Embeddings:
+    backend = backend or get_embedding_backend()
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=model_name)
+    return OnnxEmbeddings(model_name=model_name, quantize=(backend == "onnx-int8"))
@@ -0,0 +1,418 @@
+"""
+Fake backends for offline benchmarking and mock mode.
+
+- FakeAgentApp: latency-only simulation of the Supervisor -> Agent topology
+  (no graph, no LangChain agents) for pure load tests.
+- FakeChatModel / get_mock_database / mock_web_search: deterministic stand-ins
+  for the LLM, MySQL and Tavily so the *real* compiled graph (app/graph.py)
+  runs offline in USE_MOCK mode, ReAct tool loops included.
+"""
+import os
+import re
+import ast
+import json
+import math
+import time
+import random
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.routing import keyword_route
+
+
+def mock_enabled() -> bool:
+    return os.getenv("USE_MOCK", "false").lower() == "true"
+
+
+class LatencyDistribution:
+    """
+    Latency distribution parsed from a compact spec (all values in ms):
+      const:50 | uniform:20,80 | normal:100,20 | lognormal:200,0.5 (median, sigma) | exp:100 (mean)
+    """
+
+    # Number of parameters each kind takes
+    KINDS = {"const": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        kind, _, args = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}'. Use one of: {', '.join(self.KINDS)}")
+        try:
+            values = [float(a) for a in args.split(",") if a.strip()]
+        except ValueError:
+            raise ValueError(f"Latency spec {spec!r}: parameters must be numbers") from None
+        if kind == "const" and not values:
+            values = [0.0]  # bare "const" = no added latency
+        if len(values) != self.KINDS[kind]:
+            raise ValueError(f"Latency spec {spec!r}: '{kind}' takes {self.KINDS[kind]} parameter(s), got {len(values)}")
+        self.spec = spec
+        self.kind = kind
+        self.args = values
+        self.rng = rng or random.Random()
+
+    def sample_ms(self) -> float:
+        a = self.args
+        if self.kind == "const":
+            value = a[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(a[0], a[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(a[0], a[1])
+        elif self.kind == "lognormal":
+            value = self.rng.lognormvariate(math.log(max(a[0], 1e-6)), a[1])
+        else:
+            value = self.rng.expovariate(1.0 / max(a[0], 1e-6))
+        return max(value, 0.0)
+
+    def sample(self) -> float:
+        """Sample in seconds."""
+        return self.sample_ms() / 1000.0
+
+    def __repr__(self):
+        return f"LatencyDistribution({self.spec!r})"
+
+
+# Default latency profile (roughly Gemini Flash + local MySQL + Tavily)
+DEFAULT_PROFILE = {
+    "llm": "lognormal:450,0.35",
+    "db": "lognormal:25,0.6",
+    "search": "lognormal:700,0.4",
+    "cpu": "lognormal:250,0.3",
+}
+
+
+def _burn_cpu(seconds: float):
+    """Busy-loop to model CPU-bound work (Prophet fit, embeddings) that competes for cores."""
+    end = time.thread_time() + seconds
+    x = 0
+    while time.thread_time() < end:
+        x += 1
+    return x
+
+
+class FakeAgentApp:
+    """
+    Drop-in replacement for the compiled LangGraph app (ainvoke/invoke).
+    Mirrors the real topology: keyword or LLM supervisor routing, ReAct tool
+    loops in the SQL agent and the SQL -> Supervisor -> Forecast handoff.
+    """
+
+    def __init__(self, profile: Optional[Dict[str, str]] = None, sql_tool_calls: int = 3, seed: Optional[int] = None):
+        rng = random.Random(seed)
+        profile = {**DEFAULT_PROFILE, **(profile or {})}
+        self.profile = profile
+        self.llm = LatencyDistribution(profile["llm"], rng)
+        self.db = LatencyDistribution(profile["db"], rng)
+        self.search = LatencyDistribution(profile["search"], rng)
+        self.cpu = LatencyDistribution(profile["cpu"], rng)
+        self.sql_tool_calls = sql_tool_calls
+
+    async def _llm_call(self):
+        await asyncio.sleep(self.llm.sample())
+
+    async def _supervisor(self, query: str, has_data: bool) -> str:
+        routed = keyword_route(query, has_data)
+        if routed:
+            return routed
+        await self._llm_call()
+        lower = query.lower()
+        if "forecast" in lower or "predict" in lower:
+            return "Forecast_Agent" if has_data else "SQL_Agent"
+        return "General_Agent"
+
+    async def _sql_agent(self):
+        # ReAct: think -> tool -> ... -> final answer
+        for _ in range(self.sql_tool_calls):
+            await self._llm_call()
+            await asyncio.sleep(self.db.sample())
+        await self._llm_call()
+
+    async def _forecast_agent(self):
+        await self._llm_call()
+        await asyncio.to_thread(_burn_cpu, self.cpu.sample())
+        await self._llm_call()
+
+    async def _search_agent(self, cpu_bound: bool):
+        await self._llm_call()
+        if cpu_bound:
+            await asyncio.to_thread(_burn_cpu, self.cpu.sample() / 10)
+        else:
+            await asyncio.sleep(self.search.sample())
+        await self._llm_call()
+
+    async def ainvoke(self, state, config=None):
+        query = state.get("query", "")
+        lower = query.lower()
+        has_data = False
+        agent = await self._supervisor(query, has_data)
+
+        for _ in range(3):
+            if agent == "SQL_Agent":
+                await self._sql_agent()
+                has_data = True
+                if "forecast" in lower or "predict" in lower:
+                    agent = await self._supervisor(query, has_data)
+                    continue
+            elif agent == "Forecast_Agent":
+                await self._forecast_agent()
+            elif agent == "RAG_Agent":
+                await self._search_agent(cpu_bound=True)
+            elif agent == "Web_Agent":
+                await self._search_agent(cpu_bound=False)
+            else:
+                await self._llm_call()
+            break
+
+        content = f"[FAKE] {agent} answer for: {query}"
+        return {
+            "messages": [AIMessage(content=content)],
+            "agent_decision": agent,
+            "next": agent,
+            "sql_context": [],
+            "tables": [],
+            "sql_data": [],
+            "forecast_result": content if agent == "Forecast_Agent" else None,
+        }
+
+    async def astream(self, state, config=None, stream_mode="values"):
+        yield await self.ainvoke(state, config)
+
+    def invoke(self, state, config=None):
+        return asyncio.run(self.ainvoke(state, config))
+
+
+# --- Deterministic fake chat model (used by the real graph in mock mode) ---
+
+_latency_cache: Dict[str, LatencyDistribution] = {}
+
+
+def _latency(spec: Optional[str]) -> float:
+    """Sample seconds from a cached, seeded distribution (0 when no spec)."""
+    if not spec:
+        return 0.0
+    if spec not in _latency_cache:
+        _latency_cache[spec] = LatencyDistribution(spec, random.Random(int(os.getenv("MOCK_SEED", 42))))
+    return _latency_cache[spec].sample()
+
+
+# Scripted ReAct plan for the SQLDatabaseToolkit
+SQL_TOOL_PLAN = ["sql_db_list_tables", "sql_db_schema", "sql_db_query"]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model that understands Sentinel's prompts.
+    - Supervisor prompt -> returns a routing decision
+    - Tools bound -> emits scripted tool calls (SQL toolkit plan, forecast, search)
+      until each planned tool has run, then answers from the tool output
+    - Otherwise -> a canned answer echoing the conversation
+    """
+
+    latency: Optional[str] = None
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "sentinel-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        delay = _latency(self.latency)
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tools or []))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        delay = _latency(self.latency)
+        if delay:
+            await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages, tools or []))])
+
+    # --- Scripted behaviour ---
+    def _respond(self, messages, tools: List[dict]) -> AIMessage:
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        humans = [m.content for m in messages if isinstance(m, HumanMessage)]
+        query = humans[0] if humans else ""
+        wants_json = any("raw JSON list" in h for h in humans)
+
+        if "Supervisor routing" in system:
+            return AIMessage(content=self._route(query, system))
+        if not tools:
+            return AIMessage(content=self._general_answer(query, messages))
+
+        # Tool results since the last human turn drive the ReAct loop
+        last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1)
+        tail = messages[last_human + 1:]
+        done = [m.name for m in tail if isinstance(m, ToolMessage)]
+        names = [t["function"]["name"] for t in tools]
+        plan = [n for n in SQL_TOOL_PLAN if n in names] or names[:1]
+        pending = [n for n in plan if n not in done]
+
+        if pending:
+            name = pending[0]
+            spec = next(t for t in tools if t["function"]["name"] == name)
+            args = self._tool_args(name, spec, query, wants_json, tail, messages)
+            return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{len(done)}_{name}"}])
+        return AIMessage(content=self._final_answer(tail, wants_json))
+
+    @staticmethod
+    def _route(query: str, system: str) -> str:
+        has_data = "Data Available in State: True" in system
+        lower = query.lower()
+        if "forecast" in lower or "predict" in lower:
+            return "Forecast_Agent" if has_data else "SQL_Agent"
+        return "General_Agent"
+
+    @staticmethod
+    def _general_answer(query: str, messages) -> str:
+        previous = [m.content for m in messages if isinstance(m, AIMessage) and m.content]
+        if previous:
+            return f"[MOCK] Summary: {previous[-1][:300]}"
+        return f"[MOCK] General answer to: {query}"
+
+    def _tool_args(self, name, spec, query, wants_json, tail, messages) -> Dict[str, Any]:
+        if name == "sql_db_list_tables":
+            return {"tool_input": ""}
+        if name == "sql_db_schema":
+            listed = next((m.content for m in tail if isinstance(m, ToolMessage) and m.name == "sql_db_list_tables"), "employees")
+            return {"table_names": listed}
+        if name == "sql_db_query":
+            return {"query": self._sql_for(query, wants_json)}
+        if name == "generate_forecast":
+            return {"data": self._find_rows(messages), "periods": 90}
+        params = list(spec["function"].get("parameters", {}).get("properties", {}) or ["query"])
+        return {params[0]: query}
+
+    @staticmethod
+    def _sql_for(query: str, wants_json: bool) -> str:
+        lower = query.lower()
+        if wants_json or "forecast" in lower or "predict" in lower:
+            return "SELECT ds, y FROM monthly_payroll ORDER BY ds"
+        if "lowest" in lower:
+            return "SELECT first_name, last_name, department, salary FROM employees ORDER BY salary ASC LIMIT 5"
+        if "highest" in lower or "earns" in lower or "top" in lower:
+            return "SELECT first_name, last_name, department, salary FROM employees ORDER BY salary DESC LIMIT 5"
+        if "average" in lower or "avg" in lower:
+            return "SELECT department, ROUND(AVG(salary), 2) AS avg_salary FROM employees GROUP BY department"
+        if "department" in lower:
+            return "SELECT department, COUNT(*) AS employees FROM employees GROUP BY department ORDER BY employees DESC"
+        if "count" in lower or "how many" in lower:
+            return "SELECT COUNT(*) AS employees FROM employees"
+        return "SELECT * FROM employees LIMIT 10"
+
+    @staticmethod
+    def _find_rows(messages) -> list:
+        """Pull the most recent JSON list of records out of the conversation."""
+        for m in reversed(messages):
+            content = getattr(m, "content", "")
+            if not isinstance(content, str):
+                continue
+            match = re.search(r"(\[\s*\{.*\}\s*\])", content, re.DOTALL)
+            if match:
+                try:
+                    return json.loads(match.group(1))
+                except ValueError:
+                    continue
+        return []
+
+    @staticmethod
+    def _final_answer(tail, wants_json: bool) -> str:
+        results = [m for m in tail if isinstance(m, ToolMessage)]
+        if not results:
+            return "[MOCK] No tool output available."
+        last = results[-1]
+        if wants_json and last.name == "sql_db_query":
+            try:
+                rows = [{"ds": str(ds), "y": float(y)} for ds, y in ast.literal_eval(last.content)]
+                return "```json\n" + json.dumps(rows) + "\n```"
+            except (ValueError, SyntaxError, TypeError):
+                pass
+        if last.name == "generate_forecast":
+            return str(last.content)
+        return f"[MOCK] Based on {last.name}: {str(last.content)[:500]}"
+
+
+def get_fake_llm(temperature: float = 0.0, model_override: str = None):
+    """Fake LLM for mock mode; latency from MOCK_LLM_LATENCY (e.g. lognormal:400,0.3)."""
+    return FakeChatModel(latency=os.getenv("MOCK_LLM_LATENCY"), temperature=temperature)
+
+
+# --- In-memory SQLite stand-in for MySQL ---
+
+_mock_db = None
+
+_DEPARTMENTS = ["Engineering", "Sales", "Marketing", "Finance", "Human Resources", "Support"]
+_FIRST_NAMES = ["Alice", "Bob", "Chen", "Divya", "Emeka", "Fatima", "Georg", "Hana", "Ivan", "Jamal"]
+_LAST_NAMES = ["Smith", "Khan", "Garcia", "Mueller", "Tanaka", "Okafor", "Rossi", "Novak"]
+
+
+def get_mock_database():
+    """Seeded, shared in-memory SQLite database wrapped as a LangChain SQLDatabase."""
+    global _mock_db
+    if _mock_db is not None:
+        return _mock_db
+
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.pool import StaticPool
+    from langchain_community.utilities import SQLDatabase
+
+    # StaticPool + check_same_thread=False: one connection shared by every worker thread
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE employees (emp_no INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, "
+            "department TEXT, salary REAL, hire_date TEXT)"
+        ))
+        conn.execute(text("CREATE TABLE monthly_payroll (ds TEXT PRIMARY KEY, y REAL)"))
+        employees = [
+            {
+                "emp_no": 10001 + i,
+                "first_name": _FIRST_NAMES[i % len(_FIRST_NAMES)],
+                "last_name": _LAST_NAMES[(i * 3) % len(_LAST_NAMES)],
+                "department": _DEPARTMENTS[i % len(_DEPARTMENTS)],
+                "salary": round(rng.uniform(45000, 160000), 2),
+                "hire_date": f"{2015 + i % 9}-{1 + i % 12:02d}-01",
+            }
+            for i in range(60)
+        ]
+        conn.execute(text(
+            "INSERT INTO employees VALUES (:emp_no, :first_name, :last_name, :department, :salary, :hire_date)"
+        ), employees)
+        payroll = [
+            {"ds": f"{2023 + m // 12}-{1 + m % 12:02d}-01", "y": round(520000 + 4000 * m + rng.uniform(-8000, 8000), 2)}
+            for m in range(24)
+        ]
+        conn.execute(text("INSERT INTO monthly_payroll VALUES (:ds, :y)"), payroll)
+
+    db_latency = os.getenv("MOCK_DB_LATENCY")
+    if db_latency:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _simulated_latency(*args, **kwargs):
+            time.sleep(_latency(db_latency))
+
+    _mock_db = SQLDatabase(engine)
+    return _mock_db
+
+
+# --- Stub web search (replaces Tavily) ---
+
+@tool
+def mock_web_search(query: str) -> str:
+    """Search the web for recent news and information (offline stub)."""
+    delay = _latency(os.getenv("MOCK_SEARCH_LATENCY"))
+    if delay:
+        time.sleep(delay)
+    return json.dumps([
+        {"url": "https://example.com/news/1", "content": f"[MOCK] Top result for '{query}'."},
+        {"url": "https://example.com/news/2", "content": f"[MOCK] Second result for '{query}'."},
+    ])
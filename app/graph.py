@@ -1,42 +1,29 @@
 import re
 import json
-from typing import Literal
+from typing import List, Literal, Optional
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
 from dotenv import load_dotenv
 
 # Load environment variables first
 load_dotenv()
 
 # Import your agents
+# SQL/Forecast/RAG/Web agent modules are imported inside their nodes so their
+# heavy deps (Prophet, pandas, FAISS, HF, langchain_community) load on first use
 from app.state import AgentState
 from app.llm_provider import get_llm
-from app.agents.sql_agent import get_sql_agent
-from app.agents.forecast_agent import get_forecast_agent  # FIXED: import matches renamed file
+from app.routing import keyword_route, parse_decision, routing_prior
+from app.admission import abulkheaded, bulkheaded
+from app.deadline import with_deadline
+from app import speculation
+from app.forecast_store import get_forecast_store
 from app.agents.general_agent import general_node
-from app.agents.rag_agent import get_rag_agent
-from app.agents.web_search_agent import get_web_agent
 
 # --- 1. The Supervisor (The Brain) ---
-def supervisor_node(state: AgentState):
-    # Initialize LLM via provider (Gemini or Ollama)
-    llm = get_llm(temperature=0)
-    
-    messages = state.get("messages", [])
-    # Check both keys for safety
-    sql_data = state.get("sql_context") or state.get("sql_data", [])
-    has_data = bool(sql_data and len(sql_data) > 0)
-    
-    # CRITICAL: Track how many times supervisor has been called
-    supervisor_count = state.get("supervisor_count", 0) + 1
-    print(f"[SUPERVISOR] Call #{supervisor_count}, has_data={has_data}, msg_count={len(messages)}")
-    
-    # Safety: if supervisor called too many times, force END
-    if supervisor_count > 3:
-        print("[SUPERVISOR] ⚠️ Max iterations reached, routing to General to finish")
-        return {"next": "General_Agent", "agent_decision": "General_Agent", "supervisor_count": supervisor_count}
-    
-    system_prompt = f"""You are a Supervisor routing user queries to specialized agents.
+def supervisor_prompt(has_data: bool) -> str:
+    return f"""You are a Supervisor routing user queries to specialized agents.
 
 Available Workers:
 1. **SQL_Agent**: Query MySQL database (employees, salaries, departments, etc.)
@@ -59,48 +46,105 @@ ROUTING RULES:
 Output ONLY ONE of: SQL_Agent, Forecast_Agent, General_Agent
 (Note: RAG_Agent and Web_Agent are handled by keyword triggers before this prompt)
 """
+
+
+def routing_messages(query: str, has_data: bool = False):
+    return [
+        SystemMessage(content=supervisor_prompt(has_data)),
+        HumanMessage(content=f"User Query: {query}")
+    ]
+
+
+async def preroute(queries: List[str], max_concurrency: int = 8) -> List[Optional[str]]:
+    """
+    Route hints for a batch of fresh queries (/chat/batch): keyword rules first,
+    then a single llm.abatch over the distinct remaining queries. Entries stay
+    None where the LLM call failed and the Supervisor routes those as usual.
+    """
+    hints = [keyword_route(q) for q in queries]
+    pending = list(dict.fromkeys(q for q, h in zip(queries, hints) if h is None))
+    if not pending:
+        return hints
+    llm = get_llm(temperature=0)
+    responses = await llm.abatch([routing_messages(q) for q in pending],
+                                 config={"max_concurrency": max_concurrency}, return_exceptions=True)
+    decisions = {}
+    for q, r in zip(pending, responses):
+        if isinstance(r, Exception):
+            print(f"[SUPERVISOR] ⚠️ Batched routing failed for {q[:60]!r}: {r}")
+        else:
+            decisions[q] = parse_decision(r.content.strip())
+    print(f"[SUPERVISOR] Batched routing: {len(queries)} queries, {len(pending)} LLM call(s), {len(decisions)} ok")
+    return [h or decisions.get(q) for q, h in zip(queries, hints)]
+
+
+def supervisor_node(state: AgentState):
+    messages = state.get("messages", [])
+    # Check both keys for safety
+    sql_data = state.get("sql_context") or state.get("sql_data", [])
+    has_data = bool(sql_data and len(sql_data) > 0)
+    
+    # CRITICAL: Track how many times supervisor has been called
+    supervisor_count = state.get("supervisor_count", 0) + 1
+    print(f"[SUPERVISOR] Call #{supervisor_count}, has_data={has_data}, msg_count={len(messages)}")
+    
+    # Safety: if supervisor called too many times, force END
+    if supervisor_count > 3:
+        print("[SUPERVISOR] ⚠️ Max iterations reached, routing to General to finish")
+        return {"next": "General_Agent", "agent_decision": "General_Agent", "supervisor_count": supervisor_count}
     
     last_user_msg = messages[-1].content if messages else ""
-    last_lower = last_user_msg.lower()
+
+    # Forecasts of registered series are served from the materialized store (app/forecast_store.py)
+    if supervisor_count == 1 and not has_data:
+        series = get_forecast_store().match(last_user_msg)
+        if series:
+            print(f"[SUPERVISOR] Registered forecast series '{series}', routing to Forecast_Agent")
+            return {"next": "Forecast_Agent", "agent_decision": "Forecast_Agent",
+                    "supervisor_count": supervisor_count, "forecast_series": series}
     
     # Fast keyword-based routing to reduce LLM overhead for obvious intents
-    sql_keywords = ["database", "employee", "salary", "department", "count", "highest", "lowest", "earns", "select", "query", "table", "record"]
-    rag_triggers = ["document", "policy", "pdf", "file", "manual", "knowledge", "kb", "rag", "retrieve"]
-    web_triggers = ["web", "google", "bing", "latest", "news", "internet", "online", "search the web", "web search", "browse"]
-
-    # Check SQL keywords first (highest priority for DB queries)
-    # BUT if data already exists, don't loop back to SQL - go to General to summarize
-    if any(keyword in last_lower for keyword in sql_keywords):
-        if not has_data:
-            print(f"[SUPERVISOR] Routing to SQL_Agent (no data yet)")
-            return {"next": "SQL_Agent", "agent_decision": "SQL_Agent", "supervisor_count": supervisor_count}
-        else:
-            # Data already fetched, route to General to present it
-            print(f"[SUPERVISOR] Data exists, routing to General_Agent")
-            return {"next": "General_Agent", "agent_decision": "General_Agent", "supervisor_count": supervisor_count}
-    
-    if any(trigger in last_lower for trigger in rag_triggers):
-        return {"next": "RAG_Agent", "agent_decision": "RAG_Agent", "supervisor_count": supervisor_count}
-    if any(trigger in last_lower for trigger in web_triggers):
-        return {"next": "Web_Agent", "agent_decision": "Web_Agent", "supervisor_count": supervisor_count}
-
-    response = llm.invoke([
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=f"User Query: {last_user_msg}")
-    ])
+    routed = keyword_route(last_user_msg, has_data)
+    if routed:
+        print(f"[SUPERVISOR] Keyword routing to {routed} (has_data={has_data})")
+        return {"next": routed, "agent_decision": routed, "supervisor_count": supervisor_count}
+
+    # Decided ahead of time by a batched routing call; only valid for the first, data-less hop
+    hint = state.get("route_hint")
+    if hint and supervisor_count == 1 and not has_data:
+        print(f"[SUPERVISOR] Using pre-routed decision {hint}")
+        return {"next": hint, "agent_decision": hint, "supervisor_count": supervisor_count}
+
+    # Initialize LLM via provider (Gemini or Ollama)
+    llm = get_llm(temperature=0)
+
+    # Opt-in: start the likeliest agent now instead of after the routing call (app/speculation.py)
+    first_hop = supervisor_count == 1 and not has_data
+    spec = None
+    if speculation.SPECULATIVE_ROUTING and first_hop:
+        spec = speculation.speculate(last_user_msg, state, supervisor_count, AGENT_NODES)
+    try:
+        response = llm.invoke(routing_messages(last_user_msg, has_data), config={"tags": ["routing"]})
+    except BaseException:
+        if spec is not None:
+            spec.cancel()
+        raise
     
     decision = response.content.strip()
     print(f"[SUPERVISOR] LLM decision: {decision}")
     
     # Robust fallback routing
-    if "SQL" in decision: return {"next": "SQL_Agent", "agent_decision": "SQL_Agent", "supervisor_count": supervisor_count}
-    if "Forecast" in decision: return {"next": "Forecast_Agent", "agent_decision": "Forecast_Agent", "supervisor_count": supervisor_count}
-    if "RAG" in decision or "Document" in decision: return {"next": "RAG_Agent", "agent_decision": "RAG_Agent", "supervisor_count": supervisor_count}
-    if "Web" in decision or "Search" in decision: return {"next": "Web_Agent", "agent_decision": "Web_Agent", "supervisor_count": supervisor_count}
-    return {"next": "General_Agent", "agent_decision": "General_Agent", "supervisor_count": supervisor_count}
+    routed = parse_decision(decision)
+    if first_hop:
+        routing_prior.record(last_user_msg, routed)
+    update = {"next": routed, "agent_decision": routed, "supervisor_count": supervisor_count}
+    if spec is not None and spec.resolve(routed):
+        update["speculation"] = spec
+    return update
 
 # --- 2. Agent Nodes ---
 def sql_node(state):
+    from app.agents.sql_agent import get_sql_agent
     agent = get_sql_agent()
     
     # Hint injection for Forecasting scenarios
@@ -115,11 +159,26 @@ def sql_node(state):
     last_msg = res["messages"][-1]
     print(f"[SQL_NODE] Response: {last_msg.content[:200]}")
     
+    # Result sets captured by the sql_db_query tool (summaries; rows live in app/tables.py)
+    tables = [m.artifact for m in res["messages"]
+              if isinstance(m, ToolMessage) and m.name == "sql_db_query" and getattr(m, "artifact", None)]
+
     # --- JSON EXTRACTION (ONLY for forecasting) ---
     sql_data = []
     content = last_msg.content
     
-    if is_forecast_request:
+    forecast_table = None
+    if is_forecast_request and tables:
+        from app.tables import table_store
+        forecast_table = table_store.get(tables[-1]["table_id"])
+        if forecast_table and {"ds", "y"} <= set(forecast_table.columns):
+            # Structured rows straight from the cursor; no need to parse LLM text
+            sql_data = forecast_table.records()
+            print(f"✅ [SQL Node] Using {len(sql_data)} captured rows for forecasting.")
+        else:
+            forecast_table = None
+
+    if is_forecast_request and forecast_table is None:
         try:
             # Try finding code blocks first
             match = re.search(r"```json\n(.*?)\n```", content, re.DOTALL)
@@ -145,11 +204,19 @@ def sql_node(state):
         "messages": [last_msg],
         "sql_data": sql_data,
         "sql_context": sql_data,
+        "tables": tables,
         "agent_decision": state.get("agent_decision") or "SQL_Agent",
         "next": "SQL_Agent",
     }
 
 def forecast_node(state):
+    series = state.get("forecast_series")
+    if series:
+        served = _forecast_series(series, state)
+        if served is not None:
+            return served
+
+    from app.agents.forecast_agent import get_forecast_agent  # FIXED: import matches renamed file
     agent = get_forecast_agent()
     # Forecaster needs to see the whole state to find 'sql_data'
     res = agent.invoke(state) 
@@ -162,7 +229,42 @@ def forecast_node(state):
     }
 
 
+def _forecast_series(series: str, state):
+    """
+    Registered series: answer from the materialized store, or (beyond its
+    horizon / refresh failed) fit the series' rows directly. None hands the
+    question to the forecast agent.
+    """
+    from langchain_core.messages import AIMessage
+    from app.deadline import DeadlineExceeded
+    from app.tables import Table, table_store
+
+    store = get_forecast_store()
+    query = state.get("query") or (state["messages"][-1].content if state.get("messages") else "")
+    answer, source = None, "materialized"
+    try:
+        answer = store.answer(series, query)
+        if answer is None:
+            answer, source = store.live_answer(series, query), "live"
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ [Forecast Node] Series '{series}' could not be forecast ({e}), handing over to the agent")
+        return None
+    table = table_store.put(Table(f"forecast series: {series}", ["ds", "yhat", "yhat_lower", "yhat_upper", "trend"],
+                                  answer["points"]))
+    print(f"✅ [Forecast Node] Served '{series}' ({source}, {answer['periods']} periods)")
+    return {
+        "messages": [AIMessage(content=answer["text"])],
+        "forecast_result": answer["text"],
+        "tables": [table.summary()],
+        "agent_decision": state.get("agent_decision") or "Forecast_Agent",
+        "next": "Forecast_Agent",
+    }
+
+
 def rag_node(state):
+    from app.agents.rag_agent import get_rag_agent
     agent = get_rag_agent()
     res = agent.invoke({"messages": state.get("messages", [])})
     last_msg = res["messages"][-1]
@@ -174,6 +276,7 @@ def rag_node(state):
 
 
 def web_node(state):
+    from app.agents.web_search_agent import get_web_agent
     agent = get_web_agent()
     res = agent.invoke({"messages": state.get("messages", [])})
     last_msg = res["messages"][-1]
@@ -186,12 +289,24 @@ def web_node(state):
 # --- 3. Build the Graph ---
 workflow = StateGraph(AgentState)
 
-workflow.add_node("Supervisor", supervisor_node)
-workflow.add_node("SQL_Agent", sql_node)
-workflow.add_node("Forecast_Agent", forecast_node)
-workflow.add_node("General_Agent", general_node)
-workflow.add_node("RAG_Agent", rag_node)
-workflow.add_node("Web_Agent", web_node)
+# Each agent runs inside its own bulkhead (see app/admission.py) and is
+# skipped once the request's deadline has passed (see app/deadline.py)
+_AGENTS = [
+    ("SQL_Agent", sql_node),
+    ("Forecast_Agent", forecast_node),
+    ("General_Agent", general_node),
+    ("RAG_Agent", rag_node),
+    ("Web_Agent", web_node),
+]
+AGENT_NODES = {name: bulkheaded(name)(with_deadline(name)(node)) for name, node in _AGENTS}
+# Under astream, nodes queue for their bulkhead slot on the event loop, not in an executor thread
+ASYNC_AGENT_NODES = {name: abulkheaded(name)(with_deadline(name)(node)) for name, node in _AGENTS}
+
+workflow.add_node("Supervisor", with_deadline("Supervisor")(supervisor_node))
+for name, node in AGENT_NODES.items():
+    # Adopts a speculative run of this agent started by the Supervisor, if any
+    workflow.add_node(name, RunnableLambda(speculation.speculated(name)(node),
+                                           afunc=speculation.aspeculated(name)(ASYNC_AGENT_NODES[name]), name=name))
 
 workflow.set_entry_point("Supervisor")
 
@@ -1,38 +1,23 @@
 """
 Mock graph for offline/local testing.
-Provides the same interface as the compiled LangGraph app with a minimal
-heuristic response so the API can run without external LLM dependencies.
+Runs the *real* compiled LangGraph app (app/graph.py) - supervisor routing,
+node overhead, state merging and ReAct tool loops included - but backed by
+deterministic fakes from app/fakes.py:
+  - FakeChatModel instead of Gemini/Ollama (LLM_PROVIDER=fake)
+  - seeded in-memory SQLite instead of MySQL
+  - stub web-search tool instead of Tavily
+  - hash-based embeddings instead of all-MiniLM-L6-v2
+Optional simulated latencies: MOCK_LLM_LATENCY, MOCK_DB_LATENCY, MOCK_SEARCH_LATENCY
+(e.g. "lognormal:400,0.3", see app.fakes.LatencyDistribution).
 """
-import asyncio
-from langchain_core.messages import AIMessage
+import os
 
+os.environ["USE_MOCK"] = "true"
+os.environ["LLM_PROVIDER"] = "fake"
 
-class _MockAgentApp:
-    async def ainvoke(self, state):
-        query = state.get("query") or (state.get("messages", [{}])[-1].content if state.get("messages") else "")
-        lower_q = query.lower() if isinstance(query, str) else ""
+from app import llm_provider
 
-        if "forecast" in lower_q or "predict" in lower_q:
-            agent = "Forecast_Agent"
-            content = "[MOCK] Forecast: trend looks stable over the next period."
-        elif "sql" in lower_q or "data" in lower_q or "select" in lower_q:
-            agent = "SQL_Agent"
-            content = "[MOCK] SQL result placeholder (no real database in mock mode)."
-        else:
-            agent = "General_Agent"
-            content = "[MOCK] Hello! This is a mock response."
+# Provider is resolved at import time; make sure an earlier import doesn't win
+llm_provider.LLM_PROVIDER = "fake"
 
-        return {
-            "messages": [AIMessage(content=content)],
-            "agent_decision": agent,
-            "next": agent,
-            "sql_context": [],
-            "sql_data": [],
-            "forecast_result": content if agent == "Forecast_Agent" else None,
-        }
-
-    def invoke(self, state):
-        return asyncio.get_event_loop().run_until_complete(self.ainvoke(state))
-
-
-app = _MockAgentApp()
+from app.graph import app  # noqa: E402
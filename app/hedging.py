@@ -0,0 +1,342 @@
+"""
+Hedged, retrying, circuit-broken LLM calls
+HedgedChatModel wraps a primary chat model and one or more backups (another
+provider, or the same one again):
+  - hedging: if the primary hasn't answered after the hedge delay, the next
+    backup is started; the first answer wins and the rest are cancelled
+    (async: the task is cancelled; sync: the worker stops before its next
+    retry and its late result is discarded)
+  - retries: rate-limit errors (HTTP 429 / quota) are retried with
+    full-jitter exponential backoff, never sleeping past the request deadline
+  - circuit breakers: a provider that fails LLM_BREAKER_FAILURES times in a
+    row is skipped for LLM_BREAKER_COOLDOWN seconds, then probed with a
+    single request
+Breakers and latency stats are per provider and shared by every model
+instance in the process (get_llm builds a new model per node).
+
+Configuration (environment):
+  LLM_BACKUP_PROVIDER=ollama  LLM_BACKUP_MODEL=llama3.2:3b  (enables wrapping)
+  LLM_RESILIENCE=true         (retries/breaker for the primary alone)
+  LLM_HEDGE_DELAY=auto        (seconds, or auto = primary's recent p95)
+  LLM_MAX_RETRIES=2  LLM_BACKOFF_BASE=0.5  LLM_BACKOFF_MAX=8
+  LLM_BREAKER_FAILURES=5  LLM_BREAKER_COOLDOWN=30
+"""
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.deadline import DeadlineExceeded, current_deadline
+from app.metrics import metrics
+
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY", "auto")
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 2.0))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.05))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8.0))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30.0))
+
+# Samples needed before the adaptive hedge delay trusts its percentile
+MIN_LATENCY_SAMPLES = 20
+
+
+class ProvidersUnavailable(Exception):
+    """Every provider's circuit breaker is open."""
+
+
+def is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    if type(error).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests"):
+        return True
+    text = str(error).lower()
+    return "429" in text or "rate limit" in text or "quota" in text
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff, capped by LLM_BACKOFF_MAX and the request deadline."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    deadline = current_deadline()
+    return min(delay, deadline.remaining()) if deadline is not None else delay
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open (one probe) after the cooldown."""
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.status = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=200)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.status == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.status = "half_open"
+                self._probing = False
+            if self.status == "half_open":
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.failures = 0
+            self._probing = False
+            if self.status != "closed":
+                print(f"✅ [LLM] {self.name} recovered, closing circuit")
+            self.status = "closed"
+        metrics.set_gauge("llm_breaker_open", 0, provider=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.status == "half_open" or self.failures >= self.failure_threshold:
+                if self.status != "open":
+                    print(f"⚠️ [LLM] {self.name} failed {self.failures}x, opening circuit for {self.cooldown:.0f}s")
+                    metrics.inc("llm_breaker_opened_total", provider=self.name)
+                self.status = "open"
+                self.opened_at = time.monotonic()
+        metrics.set_gauge("llm_breaker_open", 1 if self.status == "open" else 0, provider=self.name)
+
+    def release(self):
+        """An attempt ended without a verdict (cancelled / deadline): free the half-open probe."""
+        with self._lock:
+            self._probing = False
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def state(self) -> Dict[str, Any]:
+        p = self.latency_percentile(LLM_HEDGE_PERCENTILE)
+        return {"status": self.status, "failures": self.failures, "p95_s": round(p, 3) if p is not None else None}
+
+
+# GLOBAL CACHE (one breaker per provider per process; a hedging worker pool)
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        return {name: b.state() for name, b in _breakers.items()}
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _breakers_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", 32)), thread_name_prefix="llm-hedge")
+        return _pool
+
+
+class HedgedChatModel(BaseChatModel):
+    """Chat model that races a primary against backups; see module docstring."""
+
+    models: List[Any]
+    names: List[str]
+    # Seconds before starting the next backup; None = LLM_HEDGE_DELAY ("auto" = primary's recent p95)
+    hedge_delay: Optional[float] = None
+    max_retries: int = LLM_MAX_RETRIES
+
+    @property
+    def _llm_type(self) -> str:
+        return "sentinel-hedged"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"models": [m.bind_tools(tools, **kwargs) for m in self.models]})
+
+    def _delay(self, index: int) -> float:
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        if LLM_HEDGE_DELAY != "auto":
+            return float(LLM_HEDGE_DELAY)
+        p = get_breaker(self.names[index]).latency_percentile(LLM_HEDGE_PERCENTILE)
+        return max(LLM_HEDGE_MIN_DELAY, p) if p is not None else LLM_HEDGE_DEFAULT_DELAY
+
+    def _next_allowed(self, order: List[int]) -> Optional[int]:
+        """Pop the next provider whose breaker lets a request through (reserves half-open probes)."""
+        while order:
+            index = order.pop(0)
+            if get_breaker(self.names[index]).allow():
+                return index
+        return None
+
+    def _first(self, order: List[int]) -> int:
+        index = self._next_allowed(order)
+        if index is None:
+            metrics.inc("llm_unavailable_total")
+            raise ProvidersUnavailable(f"All LLM providers are circuit-open: {', '.join(self.names)}")
+        if index != 0:
+            metrics.inc("llm_failover_total", provider=self.names[index])
+        return index
+
+    def _on_win(self, index: int, hedged: bool):
+        metrics.inc("llm_calls_total", provider=self.names[index])
+        if hedged:
+            metrics.inc("llm_hedge_wins_total", provider=self.names[index])
+
+    # --- Sync path (graph nodes run in worker threads) ---
+    def _attempt(self, index: int, messages, stop, config, kwargs, cancelled: threading.Event):
+        name, breaker = self.names[index], get_breaker(self.names[index])
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                message = self.models[index].invoke(messages, config, stop=stop, **kwargs)
+            except DeadlineExceeded:
+                breaker.release()
+                raise
+            except Exception as e:
+                if is_rate_limited(e) and attempt < self.max_retries and not cancelled.is_set():
+                    metrics.inc("llm_retries_total", provider=name)
+                    # Interrupted early if another provider already answered
+                    if not cancelled.wait(backoff_delay(attempt)):
+                        continue
+                if cancelled.is_set():
+                    breaker.release()
+                else:
+                    breaker.record_failure()
+                raise
+            breaker.record_success(time.monotonic() - started)
+            return message
+        raise RuntimeError("unreachable")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        order = list(range(len(self.models)))
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        cancelled = threading.Event()
+        pool = _get_pool()
+        futures, errors = {}, []
+
+        def launch(index: Optional[int]):
+            if index is not None:
+                # Copy the context so the attempt sees this request's deadline
+                ctx = contextvars.copy_context()
+                futures[pool.submit(ctx.run, self._attempt, index, messages, stop, config, kwargs, cancelled)] = index
+
+        launch(self._first(order))
+        hedged = False
+        try:
+            while futures:
+                done, _ = wait(list(futures), timeout=self._delay(0) if order else None, return_when=FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    index = self._next_allowed(order)
+                    if index is not None:
+                        metrics.inc("llm_hedges_total", provider=self.names[index])
+                    launch(index)
+                    continue
+                for future in done:
+                    index = futures.pop(future)
+                    try:
+                        message = future.result()
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        errors.append(e)
+                        # Fail over right away instead of waiting out the hedge delay
+                        launch(self._next_allowed(order))
+                        continue
+                    self._on_win(index, hedged)
+                    return ChatResult(generations=[ChatGeneration(message=message)])
+            raise errors[-1]
+        finally:
+            cancelled.set()
+            for future in futures:
+                future.cancel()
+                metrics.inc("llm_hedge_cancelled_total", provider=self.names[futures[future]])
+
+    # --- Async path ---
+    async def _aattempt(self, index: int, messages, stop, config, kwargs):
+        name, breaker = self.names[index], get_breaker(self.names[index])
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                message = await self.models[index].ainvoke(messages, config, stop=stop, **kwargs)
+            except (DeadlineExceeded, asyncio.CancelledError):
+                breaker.release()
+                raise
+            except Exception as e:
+                if is_rate_limited(e) and attempt < self.max_retries:
+                    metrics.inc("llm_retries_total", provider=name)
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                breaker.record_failure()
+                raise
+            breaker.record_success(time.monotonic() - started)
+            return message
+        raise RuntimeError("unreachable")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        order = list(range(len(self.models)))
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        tasks, errors = {}, []
+
+        def launch(index: Optional[int]):
+            if index is not None:
+                tasks[asyncio.ensure_future(self._aattempt(index, messages, stop, config, kwargs))] = index
+
+        launch(self._first(order))
+        hedged = False
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(list(tasks), timeout=self._delay(0) if order else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    index = self._next_allowed(order)
+                    if index is not None:
+                        metrics.inc("llm_hedges_total", provider=self.names[index])
+                    launch(index)
+                    continue
+                for task in done:
+                    index = tasks.pop(task)
+                    try:
+                        message = task.result()
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        errors.append(e)
+                        launch(self._next_allowed(order))
+                        continue
+                    self._on_win(index, hedged)
+                    return ChatResult(generations=[ChatGeneration(message=message)])
+            raise errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+                metrics.inc("llm_hedge_cancelled_total", provider=self.names[tasks[task]])
@@ -1,6 +1,10 @@
 """
 LLM Provider Factory
 Allows switching between Gemini API and Ollama based on environment configuration
+(LLM_PROVIDER=fake selects the deterministic offline model used by mock mode)
+With LLM_BACKUP_PROVIDER (or LLM_RESILIENCE=true) the model is wrapped in a
+HedgedChatModel: hedged backup requests, rate-limit retries and circuit
+breakers (see app/hedging.py)
 """
 import os
 from dotenv import load_dotenv
@@ -8,6 +12,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+LLM_BACKUP_PROVIDER = os.getenv("LLM_BACKUP_PROVIDER", "").lower()
+LLM_RESILIENCE = os.getenv("LLM_RESILIENCE", "false").lower() == "true"
 
 
 def get_llm(temperature: float = 0.0, model_override: str = None):
@@ -19,10 +25,37 @@ def get_llm(temperature: float = 0.0, model_override: str = None):
         model_override: Optional model name to override default (e.g., "llama3.1:8b", "llama3.2:3b")
     
     Returns:
-        LLM instance (ChatGoogleGenerativeAI or ChatOllama)
+        LLM instance (ChatGoogleGenerativeAI, ChatOllama or FakeChatModel),
+        or a HedgedChatModel around it when a backup/resilience is configured
     """
     
-    if LLM_PROVIDER == "ollama":
+    llm = get_provider_llm(LLM_PROVIDER, temperature, model_override)
+    if not (LLM_BACKUP_PROVIDER or LLM_RESILIENCE):
+        return llm
+
+    from app.hedging import HedgedChatModel
+    models, names = [llm], [provider_name(LLM_PROVIDER, model_override)]
+    if LLM_BACKUP_PROVIDER:
+        # The override names a model of the primary provider, so the backup uses its own
+        backup_model = os.getenv("LLM_BACKUP_MODEL") or None
+        models.append(get_provider_llm(LLM_BACKUP_PROVIDER, temperature, backup_model))
+        name = provider_name(LLM_BACKUP_PROVIDER, backup_model)
+        # Hedging against the same provider+model still gets its own breaker
+        names.append(name if name != names[0] else f"{name}#backup")
+    return HedgedChatModel(models=models, names=names)
+
+
+def provider_name(provider: str, model_override: str = None) -> str:
+    """Stable key for a provider+model (circuit breakers and metrics labels)."""
+    defaults = {"gemini": os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp"), "ollama": os.getenv("OLLAMA_MODEL", "llama3.2:3b")}
+    return f"{provider}:{model_override or defaults.get(provider, provider)}"
+
+
+def get_provider_llm(provider: str, temperature: float = 0.0, model_override: str = None):
+    if provider == "fake":
+        from app.fakes import get_fake_llm
+        return get_fake_llm(temperature, model_override)
+    if provider == "ollama":
         return get_ollama_llm(temperature, model_override)
     else:
         return get_gemini_llm(temperature, model_override)
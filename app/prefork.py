@@ -0,0 +1,70 @@
+"""
+Pre-fork model preloading for multi-worker deployments (see gunicorn.conf.py)
+
+The gunicorn master imports the app, loads the embedding model and the FAISS
+index read-only, then forks workers that share those pages copy-on-write
+instead of each loading its own copy.
+
+Fork-safety notes:
+- The FAISS index is built (if needed) in a *spawned* helper process and
+  persisted; the master only loads it. The master never runs torch
+  inference, so no OpenMP/intra-op thread pools exist at fork time.
+- gc.freeze() moves everything loaded so far into the permanent generation,
+  so the cyclic GC in workers doesn't touch (and copy) those pages.
+- No MySQL connections are opened before fork; a cached engine is disposed
+  in each worker anyway so sockets are never shared.
+"""
+import gc
+import os
+import sys
+import time
+import multiprocessing
+
+from app.warmup import parse_agents, run_warmup, warmup_status
+
+# SQL_Agent is excluded by default: its warm-up opens database connections
+DEFAULT_PRELOAD_AGENTS = "RAG_Agent,Forecast_Agent,General_Agent,Web_Agent"
+
+
+def _build_index():
+    from app.agents.rag_agent import _get_vectorstore
+    _get_vectorstore()
+
+
+def build_index_out_of_process():
+    """Build/persist the FAISS index in a spawned process so the master stays fork-safe."""
+    ctx = multiprocessing.get_context("spawn")
+    proc = ctx.Process(target=_build_index, name="sentinel-index-builder")
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        print(f"[PREFORK] ⚠️ Index builder exited with {proc.exitcode}; workers will build lazily")
+
+
+def preload_in_master():
+    started = time.perf_counter()
+    agents = parse_agents(os.getenv("PRELOAD_AGENTS", DEFAULT_PRELOAD_AGENTS))
+    print(f"[PREFORK] Preloading in master before fork: {', '.join(agents) or 'nothing'}")
+
+    if "RAG_Agent" in agents:
+        build_index_out_of_process()
+    run_warmup(agents)
+
+    gc.collect()
+    gc.freeze()
+    failed = [a for a, state in warmup_status().items() if state.get("status") != "ready"]
+    if failed:
+        print(f"[PREFORK] ⚠️ Not preloaded (will load lazily per worker): {', '.join(failed)}")
+    print(f"[PREFORK] ✅ Master ready in {time.perf_counter() - started:.2f}s, {gc.get_freeze_count()} objects frozen")
+
+
+def after_fork_in_worker():
+    # One small torch thread pool per worker instead of N workers x all cores
+    threads = int(os.getenv("WORKER_TORCH_THREADS", 1))
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+    sql_agent = sys.modules.get("app.agents.sql_agent")
+    if sql_agent is not None and sql_agent._db_cache is not None:
+        # Never share pooled connections across processes
+        sql_agent._db_cache._engine.dispose(close=False)
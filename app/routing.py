@@ -0,0 +1,92 @@
+"""
+Keyword routing rules shared by the Supervisor and offline tooling.
+Kept free of LLM/agent imports so benchmarks and mocks can reuse them.
+"""
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import Optional, Tuple
+
+SQL_KEYWORDS = ["database", "employee", "salary", "department", "count", "highest", "lowest", "earns", "select", "query", "table", "record"]
+RAG_TRIGGERS = ["document", "policy", "pdf", "file", "manual", "knowledge", "kb", "rag", "retrieve"]
+# Weaker hints that don't decide a route on their own but shift the speculative prior
+SOFT_HINTS = {
+    "SQL_Agent": ["how many", "average", "total", "sum of", "list", "show", "top ", "per ", "who ", "which",
+                  "most", "least", "hired", "manager", "title", "forecast", "predict", "trend"],
+    "General_Agent": ["what is", "what are", "explain", "why", "how do", "how does", "define", "meaning",
+                      "hello", "hi ", "thanks", "thank you", "help", "can you"],
+}
+WEB_TRIGGERS = ["web", "google", "bing", "latest", "news", "internet", "online", "search the web", "web search", "browse"]
+
+
+def keyword_route(text: str, has_data: bool = False) -> Optional[str]:
+    """
+    Fast keyword-based routing for obvious intents.
+    Returns the agent name, or None when the LLM has to decide.
+    """
+    lower = (text or "").lower()
+
+    # Check SQL keywords first (highest priority for DB queries)
+    # BUT if data already exists, don't loop back to SQL - go to General to summarize
+    if any(keyword in lower for keyword in SQL_KEYWORDS):
+        return "General_Agent" if has_data else "SQL_Agent"
+    if any(trigger in lower for trigger in RAG_TRIGGERS):
+        return "RAG_Agent"
+    if any(trigger in lower for trigger in WEB_TRIGGERS):
+        return "Web_Agent"
+    return None
+
+
+def parse_decision(decision: str) -> str:
+    """Robust fallback mapping of a free-text LLM routing decision to an agent name."""
+    if "SQL" in decision: return "SQL_Agent"
+    if "Forecast" in decision: return "Forecast_Agent"
+    if "RAG" in decision or "Document" in decision: return "RAG_Agent"
+    if "Web" in decision or "Search" in decision: return "Web_Agent"
+    return "General_Agent"
+
+
+class RoutingPrior:
+    """
+    Cheap guess of the Supervisor's LLM decision, used to start an agent
+    speculatively (app/speculation.py). A query seen recently reuses its last
+    decision; otherwise soft keyword hints are weighed against the recent
+    base rate of each decision. Returns (agent, confidence in 0..1).
+    """
+
+    def __init__(self, history_size: int = 500, memo_size: int = 2000):
+        self._recent = deque(maxlen=history_size)
+        self._by_query: "OrderedDict[str, str]" = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join((query or "").lower().split())
+
+    def record(self, query: str, decision: str):
+        key = self._key(query)
+        with self._lock:
+            self._recent.append(decision)
+            self._by_query[key] = decision
+            self._by_query.move_to_end(key)
+            while len(self._by_query) > self._memo_size:
+                self._by_query.popitem(last=False)
+
+    def predict(self, query: str) -> Tuple[Optional[str], float]:
+        key = self._key(query)
+        with self._lock:
+            memo = self._by_query.get(key)
+            counts = Counter(self._recent)
+        if memo:
+            return memo, 0.95
+        padded = f" {key} "
+        total = sum(counts[a] for a in SOFT_HINTS)
+        scores = {}
+        for agent, hints in SOFT_HINTS.items():
+            base = (counts[agent] + 1) / (total + len(SOFT_HINTS))  # Laplace-smoothed base rate
+            scores[agent] = base * 3.0 ** sum(1 for h in hints if h in padded)
+        best = max(scores, key=scores.get)
+        return best, scores[best] / sum(scores.values())
+
+
+routing_prior = RoutingPrior()
@@ -0,0 +1,75 @@
+"""
+Bounded key/value store shared by all worker processes
+With several gunicorn workers (app/prefork.py) a follow-up request such as
+/tables/{id}?offset=100 or /traces/{id} usually lands on a different worker
+than the one that produced the result. Captured tables and traces are
+therefore written to a SQLite file (WAL mode, safe across processes) and
+read back by whichever worker serves the follow-up. The oldest entries are
+evicted once max_size is exceeded. A small per-process LRU in front of it
+keeps the producing worker's own reads (e.g. the SQL node reusing a table
+for a forecast) off the disk.
+
+put/get block on SQLite (up to the 30 s busy timeout under write
+contention): call them from worker threads, or via asyncio.to_thread on the
+event loop.
+"""
+import os
+import sqlite3
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class SharedStore:
+    def __init__(self, path: str, max_size: int, encode: Callable[[Any], str], decode: Callable[[str], Any],
+                 cache_size: int = 8):
+        self.path = path
+        self.max_size = max_size
+        self.encode = encode
+        self.decode = decode
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @contextlib.contextmanager
+    def _db(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)")
+                self._ready = True
+            with conn:  # commit on success, rollback on error
+                yield conn
+        finally:
+            conn.close()
+
+    def _remember(self, key: str, value: Any):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, key: str, value: Any):
+        self._remember(key, value)
+        with self._db() as conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)", (key, self.encode(value)))
+            # rowids grow with every insert, so this drops the oldest entries beyond max_size
+            conn.execute("DELETE FROM entries WHERE rowid <= (SELECT MAX(rowid) FROM entries) - ?", (self.max_size,))
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        with self._db() as conn:
+            row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value = self.decode(row[0])
+        self._remember(key, value)
+        return value
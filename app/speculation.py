@@ -0,0 +1,196 @@
+"""
+Speculative agent execution (opt-in: SPECULATIVE_ROUTING=true)
+When the Supervisor has to ask the LLM, the most likely agent (per
+app.routing.routing_prior) starts at the same time, on a worker thread:
+  - hit: the Supervisor agrees; the agent's graph node picks up the
+    already-running result instead of starting from scratch, so the routing
+    call and the agent overlap instead of adding up
+  - miss: the speculative run is cancelled through its child Deadline and
+    stops at its next LLM/tool/SQL boundary; its time is counted as waste
+Only the first, data-less Supervisor hop speculates, only side-effect-free
+agents (SPECULATIVE_AGENTS) are candidates, and nothing is started when the
+prior is unsure or the agent's bulkhead has no free slot.
+
+Metrics: speculation_started_total, speculation_hits_total,
+speculation_misses_total, speculation_skipped_total, speculation_hit_rate,
+speculation_overlap_seconds_total (routing time hidden by hits) and
+speculation_wasted_seconds_total (agent time thrown away by misses).
+
+Configuration (environment):
+  SPECULATIVE_ROUTING=false  SPECULATIVE_AGENTS="SQL_Agent,General_Agent"
+  SPECULATION_MIN_CONFIDENCE=0.6  SPECULATION_WORKERS=8
+"""
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.admission import bulkheads
+from app.deadline import Deadline
+from app.metrics import metrics
+from app.routing import routing_prior
+
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "false").lower() == "true"
+SPECULATIVE_AGENTS = [a.strip() for a in os.getenv("SPECULATIVE_AGENTS", "SQL_Agent,General_Agent").split(",") if a.strip()]
+SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", 0.6))
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", 8))
+
+# GLOBAL CACHE (speculation worker pool + outcome counters for the hit-rate gauge)
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_running = 0
+_outcomes = {"hit": 0, "miss": 0}
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculate")
+        return _pool
+
+
+def _release():
+    global _running
+    with _lock:
+        _running -= 1
+
+
+def _count(outcome: str):
+    with _lock:
+        _outcomes[outcome] += 1
+        total = _outcomes["hit"] + _outcomes["miss"]
+        metrics.set_gauge("speculation_hit_rate", round(_outcomes["hit"] / total, 4))
+
+
+class Speculation:
+    """One speculative agent run, resolved by the Supervisor's decision."""
+
+    def __init__(self, agent: str, confidence: float, deadline: Deadline):
+        self.agent = agent
+        self.confidence = confidence
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.future = None
+        self.outcome: Optional[str] = None
+        self.run_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _run(self, node: Callable, state: Dict[str, Any]):
+        started = time.monotonic()
+        try:
+            return node(state)
+        finally:
+            _release()
+            with self._lock:
+                self.run_seconds = time.monotonic() - started
+                wasted = self.outcome == "miss"
+            if wasted:
+                metrics.inc("speculation_wasted_seconds_total", self.run_seconds, agent=self.agent)
+
+    def resolve(self, decision: str) -> bool:
+        """Keep the run if the Supervisor chose the same agent, cancel it otherwise."""
+        if decision == self.agent:
+            with self._lock:
+                self.outcome = "hit"
+            _count("hit")
+            metrics.inc("speculation_hits_total", agent=self.agent)
+            # Routing latency that ran in parallel with the agent instead of before it
+            metrics.inc("speculation_overlap_seconds_total", time.monotonic() - self.started, agent=self.agent)
+            return True
+        self.cancel(decision)
+        return False
+
+    def cancel(self, actual: str = "error"):
+        with self._lock:
+            if self.outcome is not None:
+                return
+            self.outcome = "miss"
+            finished = self.run_seconds
+        _count("miss")
+        metrics.inc("speculation_misses_total", predicted=self.agent, actual=actual)
+        self.deadline.cancel("speculation_miss")
+        if self.future.cancel():
+            _release()  # never started, so _run won't release its slot
+        elif finished is not None:
+            # Already done before the decision arrived: all of it was wasted
+            metrics.inc("speculation_wasted_seconds_total", finished, agent=self.agent)
+        print(f"[SPECULATION] Miss: started {self.agent}, Supervisor chose {actual}")
+
+    def result(self):
+        return self.future.result(timeout=self.deadline.remaining() + 1.0)
+
+
+def speculate(query: str, state: Dict[str, Any], supervisor_count: int, nodes: Dict[str, Callable]) -> Optional[Speculation]:
+    """Start the likeliest agent alongside the Supervisor's LLM call, if the prior is confident enough."""
+    global _running
+    agent, confidence = routing_prior.predict(query)
+    if agent not in SPECULATIVE_AGENTS or agent not in nodes:
+        metrics.inc("speculation_skipped_total", reason="not_speculative")
+        return None
+    if confidence < SPECULATION_MIN_CONFIDENCE:
+        metrics.inc("speculation_skipped_total", reason="low_confidence")
+        return None
+    bulkhead = bulkheads.get(agent)
+    if bulkhead is not None and bulkhead.active >= bulkhead.limit:
+        # Never queue speculative work behind real requests
+        metrics.inc("speculation_skipped_total", reason="bulkhead_busy")
+        return None
+    with _lock:
+        if _running >= SPECULATION_WORKERS:
+            metrics.inc("speculation_skipped_total", reason="pool_busy")
+            return None
+        _running += 1
+
+    parent = state.get("deadline")
+    deadline = parent.child() if parent is not None else Deadline()
+    spec = Speculation(agent, confidence, deadline)
+    # Exactly what the agent's node would see after the Supervisor routed to it
+    spec_state = {**state, "next": agent, "agent_decision": agent, "supervisor_count": supervisor_count, "deadline": deadline}
+    ctx = contextvars.copy_context()
+    spec.future = _get_pool().submit(ctx.run, spec._run, nodes[agent], spec_state)
+    metrics.inc("speculation_started_total", agent=agent)
+    print(f"[SPECULATION] Started {agent} (confidence {confidence:.2f}) alongside the Supervisor")
+    return spec
+
+
+def speculated(agent: str):
+    """Decorator for agent nodes: adopt a matching speculative run instead of starting over."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(state):
+            spec = state.get("speculation")
+            if spec is None or spec.agent != agent:
+                return fn(state)
+            try:
+                result = spec.result()
+            except Exception as e:
+                metrics.inc("speculation_failed_total", agent=agent)
+                print(f"⚠️ [SPECULATION] Speculative {agent} failed ({e}), running it normally")
+                return {**fn(state), "speculation": None}
+            return {**result, "speculation": None}
+        return wrapper
+    return decorator
+
+
+def aspeculated(agent: str):
+    """Async counterpart of speculated: await the speculative run without holding a thread."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(state):
+            spec = state.get("speculation")
+            if spec is None or spec.agent != agent:
+                return await fn(state)
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(spec.future), spec.deadline.remaining() + 1.0)
+            except Exception as e:
+                metrics.inc("speculation_failed_total", agent=agent)
+                print(f"⚠️ [SPECULATION] Speculative {agent} failed ({e}), running it normally")
+                return {**await fn(state), "speculation": None}
+            return {**result, "speculation": None}
+        return wrapper
+    return decorator
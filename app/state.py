@@ -16,9 +16,18 @@ class AgentState(TypedDict, total=False):
     # Supervisor routing decision
     agent_decision: str
 
+    # Routing decided ahead of time (batched supervisor call in /chat/batch)
+    route_hint: Optional[str]
+
     # SQL context returned from SQL agent
     sql_context: List[Dict[str, Any]]
 
+    # Summaries of result sets captured by the SQL tool (rows in app/tables.py)
+    tables: List[Dict[str, Any]]
+
+    # Registered series the Supervisor matched (served from app/forecast_store.py)
+    forecast_series: Optional[str]
+
     # Forecasting results from forecasting agent
     forecast_result: Optional[Any]
 
@@ -27,4 +36,10 @@ class AgentState(TypedDict, total=False):
     sql_data: List[Dict[str, Any]]
     
     # Loop prevention counter
-    supervisor_count: int
\ No newline at end of file
+    supervisor_count: int
+
+    # Request deadline / cancel flag (app.deadline.Deadline, shared with the API)
+    deadline: Optional[Any]
+
+    # Speculative agent run the Supervisor agreed with (app.speculation.Speculation)
+    speculation: Optional[Any]
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Structured SQL results
+The SQL agent's query tool captures result sets as tables, held here in
+column-oriented form. The LLM only sees a short preview. /chat returns table
+summaries (id, columns, row count), and clients fetch rows page by page from
+/tables/{id} as columnar JSON, or as Arrow IPC when pyarrow is installed.
+
+Like traces, tables are kept in a bounded SQLite store shared by all worker
+processes (app/shared_store.py), so paging works whichever worker answers.
+
+Configuration (environment):
+  TABLE_STORE_PATH=.cache/tables.sqlite  TABLE_STORE_SIZE=50
+  TABLE_MAX_ROWS=10000  TABLE_PAGE_SIZE=100  TABLE_MAX_PAGE_SIZE=5000
+"""
+import os
+import json
+import time
+import uuid
+import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from app.shared_store import SharedStore
+
+TABLE_STORE_PATH = os.getenv("TABLE_STORE_PATH", os.path.join(".cache", "tables.sqlite"))
+TABLE_STORE_SIZE = int(os.getenv("TABLE_STORE_SIZE", 50))
+TABLE_MAX_ROWS = int(os.getenv("TABLE_MAX_ROWS", 10000))
+TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", 100))
+TABLE_MAX_PAGE_SIZE = int(os.getenv("TABLE_MAX_PAGE_SIZE", 5000))
+# Rows the LLM sees in the tool output; the rest stay out of the prompt
+TABLE_PREVIEW_ROWS = int(os.getenv("TABLE_PREVIEW_ROWS", 50))
+
+
+def jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def _dtype(values: List[Any]) -> str:
+    sample = next((v for v in values if v is not None), None)
+    if sample is None:
+        return "null"
+    if isinstance(sample, bool):
+        return "bool"
+    if isinstance(sample, int):
+        return "int"
+    if isinstance(sample, (float, Decimal)):
+        return "float"
+    if isinstance(sample, datetime.datetime):
+        return "datetime"
+    if isinstance(sample, datetime.date):
+        return "date"
+    return "str"
+
+
+class Table:
+    """A captured result set stored column by column."""
+
+    def __init__(self, sql: str, columns: List[str], rows: List[tuple], truncated: bool = False):
+        self.id = uuid.uuid4().hex[:16]
+        self.sql = sql
+        self.columns = list(columns)
+        raw = [list(col) for col in zip(*rows)] if rows else [[] for _ in self.columns]
+        self.dtypes = [_dtype(col) for col in raw]
+        self.data = [[jsonable(v) for v in col] for col in raw]
+        self.total_rows = len(rows)
+        self.truncated = truncated
+        self.created = time.time()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "table_id": self.id,
+            "columns": self.columns,
+            "dtypes": self.dtypes,
+            "total_rows": self.total_rows,
+            "truncated": self.truncated,
+            "sql": self.sql,
+        }
+
+    def page(self, offset: int = 0, limit: int = TABLE_PAGE_SIZE) -> Dict[str, Any]:
+        offset = max(0, offset)
+        limit = max(1, min(limit, TABLE_MAX_PAGE_SIZE))
+        return {
+            **self.summary(),
+            "offset": offset,
+            "limit": limit,
+            "data": [col[offset:offset + limit] for col in self.data],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({k: getattr(self, k) for k in
+                           ("id", "sql", "columns", "dtypes", "data", "total_rows", "truncated", "created")})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "Table":
+        table = cls.__new__(cls)
+        table.__dict__.update(json.loads(payload))
+        return table
+
+    def records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        n = self.total_rows if limit is None else min(limit, self.total_rows)
+        return [{c: self.data[j][i] for j, c in enumerate(self.columns)} for i in range(n)]
+
+    def to_arrow(self, offset: int = 0, limit: int = TABLE_PAGE_SIZE) -> bytes:
+        import pyarrow as pa
+
+        page = self.page(offset, limit)
+        batch = pa.RecordBatch.from_pydict(dict(zip(self.columns, page["data"])))
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+
+class TableStore:
+    """Bounded store of captured tables, shared across worker processes."""
+
+    def __init__(self, path: str = TABLE_STORE_PATH, max_size: int = TABLE_STORE_SIZE):
+        self._store = SharedStore(path, max_size, Table.to_json, Table.from_json)
+
+    def put(self, table: Table) -> Table:
+        self._store.put(table.id, table)
+        return table
+
+    def get(self, table_id: str) -> Optional[Table]:
+        return self._store.get(table_id)
+
+
+table_store = TableStore()
@@ -0,0 +1,322 @@
+"""
+Per-request execution tracing
+Records a span tree of graph nodes, LLM calls, tool calls and CPU-heavy
+sections (wall + CPU time) for a single /chat request. Finished traces are
+kept in a bounded SQLite store shared by all worker processes
+(app/shared_store.py) so they can be fetched via /traces/{id} from any worker
+and exported as Chrome trace-event JSON (chrome://tracing, Perfetto, speedscope).
+
+Configuration (environment):
+  TRACE_STORE_PATH=.cache/traces.sqlite  TRACE_STORE_SIZE=200
+"""
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.shared_store import SharedStore
+
+TRACE_STORE_PATH = os.getenv("TRACE_STORE_PATH", os.path.join(".cache", "traces.sqlite"))
+TRACE_STORE_SIZE = int(os.getenv("TRACE_STORE_SIZE", 200))
+
+# Trace of the request currently executing (None when tracing is off)
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("sentinel_trace", default=None)
+
+
+class Span:
+    """One timed section of a trace."""
+
+    __slots__ = ("id", "parent_id", "name", "kind", "tid", "start", "end",
+                 "cpu_start", "cpu_end", "attrs", "error")
+
+    def __init__(self, name: str, kind: str, parent_id: Optional[str], attrs: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.cpu_start = time.thread_time()
+        self.cpu_end: Optional[float] = None
+        self.attrs = dict(attrs or {})
+        self.error: Optional[str] = None
+
+    def finish(self, error: Optional[str] = None):
+        self.end = time.perf_counter()
+        # Thread CPU time is only meaningful if the span ends on the thread it started on
+        if threading.get_ident() == self.tid:
+            self.cpu_end = time.thread_time()
+        self.error = error
+
+    @property
+    def wall_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+    @property
+    def cpu_ms(self) -> Optional[float]:
+        return None if self.cpu_end is None else (self.cpu_end - self.cpu_start) * 1000
+
+
+class Trace:
+    """Collection of spans recorded for a single request."""
+
+    def __init__(self, query: str = ""):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.created_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        # Per-thread stack of open spans, used to parent manual spans
+        self._open: Dict[int, List[Span]] = {}
+
+    def start_span(self, name: str, kind: str, parent_id: Optional[str] = None, attrs: Optional[Dict[str, Any]] = None) -> Span:
+        tid = threading.get_ident()
+        with self._lock:
+            stack = self._open.setdefault(tid, [])
+            if parent_id is None and stack:
+                parent_id = stack[-1].id
+            span = Span(name, kind, parent_id, attrs)
+            self.spans.append(span)
+            stack.append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[str] = None):
+        span.finish(error)
+        with self._lock:
+            stack = self._open.get(span.tid, [])
+            if span in stack:
+                stack.remove(span)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Span tree with wall/CPU times in milliseconds relative to trace start."""
+        with self._lock:
+            spans = list(self.spans)
+
+        nodes = {}
+        for s in spans:
+            nodes[s.id] = {
+                "id": s.id,
+                "name": s.name,
+                "kind": s.kind,
+                "start_ms": round((s.start - self.origin) * 1000, 3),
+                "wall_ms": None if s.wall_ms is None else round(s.wall_ms, 3),
+                "cpu_ms": None if s.cpu_ms is None else round(s.cpu_ms, 3),
+                "attrs": s.attrs,
+                "error": s.error,
+                "children": [],
+            }
+        roots = []
+        for s in spans:
+            parent = nodes.get(s.parent_id) if s.parent_id else None
+            (parent["children"] if parent else roots).append(nodes[s.id])
+
+        ends = [s.end for s in spans if s.end is not None]
+        return {
+            "trace_id": self.id,
+            "query": self.query,
+            "created_at": self.created_at,
+            "duration_ms": round((max(ends) - self.origin) * 1000, 3) if ends else 0.0,
+            "spans": roots,
+        }
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """Chrome trace-event format ("X" complete events, microseconds)."""
+        with self._lock:
+            spans = list(self.spans)
+
+        # Map OS thread ids to small, stable lane numbers
+        lanes: Dict[int, int] = {}
+        events = []
+        for s in spans:
+            lane = lanes.setdefault(s.tid, len(lanes) + 1)
+            end = s.end if s.end is not None else time.perf_counter()
+            args = dict(s.attrs)
+            if s.cpu_ms is not None:
+                args["cpu_ms"] = round(s.cpu_ms, 3)
+            if s.error:
+                args["error"] = s.error
+            events.append({
+                "name": s.name,
+                "cat": s.kind,
+                "ph": "X",
+                "ts": round((s.start - self.origin) * 1e6, 1),
+                "dur": round((end - s.start) * 1e6, 1),
+                "pid": 1,
+                "tid": lane,
+                "args": args,
+            })
+        for tid, lane in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": lane,
+                           "args": {"name": f"thread-{lane}"}})
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"trace_id": self.id, "query": self.query},
+        }
+
+
+class StoredTrace:
+    """A finished trace as read back from the shared store (rendered forms only)."""
+
+    def __init__(self, tree: Dict[str, Any], chrome: Dict[str, Any]):
+        self.id = tree.get("trace_id")
+        self._tree = tree
+        self._chrome = chrome
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._tree
+
+    def to_chrome(self) -> Dict[str, Any]:
+        return self._chrome
+
+
+def _encode_trace(trace) -> str:
+    return json.dumps({"tree": trace.to_dict(), "chrome": trace.to_chrome()})
+
+
+def _decode_trace(payload: str) -> StoredTrace:
+    data = json.loads(payload)
+    return StoredTrace(data["tree"], data["chrome"])
+
+
+class TraceStore:
+    """Bounded store of finished traces, shared across worker processes."""
+
+    def __init__(self, path: str = TRACE_STORE_PATH, max_size: int = TRACE_STORE_SIZE):
+        self._store = SharedStore(path, max_size, _encode_trace, _decode_trace)
+
+    def put(self, trace: Trace):
+        self._store.put(trace.id, trace)
+
+    def get(self, trace_id: str):
+        return self._store.get(trace_id)
+
+
+trace_store = TraceStore()
+
+
+def get_current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(query: str = "", store: bool = True):
+    """
+    Activate a new trace for the current context and store it when done.
+    On the event loop pass store=False and write it with
+    `await asyncio.to_thread(trace_store.put, trace)`: the store is SQLite.
+    """
+    trace = Trace(query)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if store:
+            trace_store.put(trace)
+
+
+@contextmanager
+def span(name: str, kind: str = "cpu", **attrs):
+    """
+    Time a section of code inside the active trace.
+    No-op (besides a contextvar lookup) when the request is not traced.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    s = trace.start_span(name, kind, attrs=attrs)
+    try:
+        yield s
+    except BaseException as e:
+        trace.end_span(s, error=repr(e))
+        raise
+    else:
+        trace.end_span(s)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback that turns graph node, LLM and tool runs into spans.
+    Pass via config={"callbacks": [handler]}; LangGraph propagates it to
+    every nested agent/LLM/tool invocation.
+    """
+
+    # Run synchronously inside the worker that does the work so CPU time is attributed correctly
+    run_inline = True
+
+    def __init__(self, trace: Trace, root_span: Optional[Span] = None):
+        self.trace = trace
+        self.root_id = root_span.id if root_span else None
+        self._spans: Dict[Any, Span] = {}
+        # Runs we don't record (plumbing chains) resolve to their nearest recorded ancestor
+        self._alias: Dict[Any, Optional[str]] = {}
+
+    def _parent(self, parent_run_id) -> Optional[str]:
+        if parent_run_id is None:
+            return self.root_id
+        if parent_run_id in self._spans:
+            return self._spans[parent_run_id].id
+        return self._alias.get(parent_run_id, self.root_id)
+
+    def _start(self, run_id, parent_run_id, name, kind, attrs=None):
+        self._spans[run_id] = self.trace.start_span(name, kind, parent_id=self._parent(parent_run_id), attrs=attrs)
+
+    def _end(self, run_id, error=None, attrs=None):
+        s = self._spans.pop(run_id, None)
+        if s is not None:
+            if attrs:
+                s.attrs.update(attrs)
+            self.trace.end_span(s, error=error)
+        self._alias.pop(run_id, None)
+
+    # --- Chains (only LangGraph nodes become spans) ---
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "chain")
+        node = (metadata or {}).get("langgraph_node")
+        if node and name == node:
+            self._start(run_id, parent_run_id, node, "node", {"step": (metadata or {}).get("langgraph_step")})
+        else:
+            self._alias[run_id] = self._parent(parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "chat_model")
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm", {"model": model, "messages": sum(len(m) for m in messages)})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, parent_run_id, f"llm:{model}", "llm", {"model": model})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+        self._end(run_id, attrs={"token_usage": usage} if usage else None)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
+
+    # --- Tool calls ---
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name", "tool")
+        self._start(run_id, parent_run_id, f"tool:{name}", "tool", {"input": str(input_str)[:200]})
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=repr(error))
@@ -0,0 +1,123 @@
+"""
+Agent warm-up
+Agents and their heavy dependencies load lazily on first use. This module
+lets a worker preload chosen agents in the background (POST /warmup or the
+WARMUP_AGENTS startup hook) so the first real request doesn't pay for it.
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+_graph_lock = threading.Lock()
+_agent_app = None
+
+
+def load_agent_app():
+    """Import and compile the LangGraph app once (mock or real, per USE_MOCK)."""
+    global _agent_app
+    if _agent_app is None:
+        with _graph_lock:
+            if _agent_app is None:
+                if os.getenv("USE_MOCK", "false").lower() == "true":
+                    from app.graph_mock import app as graph_app
+                else:
+                    from app.graph import app as graph_app
+                _agent_app = graph_app
+    return _agent_app
+
+
+def _warm_graph():
+    load_agent_app()
+
+
+def _warm_sql():
+    from app.agents.sql_agent import get_database
+    from langchain_community.agent_toolkits import SQLDatabaseToolkit  # noqa: F401
+    get_database()
+
+
+def _warm_forecast():
+    import app.agents.forecast_agent  # noqa: F401
+    import pandas  # noqa: F401
+    from prophet import Prophet  # noqa: F401
+
+
+def _warm_rag():
+    from app.agents.rag_agent import _get_vectorstore
+    _get_vectorstore()
+
+
+def _warm_web():
+    import app.agents.web_search_agent  # noqa: F401
+
+
+def _warm_general():
+    import app.agents.general_agent  # noqa: F401
+
+
+AGENT_WARMERS: Dict[str, Callable[[], None]] = {
+    "SQL_Agent": _warm_sql,
+    "Forecast_Agent": _warm_forecast,
+    "RAG_Agent": _warm_rag,
+    "Web_Agent": _warm_web,
+    "General_Agent": _warm_general,
+}
+
+_lock = threading.Lock()
+# agent -> {"status": pending|loading|ready|error, "seconds": float, "error": str}
+_status: Dict[str, Dict[str, object]] = {}
+
+
+def parse_agents(spec: Optional[str]) -> List[str]:
+    """'all' or a comma-separated list of agent names."""
+    if not spec:
+        return []
+    if spec.strip().lower() == "all":
+        return list(AGENT_WARMERS)
+    return [a.strip() for a in spec.split(",") if a.strip()]
+
+
+def run_warmup(agents: List[str]):
+    """Warm agents synchronously in the calling thread (used by the pre-fork master)."""
+    for agent in agents:
+        with _lock:
+            _status[agent] = {"status": "loading"}
+        started = time.perf_counter()
+        try:
+            _warm_graph()
+            AGENT_WARMERS[agent]()
+            result = {"status": "ready"}
+            print(f"[WARMUP] ✅ {agent} ready in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            result = {"status": "error", "error": str(e)}
+            print(f"[WARMUP] ⚠️ {agent} failed: {e}")
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        with _lock:
+            _status[agent] = result
+
+
+def start_warmup(agents: Iterable[str]) -> List[str]:
+    """Warm the given agents in a daemon thread; returns the agents actually scheduled."""
+    unknown = [a for a in agents if a not in AGENT_WARMERS]
+    if unknown:
+        raise ValueError(f"Unknown agents: {', '.join(unknown)}. Choose from: {', '.join(AGENT_WARMERS)}")
+
+    with _lock:
+        todo = [a for a in agents if _status.get(a, {}).get("status") not in ("loading", "ready", "pending")]
+        for agent in todo:
+            _status[agent] = {"status": "pending"}
+    if todo:
+        threading.Thread(target=run_warmup, args=(todo,), name="sentinel-warmup", daemon=True).start()
+    return todo
+
+
+def warmup_status() -> Dict[str, Dict[str, object]]:
+    with _lock:
+        return {agent: dict(state) for agent, state in _status.items()}
+
+
+def is_warming() -> bool:
+    """True while any scheduled warm-up is still pending or loading (health gating)."""
+    with _lock:
+        return any(state.get("status") in ("pending", "loading") for state in _status.values())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Embedding backend benchmark on the data/ corpus.
+
+Chunks data/ exactly like the RAG agent, then for each backend (torch, onnx,
+onnx-int8; see app/embeddings.py) measures:
+  - throughput: sentences/sec embedding all chunks (after a warm-up pass)
+  - query latency: single embed_query p50/p95
+  - drift vs. the torch baseline: mean/min cosine similarity of the same
+    chunk's vectors, and top-k retrieval overlap (recall@k) for a query set
+
+Usage:
+    python -m benchmarks.embedding_bench
+    python -m benchmarks.embedding_bench --backends torch,onnx-int8 --threads 4 --k 4 --out embed.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERIES = [
+    "What was Walmart's total revenue?",
+    "How many associates does the company employ?",
+    "What are the main risk factors?",
+    "Describe the e-commerce growth strategy.",
+    "What is the dividend policy?",
+    "How did operating income change year over year?",
+    "What are the sustainability goals?",
+    "Who is on the board of directors?",
+]
+
+
+def load_chunks(data_dir: str):
+    from langchain_community.document_loaders import DirectoryLoader, PyPDFLoader, TextLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    docs = DirectoryLoader(data_dir, glob="**/*.pdf", loader_cls=PyPDFLoader).load()
+    docs.extend(DirectoryLoader(data_dir, glob="**/*.txt", loader_cls=TextLoader).load())
+    splits = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(docs)
+    return [d.page_content for d in splits]
+
+
+def sample_queries(chunks, n, seed):
+    """Built-in questions plus first sentences of random chunks (self-retrieval probes)."""
+    rng = random.Random(seed)
+    probes = []
+    for chunk in rng.sample(chunks, min(n, len(chunks))):
+        sentence = chunk.strip().split(". ")[0][:200]
+        if len(sentence) > 20:
+            probes.append(sentence)
+    return DEFAULT_QUERIES + probes
+
+
+def top_k(doc_vecs, query_vecs, k):
+    # Vectors are L2-normalized, so inner product == cosine similarity
+    scores = query_vecs @ doc_vecs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def bench_backend(name, chunks, queries, args):
+    from app.embeddings import create_embeddings, OnnxEmbeddings
+
+    started = time.perf_counter()
+    if name == "torch":
+        emb = create_embeddings("torch")
+        if args.threads:
+            import torch
+            torch.set_num_threads(args.threads)
+    else:
+        emb = OnnxEmbeddings(quantize=(name == "onnx-int8"), intra_op_threads=args.threads or None)
+    load_s = time.perf_counter() - started
+
+    emb.embed_documents(chunks[: min(32, len(chunks))])  # warm-up
+    started = time.perf_counter()
+    doc_vecs = np.asarray(emb.embed_documents(chunks), dtype=np.float32)
+    embed_s = time.perf_counter() - started
+
+    latencies = []
+    query_vecs = []
+    for q in queries:
+        t = time.perf_counter()
+        query_vecs.append(emb.embed_query(q))
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    return {
+        "load_s": round(load_s, 2),
+        "embed_s": round(embed_s, 3),
+        "sentences_per_s": round(len(chunks) / embed_s, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 2),
+        "query_p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+    }, doc_vecs, np.asarray(query_vecs, dtype=np.float32)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Embedding backend throughput and retrieval drift")
+    p.add_argument("--backends", default="torch,onnx,onnx-int8")
+    p.add_argument("--data-dir", default=os.path.join(REPO_ROOT, "data"))
+    p.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_THREADS", 0)),
+                   help="Intra-op threads for every backend (0 = library default)")
+    p.add_argument("--k", type=int, default=4, help="Retriever top-k (langchain default is 4)")
+    p.add_argument("--probe-queries", type=int, default=40)
+    p.add_argument("--limit", type=int, default=0, help="Only embed the first N chunks")
+    p.add_argument("--seed", type=int, default=13)
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+
+    chunks = load_chunks(args.data_dir)
+    if args.limit:
+        chunks = chunks[: args.limit]
+    if not chunks:
+        print(f"❌ No documents found in {args.data_dir}")
+        return 1
+    queries = sample_queries(chunks, args.probe_queries, args.seed)
+    print(f"Corpus: {len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # drift is measured against the torch baseline
+
+    results, base_docs, base_hits = {}, None, None
+    for name in backends:
+        print(f"🔄 {name}...")
+        stats, doc_vecs, query_vecs = bench_backend(name, chunks, queries, args)
+        hits = top_k(doc_vecs, query_vecs, args.k)
+        if name == "torch":
+            base_docs, base_hits = doc_vecs, hits
+        cosine = (doc_vecs * base_docs).sum(axis=1)
+        overlap = [len(set(a) & set(b)) / args.k for a, b in zip(hits, base_hits)]
+        stats.update({
+            "mean_cosine_vs_torch": round(float(cosine.mean()), 5),
+            "min_cosine_vs_torch": round(float(cosine.min()), 5),
+            f"recall@{args.k}_vs_torch": round(float(np.mean(overlap)), 4),
+            "top1_agreement": round(float(np.mean(hits[:, 0] == base_hits[:, 0])), 4),
+        })
+        results[name] = stats
+
+    base_rate = results["torch"]["sentences_per_s"]
+    print(f"\n{'backend':<11}{'sent/s':>9}{'speedup':>9}{'q p50':>9}{'q p95':>9}{'cos mean':>10}{'cos min':>9}{'recall':>8}{'top1':>7}")
+    for name, s in results.items():
+        print(f"{name:<11}{s['sentences_per_s']:>9.1f}{s['sentences_per_s'] / base_rate:>8.2f}x"
+              f"{s['query_p50_ms']:>9.2f}{s['query_p95_ms']:>9.2f}{s['mean_cosine_vs_torch']:>10.4f}"
+              f"{s['min_cosine_vs_torch']:>9.4f}{s[f'recall@{args.k}_vs_torch']:>8.3f}{s['top1_agreement']:>7.3f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"chunks": len(chunks), "queries": len(queries), "k": args.k,
+                       "threads": args.threads, "backends": results}, f, indent=2)
+        print(f"\n💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Federated client training throughput: fixed padding vs. dynamic padding vs. packing.
+
+Trains the client's LoRA model (tiny random Llama on CPU by default) for
+--epochs passes over the feedback log plus --synthetic generated records
+of varied length, with three batching modes:
+  fixed    - the old pipeline: every example padded/truncated to 128 tokens,
+             batch size 1 (what SentinelClient.fit used to do)
+  dynamic  - per-batch padding with length-grouped batches (group_by_length)
+  packed   - first-fit packing into FL_MAX_SEQ_LEN rows with block-diagonal masks
+and reports real (non-pad) tokens/sec, pad fraction and speedup. It also
+times the token cache cold vs. warm.
+
+Usage (from the repo root):
+    python -m benchmarks.fl_train_bench
+    python -m benchmarks.fl_train_bench --synthetic 512 --epochs 2 --batch-size 8 --out fl_train.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+TINY_MODEL = "hf-internal-testing/tiny-random-LlamaForCausalLM"
+
+
+def synthetic_records(seed_records, n, seed):
+    """Records with a long-tailed length mix, built from words in the real feedback."""
+    rng = random.Random(seed)
+    words = " ".join(f"{r['instruction']} {r['output']}" for r in seed_records).split() or ["salary"]
+    out = []
+    for i in range(n):
+        q = " ".join(rng.choices(words, k=max(3, int(rng.lognormvariate(2.3, 0.5)))))
+        a = " ".join(rng.choices(words, k=max(3, int(rng.lognormvariate(3.2, 0.9)))))
+        out.append({"id": f"synthetic-{i}", "instruction": q, "output": a})
+    return out
+
+
+def run_mode(mode, client, token_ids, args):
+    import torch
+    from torch.utils.data import DataLoader
+    from transformers.trainer_pt_utils import LengthGroupedSampler
+    from federated.data import PaddingCollator, build_dataset
+
+    pad_id = client.tokenizer.pad_token_id
+    if mode == "fixed":
+        token_ids = [ids[:args.fixed_length] for ids in token_ids]
+        dataset = build_dataset(token_ids, packed=False)
+        collator = PaddingCollator(pad_id, pad_to_multiple_of=args.fixed_length)
+        loader = DataLoader(dataset, batch_size=args.fixed_batch_size, shuffle=True, collate_fn=collator)
+    else:
+        dataset = build_dataset(token_ids, packed=(mode == "packed"), max_length=args.max_length)
+        collator = PaddingCollator(pad_id)
+        sampler = None
+        if mode == "dynamic":
+            sampler = LengthGroupedSampler(args.batch_size, lengths=dataset["length"])
+        loader = DataLoader(dataset, batch_size=args.batch_size, sampler=sampler,
+                            shuffle=sampler is None, collate_fn=collator)
+
+    model = client.model
+    model.train()
+    optimizer = torch.optim.AdamW([p for p in model.parameters() if p.requires_grad], lr=2e-4)
+    real = sum(len(ids) for ids in token_ids) * args.epochs
+    padded, steps, losses = 0, 0, []
+    started = time.perf_counter()
+    for _ in range(args.epochs):
+        for batch in loader:
+            loss = model(**batch).loss
+            loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+            padded += batch["input_ids"].numel()
+            steps += 1
+            losses.append(loss.item())
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": len(dataset),
+        "steps": steps,
+        "seconds": round(elapsed, 3),
+        "real_tokens": real,
+        "padded_tokens": padded,
+        "pad_fraction": round(1 - real / max(padded, 1), 4),
+        "real_tokens_per_s": round(real / elapsed, 1),
+        "final_loss": round(sum(losses[-10:]) / len(losses[-10:]), 4) if losses else None,
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Client training tokens/sec by batching mode")
+    p.add_argument("--model", default=TINY_MODEL)
+    p.add_argument("--modes", default="fixed,dynamic,packed")
+    p.add_argument("--synthetic", type=int, default=256, help="Extra generated records of varied length")
+    p.add_argument("--epochs", type=int, default=1)
+    p.add_argument("--batch-size", type=int, default=4)
+    p.add_argument("--fixed-batch-size", type=int, default=1)
+    p.add_argument("--fixed-length", type=int, default=128)
+    p.add_argument("--max-length", type=int, default=512)
+    p.add_argument("--seed", type=int, default=13)
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+
+    import torch
+    from federated.client import SentinelClient
+    from federated.data import TokenCache
+
+    torch.manual_seed(args.seed)
+    random.seed(args.seed)
+    client = SentinelClient(model_name=args.model, quantize=False, unseen_only=False)
+    records = list(client.store.read())
+    records += synthetic_records(records, args.synthetic, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TokenCache(client.tokenizer, max_length=args.max_length, cache_dir=tmp)
+        t = time.perf_counter()
+        token_ids = cache.get(0, records)
+        cold_ms = (time.perf_counter() - t) * 1000
+        t = time.perf_counter()
+        TokenCache(client.tokenizer, max_length=args.max_length, cache_dir=tmp).get(0, records)
+        warm_ms = (time.perf_counter() - t) * 1000
+    lengths = sorted(len(ids) for ids in token_ids)
+    print(f"{len(records)} records, tokens p50={lengths[len(lengths) // 2]} max={lengths[-1]}, "
+          f"{sum(1 for n in lengths if n > args.fixed_length)} longer than {args.fixed_length}")
+    print(f"Token cache: cold {cold_ms:.1f} ms, warm (reloaded from disk) {warm_ms:.1f} ms")
+
+    initial = {k: v.detach().clone() for k, v in client.model.state_dict().items() if "lora_" in k}
+    results = {}
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        client.model.load_state_dict(initial, strict=False)  # same starting adapters for every mode
+        print(f"🔄 {mode}...")
+        results[mode] = run_mode(mode, client, token_ids, args)
+
+    base = results.get("fixed", next(iter(results.values())))["real_tokens_per_s"]
+    print(f"\n{'mode':<9}{'rows':>6}{'steps':>7}{'sec':>9}{'real tok/s':>12}{'pad %':>8}{'speedup':>9}{'loss':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<9}{r['rows']:>6}{r['steps']:>7}{r['seconds']:>9.2f}{r['real_tokens_per_s']:>12.1f}"
+              f"{r['pad_fraction'] * 100:>7.1f}%{r['real_tokens_per_s'] / base:>8.2f}x{r['final_loss'] or 0:>8.3f}")
+    print("(fixed truncates to --fixed-length, so it processes fewer real tokens)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"records": len(records), "token_cache_ms": {"cold": round(cold_ms, 2), "warm": round(warm_ms, 2)},
+                       "modes": results}, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
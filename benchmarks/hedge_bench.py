@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Tail-latency benchmark for hedged LLM calls (app/hedging.py), fully offline.
+
+Two fake providers stand in for Gemini and Ollama:
+  primary  fast median, but a few requests stall (cold model / slow
+           replica) and some are rate-limited (HTTP 429)
+  backup   slower median, no stalls
+and the same request stream is sent through three setups:
+  single   the primary model alone (today's get_llm)
+  retry    HedgedChatModel([primary]): jittered retries + circuit breaker
+  hedged   HedgedChatModel([primary, backup]): plus a backup request after
+           the hedge delay (auto = primary's recent p95, or --hedge-delay)
+Reports p50/p95/p99, error rate and backend calls per request (the extra
+load hedging costs).
+
+Usage (from the repo root):
+    python -m benchmarks.hedge_bench
+    python -m benchmarks.hedge_bench --requests 2000 --concurrency 16 --stall-prob 0.05 --out hedge.json
+    python -m benchmarks.hedge_bench --hedge-delay 0.8 --rate-limit-prob 0.1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TEMPLATE = "Explain what a moving average is."
+
+# Backend calls per fake provider name (incl. hedges, retries and discarded losers)
+CALLS = {}
+_calls_lock = threading.Lock()
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile (pct in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def make_provider(name, latency, stall_prob=0.0, stall_ms=0.0, rate_limit_prob=0.0, seed=0):
+    """A FakeChatModel with its own seeded latency, stalls and 429s."""
+    from pydantic import PrivateAttr
+    from app.fakes import FakeChatModel, LatencyDistribution
+
+    class RateLimitError(Exception):
+        status_code = 429
+
+    class FlakyChatModel(FakeChatModel):
+        _rng = PrivateAttr(default=None)
+        _dist = PrivateAttr(default=None)
+
+        def _sample(self):
+            with _calls_lock:
+                CALLS[name] = CALLS.get(name, 0) + 1
+                roll = self._rng.random()
+                delay = self._dist.sample() + (stall_ms / 1000.0 if roll < stall_prob else 0.0)
+                limited = self._rng.random() < rate_limit_prob
+            return delay, limited
+
+        def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+            delay, limited = self._sample()
+            if limited:
+                time.sleep(0.02)
+                raise RateLimitError(f"{name}: 429 rate limit exceeded")
+            time.sleep(delay)
+            return super()._generate(messages, stop=stop, tools=tools, **kwargs)
+
+    model = FlakyChatModel()
+    model._rng = random.Random(seed)
+    model._dist = LatencyDistribution(latency, random.Random(seed + 1))
+    return model
+
+
+def run_setup(label, model, args):
+    from langchain_core.messages import HumanMessage
+
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            model.invoke([HumanMessage(content=f"{TEMPLATE} #{i}")])
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    before = sum(CALLS.values())
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "setup": label,
+        "requests": args.requests,
+        "errors": errors,
+        "error_rate": round(errors / args.requests, 4),
+        "p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+        "max_ms": round(max(latencies), 1) if latencies else None,
+        "calls_per_request": round((sum(CALLS.values()) - before) / args.requests, 3),
+        "elapsed_s": round(elapsed, 2),
+    }
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="p99 of single vs. retrying vs. hedged LLM calls (fake providers)")
+    p.add_argument("--requests", type=int, default=600)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--primary-latency", default="lognormal:300,0.3", help="see app.fakes.LatencyDistribution")
+    p.add_argument("--backup-latency", default="lognormal:450,0.3")
+    p.add_argument("--stall-prob", type=float, default=0.03, help="Share of primary calls that stall")
+    p.add_argument("--stall-ms", type=float, default=4000)
+    p.add_argument("--rate-limit-prob", type=float, default=0.03, help="Share of primary calls answered with 429")
+    p.add_argument("--hedge-delay", type=float, help="Seconds before the backup request (default: auto p95)")
+    p.add_argument("--setups", default="single,retry,hedged")
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+
+    # Losing attempts keep a worker busy until they finish; size the pool for it
+    os.environ.setdefault("LLM_HEDGE_WORKERS", str(args.concurrency * 4))
+    # Keep retry sleeps short relative to the simulated latencies
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.1")
+    from app.hedging import HedgedChatModel, breaker_states
+
+    results = []
+    for label in [s.strip() for s in args.setups.split(",") if s.strip()]:
+        primary = make_provider(f"{label}:primary", args.primary_latency, args.stall_prob, args.stall_ms,
+                                args.rate_limit_prob, seed=args.seed)
+        if label == "single":
+            model = primary
+        elif label == "retry":
+            model = HedgedChatModel(models=[primary], names=[f"{label}:primary"])
+        elif label == "hedged":
+            backup = make_provider(f"{label}:backup", args.backup_latency, seed=args.seed + 100)
+            model = HedgedChatModel(models=[primary, backup], names=[f"{label}:primary", f"{label}:backup"],
+                                    hedge_delay=args.hedge_delay)
+        else:
+            p.error(f"Unknown setup {label!r}")
+        print(f"🔄 {label}: {args.requests} requests at concurrency {args.concurrency}...")
+        results.append(run_setup(label, model, args))
+
+    print(f"\n{'setup':<8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}{'calls/req':>11}")
+    for r in results:
+        print(f"{r['setup']:<8}{r['p50_ms'] or 0:>9.0f}{r['p95_ms'] or 0:>9.0f}{r['p99_ms'] or 0:>9.0f}"
+              f"{r['max_ms'] or 0:>9.0f}{r['errors']:>8}{r['calls_per_request']:>11.3f}")
+    base = next((r for r in results if r["setup"] == "single"), None)
+    for r in results:
+        if base and r is not base and base["p99_ms"] and r["p99_ms"]:
+            print(f"{r['setup']}: p99 {base['p99_ms'] / r['p99_ms']:.2f}x lower than single "
+                  f"for {r['calls_per_request'] / max(base['calls_per_request'], 1e-9):.2f}x the backend calls")
+    print(f"Breakers: {breaker_states()}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results, "breakers": breaker_states()}, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
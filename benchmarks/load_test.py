@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+"""
+Offline load test / latency-regression benchmark for the Sentinel API.
+
+Drives the real FastAPI app (in-process via ASGI, or over localhost via a
+background uvicorn server) at a configurable concurrency, fully offline:
+  --backend fake   latency-only topology simulation (app.fakes.FakeAgentApp)
+  --backend graph  the real compiled graph in mock mode (fake LLM, SQLite,
+                   stub search) to measure graph/node overhead
+Reports throughput and p50/p95/p99 latency per agent route, saves the
+results as JSON and flags regressions against a previous run.
+
+By default the serving controls (request coalescing, admission control and
+per-agent bulkheads) are switched off, so the numbers are raw graph/agent
+latency: with a handful of repeated queries, coalescing would otherwise
+merge most requests and admission queueing would add wait time. Pass
+--serving-controls to measure the API as deployed; coalesced and shed
+(429/503) requests are then counted separately per route.
+
+Usage:
+    python -m benchmarks.load_test --requests 500 --concurrency 32 --out bench.json
+    python -m benchmarks.load_test --baseline bench.json --threshold 0.15
+    python -m benchmarks.load_test --transport http --llm-latency lognormal:800,0.5
+    python -m benchmarks.load_test --backend graph --llm-latency const:0
+    python -m benchmarks.load_test --serving-controls   # with coalescing + admission control
+    python -m benchmarks.load_test --url http://localhost:8000   # external server, real backends
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import threading
+from collections import defaultdict
+
+# Importing main must stay offline (mock mode: fake LLM, SQLite, stub search)
+os.environ.setdefault("USE_MOCK", "true")
+# No background forecast refits competing with the measured requests
+os.environ.setdefault("FORECAST_REFRESH_INTERVAL", "0")
+
+import httpx
+
+DEFAULT_QUERIES = [
+    "Hello, what can you do?",
+    "Explain what a moving average is.",
+    "Who earns the highest salary?",
+    "How many employees are in each department?",
+    "Forecast total salary for the next quarter",
+    "What does the remote work policy document say?",
+    "What is the latest news about Walmart?",
+]
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile (pct in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples, elapsed):
+    """Aggregate raw samples into per-route and overall latency stats (ms)."""
+    by_route = defaultdict(list)
+    for s in samples:
+        by_route[s["route"]].append(s)
+    by_route["__all__"] = list(samples)
+
+    routes = {}
+    for route, items in sorted(by_route.items()):
+        ok = [s["latency_ms"] for s in items if s["ok"]]
+        routes[route] = {
+            "requests": len(items),
+            "errors": sum(1 for s in items if not s["ok"] and not s.get("shed")),
+            "shed": sum(1 for s in items if s.get("shed")),
+            "coalesced": sum(1 for s in items if s.get("coalesced")),
+            "throughput_rps": round(len(items) / elapsed, 3) if elapsed else 0.0,
+            "mean_ms": round(sum(ok) / len(ok), 2) if ok else None,
+            "p50_ms": round(percentile(ok, 50), 2) if ok else None,
+            "p95_ms": round(percentile(ok, 95), 2) if ok else None,
+            "p99_ms": round(percentile(ok, 99), 2) if ok else None,
+            "max_ms": round(max(ok), 2) if ok else None,
+        }
+    return routes
+
+
+def compare(current, baseline, threshold):
+    """Return a list of human-readable regressions vs. a previous result file."""
+    regressions = []
+    for route, stats in current["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if not base:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if stats.get(key) and base.get(key) and stats[key] > base[key] * (1 + threshold):
+                regressions.append(f"{route} {key}: {base[key]:.1f} -> {stats[key]:.1f} ms (+{(stats[key] / base[key] - 1) * 100:.0f}%)")
+        if stats.get("throughput_rps") and base.get("throughput_rps") and stats["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{route} throughput: {base['throughput_rps']:.2f} -> {stats['throughput_rps']:.2f} rps")
+        if stats["errors"] > base.get("errors", 0):
+            regressions.append(f"{route} errors: {base.get('errors', 0)} -> {stats['errors']}")
+    return regressions
+
+
+def configure_serving_controls(enabled: bool):
+    """Switch coalescing/admission/bulkheads off for raw latency numbers (read when main is imported)."""
+    if enabled:
+        return
+    os.environ["COALESCE_REQUESTS"] = "false"
+    os.environ["MAX_IN_FLIGHT"] = "100000"
+    os.environ["ADMISSION_MAX_QUEUE"] = "100000"
+    os.environ["AGENT_CONCURRENCY"] = ",".join(
+        f"{agent}=100000" for agent in ("SQL_Agent", "Forecast_Agent", "RAG_Agent", "Web_Agent", "General_Agent"))
+    os.environ["AGENT_MAX_WAITING"] = "100000"
+
+
+def install_fake_backends(args):
+    """Configure offline backends and return the ASGI app to drive."""
+    if "main" in sys.modules:
+        raise RuntimeError("main was imported before the benchmark configured it")
+    configure_serving_controls(args.serving_controls)
+    profile = {
+        "llm": args.llm_latency,
+        "db": args.db_latency,
+        "search": args.search_latency,
+        "cpu": args.cpu_latency,
+    }
+    if args.backend == "graph":
+        # Real graph in mock mode; fakes pick their latencies up from the environment
+        os.environ["MOCK_LLM_LATENCY"] = args.llm_latency
+        os.environ["MOCK_DB_LATENCY"] = args.db_latency
+        os.environ["MOCK_SEARCH_LATENCY"] = args.search_latency
+        os.environ["MOCK_SEED"] = str(args.seed)
+        import main
+        return main.app, profile
+
+    import main
+    from app.fakes import FakeAgentApp
+
+    main.agent_app = FakeAgentApp(profile=profile, sql_tool_calls=args.sql_tool_calls, seed=args.seed)
+    return main.app, profile
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server(asgi_app):
+    """Run uvicorn on a free localhost port in a daemon thread."""
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("uvicorn did not start within 10s")
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def run_load(client, queries, total, concurrency, timeout, seed):
+    """Closed-loop load: `concurrency` workers each send requests back to back."""
+    rng = random.Random(seed)
+    plan = [rng.choice(queries) for _ in range(total)]
+    samples = []
+    cursor = iter(plan)
+
+    async def worker():
+        for query in cursor:
+            start = time.perf_counter()
+            route, ok, shed, coalesced = "error", False, False, False
+            try:
+                resp = await client.post("/chat", json={"query": query}, timeout=timeout)
+                ok = resp.status_code == 200
+                shed = resp.status_code in (429, 503)
+                coalesced = resp.headers.get("X-Coalesced") == "true"
+                route = resp.json().get("agent_used", "unknown") if ok else f"http_{resp.status_code}"
+                ok = ok and route != "error"
+            except Exception as e:
+                route = type(e).__name__
+            samples.append({
+                "query": query,
+                "route": route,
+                "ok": ok,
+                "shed": shed,
+                "coalesced": coalesced,
+                "latency_ms": (time.perf_counter() - start) * 1000,
+            })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - started
+
+
+async def main_async(args):
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    server = None
+    profile = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url)
+        target = args.url
+    else:
+        asgi_app, profile = install_fake_backends(args)
+        if args.transport == "http":
+            server, base_url = start_local_server(asgi_app)
+            client = httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=args.concurrency))
+            target = base_url
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://sentinel")
+            target = "asgi://in-process"
+
+    try:
+        if args.warmup:
+            await run_load(client, queries, args.warmup, min(args.concurrency, args.warmup), args.timeout, args.seed)
+        samples, elapsed = await run_load(client, queries, args.requests, args.concurrency, args.timeout, args.seed)
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.should_exit = True
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "target": target,
+            "backend": None if args.url else args.backend,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "latency_profile": profile,
+            "sql_tool_calls": args.sql_tool_calls,
+            "serving_controls": None if args.url else args.serving_controls,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "routes": summarize(samples, elapsed),
+    }
+
+
+def print_report(result):
+    meta = result["meta"]
+    print(f"\n{'='*90}")
+    print(f"Sentinel load test: {meta['requests']} requests @ concurrency {meta['concurrency']} -> {meta['target']}")
+    controls = {None: "server's own", True: "on", False: "off"}[meta.get("serving_controls")]
+    print(f"Elapsed: {meta['elapsed_s']}s   serving controls (coalescing/admission/bulkheads): {controls}")
+    print(f"{'='*90}")
+    print(f"{'route':<18}{'n':>6}{'err':>5}{'shed':>6}{'coal':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    fmt = lambda v: f"{v:>10.1f}" if v is not None else f"{'-':>10}"
+    for route, s in result["routes"].items():
+        print(f"{route:<18}{s['requests']:>6}{s['errors']:>5}{s.get('shed', 0):>6}{s.get('coalesced', 0):>6}"
+              f"{s['throughput_rps']:>9.2f}{fmt(s['p50_ms'])}{fmt(s['p95_ms'])}{fmt(s['p99_ms'])}{fmt(s['max_ms'])}")
+    print()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Sentinel offline load test")
+    p.add_argument("--requests", type=int, default=200, help="Total measured requests")
+    p.add_argument("--concurrency", type=int, default=16, help="Concurrent in-flight requests")
+    p.add_argument("--warmup", type=int, default=10, help="Unmeasured warm-up requests")
+    p.add_argument("--transport", choices=["asgi", "http"], default="asgi",
+                   help="asgi = in-process, http = uvicorn on localhost")
+    p.add_argument("--backend", choices=["fake", "graph"], default="fake",
+                   help="fake = latency-only topology simulation, graph = real graph with fake LLM/DB/search")
+    p.add_argument("--url", help="Target an already running server instead (uses its real backends)")
+    p.add_argument("--queries", help="File with one query per line (default: built-in mix covering every route)")
+    p.add_argument("--llm-latency", default=os.getenv("BENCH_LLM_LATENCY", "lognormal:450,0.35"))
+    p.add_argument("--db-latency", default=os.getenv("BENCH_DB_LATENCY", "lognormal:25,0.6"))
+    p.add_argument("--search-latency", default=os.getenv("BENCH_SEARCH_LATENCY", "lognormal:700,0.4"))
+    p.add_argument("--cpu-latency", default=os.getenv("BENCH_CPU_LATENCY", "lognormal:250,0.3"))
+    p.add_argument("--sql-tool-calls", type=int, default=3, help="ReAct tool calls per SQL_Agent run")
+    p.add_argument("--serving-controls", action="store_true",
+                   help="Keep request coalescing, admission control and bulkheads on (default: off, raw latency)")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", help="Write results JSON here")
+    p.add_argument("--baseline", help="Previous results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown before flagging")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = asyncio.run(main_async(args))
+    print_report(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        base_controls = baseline.get("meta", {}).get("serving_controls")
+        if base_controls != result["meta"]["serving_controls"]:
+            print(f"⚠️ Baseline was recorded with serving_controls={base_controls}, "
+                  f"this run has {result['meta']['serving_controls']}; latencies are not comparable")
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) vs {args.baseline} (threshold {args.threshold:.0%}):")
+            for r in regressions:
+                print(f"   - {r}")
+            return 1
+        print(f"✅ No regressions vs {args.baseline} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
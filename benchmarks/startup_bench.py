@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+API import-time / startup benchmark.
+
+Measures how long `import main` takes in a fresh interpreter (what every
+uvicorn worker pays at boot), lists the slowest imports from
+`python -X importtime`, and fails if startup exceeds a budget or if any
+heavy dependency that should load lazily (Prophet, pandas, FAISS, torch,
+sentence-transformers, langchain_community, ...) is imported eagerly.
+
+Usage:
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --runs 10 --budget-ms 1500 --out startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported just by loading the API
+LAZY_MODULES = [
+    "prophet",
+    "pandas",
+    "faiss",
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "langchain_community",
+    "langchain_huggingface",
+    "tavily",
+    "pymysql",
+    "app.graph",
+    "app.agents.sql_agent",
+    "app.agents.forecast_agent",
+    "app.agents.rag_agent",
+    "app.agents.web_search_agent",
+]
+
+_PROBE = (
+    "import time, sys, json; t = time.perf_counter(); import main; "
+    "print(json.dumps({'import_ms': (time.perf_counter() - t) * 1000, 'modules': sorted(sys.modules)}))"
+)
+
+
+def _env(mock: bool):
+    env = dict(os.environ)
+    env["USE_MOCK"] = "true" if mock else env.get("USE_MOCK", "false")
+    env.pop("WARMUP_AGENTS", None)
+    return env
+
+
+def measure_once(mock: bool):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=REPO_ROOT, env=_env(mock),
+                         capture_output=True, text=True, check=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    payload = json.loads(out.stdout.strip().splitlines()[-1])
+    payload["process_ms"] = total_ms
+    return payload
+
+
+def slowest_imports(mock: bool, top: int):
+    """Parse `-X importtime` (stderr) and return the top cumulative import times."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=REPO_ROOT,
+                         env=_env(mock), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue  # header row
+        self_us, cumulative_us, name = parts
+        rows.append({"module": name, "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Sentinel API startup benchmark")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", 2000)),
+                   help="Fail if median `import main` time exceeds this")
+    p.add_argument("--top", type=int, default=15, help="Show the N slowest imports")
+    p.add_argument("--production", action="store_true", help="Measure with USE_MOCK unset instead of mock mode")
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+    mock = not args.production
+
+    samples = [measure_once(mock) for _ in range(args.runs)]
+    import_ms = [s["import_ms"] for s in samples]
+    process_ms = [s["process_ms"] for s in samples]
+    loaded = set(samples[-1]["modules"])
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    slow = slowest_imports(mock, args.top)
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": "mock" if mock else "production",
+        "runs": args.runs,
+        "import_ms": {"median": round(statistics.median(import_ms), 1), "min": round(min(import_ms), 1), "max": round(max(import_ms), 1)},
+        "process_ms": {"median": round(statistics.median(process_ms), 1)},
+        "modules_loaded": len(loaded),
+        "eager_heavy_modules": eager,
+        "slowest_imports": slow,
+        "budget_ms": args.budget_ms,
+    }
+
+    print(f"\n{'='*60}")
+    print(f"Sentinel startup ({result['mode']} mode, {args.runs} runs)")
+    print(f"{'='*60}")
+    print(f"import main: median {result['import_ms']['median']} ms (min {result['import_ms']['min']}, max {result['import_ms']['max']})")
+    print(f"process total: median {result['process_ms']['median']} ms, {len(loaded)} modules loaded")
+    print("\nSlowest imports (cumulative):")
+    for row in slow:
+        print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+    print()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+
+    failed = False
+    if eager:
+        print(f"❌ Heavy modules imported at startup (should be lazy): {', '.join(eager)}")
+        failed = True
+    if result["import_ms"]["median"] > args.budget_ms:
+        print(f"❌ Startup {result['import_ms']['median']} ms exceeds budget {args.budget_ms} ms")
+        failed = True
+    if not failed:
+        print(f"✅ Startup within budget ({args.budget_ms} ms) and no eager heavy imports")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
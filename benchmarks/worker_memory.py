@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Memory-per-worker measurement for multi-worker serving (Linux only).
+
+Starts `gunicorn -c gunicorn.conf.py main:app` with N workers, waits until
+/health is green, optionally exercises the RAG route so every worker has
+touched the embedding model and index, then reads /proc/<pid>/smaps_rollup
+for the master and each worker:
+  RSS  - resident pages (double-counts shared pages)
+  PSS  - proportional share; sum over processes = real footprint
+  USS  - private pages only (what each extra worker really costs)
+
+Usage:
+    python -m benchmarks.worker_memory --workers 4
+    python -m benchmarks.worker_memory --workers 4 --compare     # preload vs. per-worker loading
+    python -m benchmarks.worker_memory --workers 4 --out mem.json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import subprocess
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_smaps_rollup(pid: int) -> dict:
+    """Return rss/pss/uss/shared in MiB for a process."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    mib = lambda kb: round(kb / 1024, 1)
+    return {
+        "rss_mib": mib(fields.get("Rss", 0)),
+        "pss_mib": mib(fields.get("Pss", 0)),
+        "uss_mib": mib(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+        "shared_mib": mib(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+    }
+
+
+def children(pid: int) -> list:
+    pids = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        try:
+            with open(f"{task_dir}/{tid}/children", "r") as f:
+                pids.extend(int(p) for p in f.read().split())
+        except FileNotFoundError:
+            continue
+    return sorted(set(pids))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure(workers: int, preload: bool, rag_queries: int, startup_timeout: float) -> dict:
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "WEB_CONCURRENCY": str(workers),
+        "API_HOST": "127.0.0.1",
+        "API_PORT": str(port),
+        "PRELOAD_MODELS": "true" if preload else "false",
+    })
+    if not preload:
+        # Per-worker loading; /health stays 503 until each worker has warmed up
+        env.setdefault("WARMUP_AGENTS", "RAG_Agent")
+
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+                            cwd=REPO_ROOT, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + startup_timeout
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            while True:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+                if time.time() > deadline:
+                    raise RuntimeError(f"server not healthy within {startup_timeout}s")
+                try:
+                    pids = children(proc.pid)
+                    healthy = len(pids) >= workers and client.get("/health").status_code == 200
+                    # Every worker must report healthy, not just the one that answered
+                    if healthy and not preload:
+                        healthy = all(client.get("/health").status_code == 200 for _ in range(workers * 3))
+                    if healthy:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.5)
+            ready_s = time.perf_counter() - started
+
+            for i in range(rag_queries):
+                client.post("/chat", json={"query": f"What does the policy document say about item {i}?"})
+
+        master = read_smaps_rollup(proc.pid)
+        worker_stats = {pid: read_smaps_rollup(pid) for pid in children(proc.pid)}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    total_pss = master["pss_mib"] + sum(w["pss_mib"] for w in worker_stats.values())
+    uss = [w["uss_mib"] for w in worker_stats.values()]
+    return {
+        "preload": preload,
+        "workers": workers,
+        "ready_s": round(ready_s, 2),
+        "master": master,
+        "worker_processes": {str(pid): stats for pid, stats in worker_stats.items()},
+        "total_pss_mib": round(total_pss, 1),
+        "mean_worker_uss_mib": round(sum(uss) / len(uss), 1) if uss else None,
+    }
+
+
+def print_result(r: dict):
+    label = "pre-fork preload" if r["preload"] else "per-worker loading"
+    print(f"\n--- {label}: {r['workers']} workers, healthy after {r['ready_s']}s ---")
+    print(f"{'process':<14}{'RSS':>10}{'PSS':>10}{'USS':>10}{'shared':>10}  (MiB)")
+    rows = [("master", r["master"])] + [(f"worker {pid}", s) for pid, s in r["worker_processes"].items()]
+    for name, s in rows:
+        print(f"{name:<14}{s['rss_mib']:>10}{s['pss_mib']:>10}{s['uss_mib']:>10}{s['shared_mib']:>10}")
+    print(f"Total PSS: {r['total_pss_mib']} MiB | mean worker USS: {r['mean_worker_uss_mib']} MiB")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Measure memory per gunicorn worker")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--compare", action="store_true", help="Also run without pre-fork preloading")
+    p.add_argument("--rag-queries", type=int, default=8, help="RAG requests to send before sampling")
+    p.add_argument("--startup-timeout", type=float, default=600)
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("❌ /proc/<pid>/smaps_rollup not available (Linux >= 4.14 required)")
+        return 1
+
+    results = [measure(args.workers, True, args.rag_queries, args.startup_timeout)]
+    if args.compare:
+        results.append(measure(args.workers, False, args.rag_queries, args.startup_timeout))
+    for r in results:
+        print_result(r)
+    if len(results) == 2:
+        saved = results[1]["total_pss_mib"] - results[0]["total_pss_mib"]
+        print(f"\nPre-fork preloading saves {saved:.1f} MiB total PSS across {args.workers} workers")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+LoRA adapter parameter exchange
+Only the trainable adapter tensors travel between client and server, not the
+frozen (quantized) base model. Tensors are ordered by sorted state-dict key
+so every client and the server agree on positions, and are sent as
+contiguous arrays in their native dtype.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+import torch
+from peft import get_peft_model_state_dict, set_peft_model_state_dict
+
+
+def adapter_state_dict(model) -> "OrderedDict[str, torch.Tensor]":
+    """Adapter tensors (LoRA A/B, plus any modules_to_save) in stable key order."""
+    state = get_peft_model_state_dict(model)
+    return OrderedDict((k, state[k]) for k in sorted(state))
+
+
+def adapter_signature(model) -> str:
+    """Short hash of adapter names + shapes; clients with different adapters can't be averaged."""
+    h = hashlib.sha1()
+    for name, tensor in adapter_state_dict(model).items():
+        h.update(f"{name}:{tuple(tensor.shape)};".encode())
+    return h.hexdigest()[:12]
+
+
+def get_adapter_parameters(model) -> List[np.ndarray]:
+    return [np.ascontiguousarray(t.detach().cpu().numpy()) for t in adapter_state_dict(model).values()]
+
+
+def set_adapter_parameters(model, parameters: List[np.ndarray]):
+    current = adapter_state_dict(model)
+    if len(parameters) != len(current):
+        raise ValueError(f"Expected {len(current)} adapter tensors, got {len(parameters)} "
+                         f"(is the server sending full-model weights?)")
+    state = OrderedDict()
+    for (name, tensor), value in zip(current.items(), parameters):
+        if tuple(value.shape) != tuple(tensor.shape):
+            raise ValueError(f"Shape mismatch for {name}: expected {tuple(tensor.shape)}, got {value.shape}")
+        state[name] = torch.from_numpy(np.asarray(value)).to(dtype=tensor.dtype)
+    set_peft_model_state_dict(model, state)
+
+
+def payload_bytes(parameters: List[np.ndarray]) -> int:
+    return int(sum(p.nbytes for p in parameters))
+
+
+def full_state_bytes(model) -> int:
+    """Size the old full state_dict exchange would have sent (for comparison)."""
+    return int(sum(t.numel() * t.element_size() for t in model.state_dict().values()))
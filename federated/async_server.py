@@ -0,0 +1,253 @@
+"""
+Buffered asynchronous aggregation (FedBuff-style)
+Synchronous FedAvg waits for the slowest sampled client every round. Here
+every client trains continuously. Each finished update goes into a buffer,
+and once K updates are buffered the server applies them and bumps the
+global model version. The client is immediately re-dispatched with the
+latest version.
+
+An update trained on version v and arriving at version t has staleness
+t - v. It is down-weighted by 1 / (1 + staleness) ** FL_STALENESS_EXPONENT
+and dropped if staleness exceeds FL_MAX_STALENESS:
+
+    global += server_lr * sum(n_i * s(staleness_i) * delta_i) / sum(n_i)
+
+A client with no new feedback answers with num_examples == 0. It is parked
+for FL_IDLE_BACKOFF seconds (doubling per consecutive idle reply, up to
+FL_IDLE_BACKOFF_MAX) before it gets the model again, and once every client
+has been idle FL_MAX_IDLE_POLLS times in a row training stops early (0 =
+keep polling until num_rounds).
+
+The client manager is polled every FL_CLIENT_POLL seconds, so clients that
+connect after training has started are dispatched too. A client whose fit
+fails is retried after FL_FAILURE_BACKOFF seconds (doubling per consecutive
+failure, up to FL_FAILURE_BACKOFF_MAX) and dropped from the run after
+FL_MAX_CLIENT_FAILURES consecutive failures. At most FL_MAX_CLIENT_WORKERS
+fits are in flight at once.
+
+num_rounds in ServerConfig counts aggregations (model versions). Uplink
+updates may use any codec from federated/codec.py. Versions still in
+flight are kept so deltas can be decoded against the base they were
+trained on. Like CompressedFedAvg, the fit config echoes the last update_id
+accepted from each client ("received_update").
+"""
+import os
+import time
+import timeit
+import concurrent.futures
+from typing import Dict, List, Optional
+
+import numpy as np
+import flwr as fl
+from flwr.common import Code, FitIns, ndarrays_to_parameters, parameters_to_ndarrays
+from flwr.server.history import History
+
+from federated import codec
+
+BUFFER_SIZE = int(os.getenv("FL_BUFFER_SIZE", 2))
+MAX_STALENESS = int(os.getenv("FL_MAX_STALENESS", 4))
+STALENESS_EXPONENT = float(os.getenv("FL_STALENESS_EXPONENT", 0.5))
+SERVER_LR = float(os.getenv("FL_SERVER_LR", 1.0))
+IDLE_BACKOFF = float(os.getenv("FL_IDLE_BACKOFF", 5.0))
+IDLE_BACKOFF_MAX = float(os.getenv("FL_IDLE_BACKOFF_MAX", 120.0))
+MAX_IDLE_POLLS = int(os.getenv("FL_MAX_IDLE_POLLS", 3))
+CLIENT_POLL = float(os.getenv("FL_CLIENT_POLL", 1.0))
+FAILURE_BACKOFF = float(os.getenv("FL_FAILURE_BACKOFF", 5.0))
+FAILURE_BACKOFF_MAX = float(os.getenv("FL_FAILURE_BACKOFF_MAX", 300.0))
+MAX_CLIENT_FAILURES = int(os.getenv("FL_MAX_CLIENT_FAILURES", 5))
+MAX_CLIENT_WORKERS = int(os.getenv("FL_MAX_CLIENT_WORKERS", 32))
+
+
+def staleness_weight(staleness: int, exponent: float = STALENESS_EXPONENT) -> float:
+    return 1.0 / (1.0 + staleness) ** exponent
+
+
+class BufferedAsyncServer(fl.server.Server):
+    def __init__(self, *, client_manager, strategy, buffer_size: int = BUFFER_SIZE,
+                 max_staleness: int = MAX_STALENESS, staleness_exponent: float = STALENESS_EXPONENT,
+                 server_lr: float = SERVER_LR, uplink_codec: str = "fp32", min_clients: Optional[int] = None,
+                 idle_backoff: float = IDLE_BACKOFF, idle_backoff_max: float = IDLE_BACKOFF_MAX,
+                 max_idle_polls: int = MAX_IDLE_POLLS, client_poll: float = CLIENT_POLL,
+                 failure_backoff: float = FAILURE_BACKOFF, failure_backoff_max: float = FAILURE_BACKOFF_MAX,
+                 max_client_failures: int = MAX_CLIENT_FAILURES, max_workers: int = MAX_CLIENT_WORKERS):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        self.buffer_size = buffer_size
+        self.max_staleness = max_staleness
+        self.staleness_exponent = staleness_exponent
+        self.server_lr = server_lr
+        self.uplink = codec.CodecSpec.parse(uplink_codec)
+        self.min_clients = min_clients or getattr(strategy, "min_available_clients", 1)
+        self.idle_backoff = idle_backoff
+        self.idle_backoff_max = idle_backoff_max
+        self.max_idle_polls = max_idle_polls
+        self.client_poll = client_poll
+        self.failure_backoff = failure_backoff
+        self.failure_backoff_max = failure_backoff_max
+        self.max_client_failures = max_client_failures
+        self.max_workers = max_workers
+
+        self.version = 0
+        self.versions: Dict[int, List[np.ndarray]] = {}
+        self._downlinks: Dict[int, fl.common.Parameters] = {}
+        self.aggregations: List[dict] = []
+        self.received: Dict[str, str] = {}  # cid -> update_id of its last accepted update
+        self.accepted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.idle = 0
+        print(f"📡 Buffered async aggregation: K={buffer_size}, max staleness={max_staleness}, "
+              f"exponent={staleness_exponent}, server lr={server_lr}, uplink={self.uplink}")
+
+    def _downlink(self, version: int):
+        # Lossless, versioned payload: sets the client's reference for delta uplinks
+        if version not in self._downlinks:
+            self._downlinks[version] = ndarrays_to_parameters(
+                codec.encode(self.versions[version], codec.CodecSpec("fp32"), round_num=version))
+        return self._downlinks[version]
+
+    def _fit_config(self, version: int, cid: str = "") -> dict:
+        config = {}
+        if getattr(self.strategy, "on_fit_config_fn", None):
+            config.update(self.strategy.on_fit_config_fn(version))
+        config.update({"uplink_codec": str(self.uplink), "round": version,
+                       "received_update": self.received.get(cid, "")})
+        return config
+
+    def _apply(self, buffer):
+        """Fold the buffered deltas into the current global model."""
+        total = sum(n for _, n, _ in buffer)
+        step = sum(delta * (n * staleness_weight(s, self.staleness_exponent)) for delta, n, s in buffer) / total
+        current = self.versions[self.version]
+        new = codec.unflatten(codec.flatten(current) + self.server_lr * step, current)
+        self.version += 1
+        self.versions[self.version] = new
+        # Anything older than the staleness bound can no longer be accepted
+        for v in [v for v in self.versions if v < self.version - self.max_staleness]:
+            self.versions.pop(v)
+            self._downlinks.pop(v, None)
+
+    def _idle_delay(self, streak: int) -> float:
+        return min(self.idle_backoff * 2 ** (streak - 1), self.idle_backoff_max)
+
+    def _failure_delay(self, streak: int) -> float:
+        return min(self.failure_backoff * 2 ** (streak - 1), self.failure_backoff_max)
+
+    def _all_idle(self, idle_streak: Dict[str, int], excluded=()) -> bool:
+        """Every connected client has had nothing to train on max_idle_polls times in a row."""
+        if self.max_idle_polls <= 0:
+            return False
+        live = [cid for cid in self._client_manager.all() if cid not in excluded]
+        return bool(live) and all(idle_streak.get(cid, 0) >= self.max_idle_polls for cid in live)
+
+    def fit(self, num_rounds: int, timeout: Optional[float]):
+        history = History()
+        self.parameters = self._get_initial_parameters(server_round=0, timeout=timeout)
+        self.versions = {0: [a.astype(np.float32) for a in parameters_to_ndarrays(self.parameters)]}
+        self._client_manager.wait_for(self.min_clients)
+        print(f"🚀 Async training on {self._client_manager.num_available()} client(s) "
+              f"for {num_rounds} aggregations")
+
+        start_time = timeit.default_timer()
+        buffer, pending = [], {}
+        parked: Dict[str, tuple] = {}  # cid -> (client, re-dispatch time) for idle or failing clients
+        idle_streak: Dict[str, int] = {}
+        failure_streak: Dict[str, int] = {}
+        removed = set()  # cids dropped for failing max_client_failures times in a row
+        # Not sized to the clients present at start: late joiners share the same pool
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def dispatch(client):
+                ins = FitIns(self._downlink(self.version), self._fit_config(self.version, client.cid))
+                pending[executor.submit(client.fit, ins, timeout, self.version)] = (client, self.version)
+
+            while self.version < num_rounds:
+                now = time.monotonic()
+                live = self._client_manager.all()
+                for cid, (client, ready_at) in list(parked.items()):
+                    if ready_at <= now or cid not in live:
+                        parked.pop(cid)
+                # Dispatch every connected client that isn't training, parked or removed (incl. new ones)
+                busy = {client.cid for client, _ in pending.values()}
+                for cid, client in live.items():
+                    if len(pending) >= self.max_workers:
+                        break
+                    if cid not in busy and cid not in parked and cid not in removed:
+                        dispatch(client)
+
+                if not pending and not parked and not any(cid not in removed for cid in live):
+                    print("⚠️ No clients left to train on, stopping early")
+                    break
+                wake = min((r for _, r in parked.values()), default=now + self.client_poll)
+                wait = max(0.0, min(wake - now, self.client_poll))
+                if not pending:
+                    time.sleep(wait)
+                    continue
+                done, _ = concurrent.futures.wait(pending, timeout=wait,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    client, base = pending.pop(future)
+                    staleness = self.version - base
+                    idle = False
+                    try:
+                        res = future.result()
+                        if res.status.code != Code.OK:
+                            raise RuntimeError(res.status.message)
+                    except Exception as e:
+                        self.failed += 1
+                        failure_streak[client.cid] = failure_streak.get(client.cid, 0) + 1
+                        if failure_streak[client.cid] >= self.max_client_failures:
+                            removed.add(client.cid)
+                            print(f"⚠️ Client {client.cid} failed {failure_streak[client.cid]} time(s) "
+                                  f"in a row, dropping it: {e}")
+                        else:
+                            # Back off instead of re-dispatching a broken client in a hot loop
+                            delay = self._failure_delay(failure_streak[client.cid])
+                            parked[client.cid] = (client, time.monotonic() + delay)
+                            print(f"⚠️ Client {client.cid} failed, retrying in {delay:.0f}s: {e}")
+                        continue
+                    failure_streak.pop(client.cid, None)
+                    idle = res.num_examples == 0
+                    idle_streak[client.cid] = idle_streak.get(client.cid, 0) + 1 if idle else 0
+                    if idle:
+                        self.idle += 1  # no new feedback on that client; nothing to fold in
+                        # Don't resend the full model right away: wait for feedback to accumulate
+                        parked[client.cid] = (client, time.monotonic() + self._idle_delay(idle_streak[client.cid]))
+                    elif staleness > self.max_staleness or base not in self.versions:
+                        self.dropped += 1
+                    else:
+                        payload = parameters_to_ndarrays(res.parameters)
+                        if codec.is_encoded(payload):
+                            payload = codec.decode(payload, self.versions[base])
+                        delta = codec.flatten(payload) - codec.flatten(self.versions[base])
+                        buffer.append((delta, res.num_examples, staleness))
+                        self.received[client.cid] = res.metrics.get("update_id", "")
+                        self.accepted += 1
+
+                    if len(buffer) >= self.buffer_size and self.version < num_rounds:
+                        self._apply(buffer)
+                        elapsed = timeit.default_timer() - start_time
+                        mean_staleness = sum(s for _, _, s in buffer) / len(buffer)
+                        self.aggregations.append({"version": self.version, "elapsed_s": round(elapsed, 3),
+                                                  "updates": len(buffer), "mean_staleness": round(mean_staleness, 2)})
+                        print(f"📦 Version {self.version}: {len(buffer)} update(s), mean staleness "
+                              f"{mean_staleness:.2f}, {elapsed:.2f}s")
+                        buffer = []
+                    # Finished clients are re-dispatched by the poll at the top of the loop;
+                    # disconnected ones have left the client manager and are not
+
+                if not pending and self._all_idle(idle_streak, removed):
+                    print(f"💤 No new feedback on any client for {self.max_idle_polls} poll(s), stopping early")
+                    break
+
+            elapsed = timeit.default_timer() - start_time
+            if pending:
+                print(f"⏳ Waiting for {len(pending)} in-flight update(s) to finish (discarded)...")
+
+        self.parameters = ndarrays_to_parameters(self.versions[self.version])
+        print(f"✅ {self.version} aggregations in {elapsed:.2f}s: {self.accepted} accepted, "
+              f"{self.dropped} too stale, {self.failed} failed, {self.idle} idle")
+
+        res_fed = self.evaluate_round(server_round=self.version, timeout=timeout)
+        if res_fed is not None and res_fed[0] is not None:
+            history.add_loss_distributed(server_round=self.version, loss=res_fed[0])
+            history.add_metrics_distributed(server_round=self.version, metrics=res_fed[1])
+        return history, elapsed
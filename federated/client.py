@@ -1,5 +1,8 @@
+# Run from the repo root: python -m federated.client
 import os
 import json
+import time
+import uuid
 import torch
 from dotenv import load_dotenv  # <--- ADDED THIS
 from peft import LoraConfig, get_peft_model, TaskType
@@ -9,11 +12,19 @@ from transformers import (
     BitsAndBytesConfig, 
     TrainingArguments, 
     Trainer, 
-    DataCollatorForLanguageModeling
 )
-from datasets import Dataset
 import flwr as fl
-from collections import OrderedDict
+
+from federated import codec
+from federated.data import PACK_SEQUENCES, PaddingCollator, TokenCache, build_dataset
+from federated.feedback_store import FeedbackStore
+from federated.adapters import (
+    adapter_signature,
+    full_state_bytes,
+    get_adapter_parameters,
+    payload_bytes,
+    set_adapter_parameters,
+)
 
 # 1. LOAD ENV VARS (Fixes the missing token error)
 load_dotenv()
@@ -21,11 +32,40 @@ load_dotenv()
 # CONFIG
 # MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
 MODEL_NAME = "Qwen/Qwen2.5-3B-Instruct"
-DATA_PATH = "federated/train_data.json"
+# How many feedback records this client has already trained on (see federated/feedback_store.py).
+# An update's records only count once the server confirms it received the update: each
+# update carries an "update_id" metric and the next fit config echoes the last one the
+# server accepted ("received_update"). Unconfirmed records are trained on again.
+CLIENT_STATE_PATH = os.getenv("FL_CLIENT_STATE", os.path.join(".cache", "federated", "client_state.json"))
+# Effective batch 4 as 1 row x 4 accumulation steps keeps activations small enough for
+# 4GB cards. With more VRAM, FL_TRAIN_BATCH_SIZE=4 FL_GRAD_ACCUM_STEPS=1 trains faster
+# (batches are padded dynamically, so larger batches no longer cost pad compute).
+TRAIN_BATCH_SIZE = int(os.getenv("FL_TRAIN_BATCH_SIZE", 1))
+GRAD_ACCUM_STEPS = int(os.getenv("FL_GRAD_ACCUM_STEPS", 4))
+# LoRA adapters are a few MB, so the default 512MB gRPC cap is plenty
+GRPC_MAX_MESSAGE_LENGTH = int(os.getenv("FL_GRPC_MAX_MESSAGE_MB", 512)) * 1024 * 1024
 
 class SentinelClient(fl.client.NumPyClient):
-    def __init__(self):
-        print("📥 Loading Model in 4-bit (QLoRA) to save VRAM...")
+    def __init__(self, model_name: str = MODEL_NAME, quantize: bool = True, max_steps: int = 10,
+                 unseen_only: bool = True, state_path: str = CLIENT_STATE_PATH):
+        """
+        model_name/quantize let the same client run a tiny fp32 model on CPU
+        (e.g. hf-internal-testing/tiny-random-LlamaForCausalLM) for local simulations.
+        unseen_only=False retrains on the whole feedback log every round (simulations).
+        """
+        self.use_cuda = torch.cuda.is_available()
+        self.quantize = quantize and self.use_cuda
+        self.max_steps = max_steps
+        # Compressed transport state: the global adapters last received from the server
+        # (deltas are encoded against it) and the uplink encoder's error-feedback residual
+        self.reference = None
+        self.reference_round = 0
+        self.encoder = None
+
+        self.store = FeedbackStore()
+        self.unseen_only = unseen_only
+        self.state_path = state_path
+        self.trained_offset, self.pending = self._load_state() if unseen_only else (0, None)
 
         # 2. Get Token safely
         HF_TOKEN = os.getenv("HF_TOKEN")
@@ -34,30 +74,37 @@ class SentinelClient(fl.client.NumPyClient):
             from huggingface_hub import get_token
             HF_TOKEN = get_token()
             
-        if not HF_TOKEN:
+        if not HF_TOKEN and model_name == MODEL_NAME:
             raise RuntimeError("❌ HF_TOKEN not found! Add 'HF_TOKEN=HF_...' to your .env file.")
         
         # 3. 4-Bit Configuration (The Magic for 4GB Cards)
-        bnb_config = BitsAndBytesConfig(
-            load_in_4bit=True,
-            bnb_4bit_quant_type="nf4",
-            bnb_4bit_compute_dtype=torch.float16,
-            bnb_4bit_use_double_quant=True,
-        )
+        bnb_config = None
+        if self.quantize:
+            print("📥 Loading Model in 4-bit (QLoRA) to save VRAM...")
+            bnb_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True,
+            )
+        else:
+            print(f"📥 Loading {model_name} in fp32 on {'GPU' if self.use_cuda else 'CPU'}...")
 
         # 4. Load Tokenizer & Model
-        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, token=HF_TOKEN)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, token=HF_TOKEN)
         self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.token_cache = TokenCache(self.tokenizer)
         
         self.model = AutoModelForCausalLM.from_pretrained(
-            MODEL_NAME,
+            model_name,
             quantization_config=bnb_config,
-            device_map="auto", 
+            device_map="auto" if self.use_cuda else None,
             token=HF_TOKEN,
         )
         # Gradient checkpointing saves HUGE memory
         self.model.config.use_cache = False
-        self.model.gradient_checkpointing_enable()
+        if self.quantize:
+            self.model.gradient_checkpointing_enable()
 
         # 5. Apply LoRA
         peft_config = LoraConfig(
@@ -68,41 +115,109 @@ class SentinelClient(fl.client.NumPyClient):
             task_type=TaskType.CAUSAL_LM,
         )
         self.model = get_peft_model(self.model, peft_config)
-        print("✅ Model loaded successfully on GPU.")
+        adapter_bytes = payload_bytes(get_adapter_parameters(self.model))
+        print(f"✅ Model loaded. Adapter payload {adapter_bytes / 1e6:.2f} MB "
+              f"(full state_dict would be {full_state_bytes(self.model) / 1e6:.1f} MB), "
+              f"signature {adapter_signature(self.model)}")
 
     def get_parameters(self, config):
         # Only send the lightweight LoRA adapters, not the full model
-        return [val.cpu().numpy() for _, val in self.model.state_dict().items()]
+        return get_adapter_parameters(self.model)
 
     def set_parameters(self, parameters):
-        params_dict = zip(self.model.state_dict().keys(), parameters)
-        state_dict = OrderedDict({k: torch.tensor(v) for k, v in params_dict})
-        self.model.load_state_dict(state_dict, strict=True)
+        if not codec.is_encoded(parameters):
+            set_adapter_parameters(self.model, parameters)
+            return
+        header = codec.read_header(parameters)
+        if header["delta"]:
+            if self.reference is None or header["base_round"] != self.reference_round:
+                raise ValueError(f"Server sent a delta against round {header['base_round']}, "
+                                 f"but this client holds round {self.reference_round}")
+            arrays = codec.decode(parameters, self.reference)
+        else:
+            arrays = codec.decode(parameters, get_adapter_parameters(self.model))
+        set_adapter_parameters(self.model, arrays)
+        self.reference, self.reference_round = arrays, header["round"]
+
+    def encode_update(self, parameters, config):
+        """Compress the local adapters with the codec the server asked for (if any)."""
+        spec = config.get("uplink_codec")
+        if not spec or self.reference is None:
+            return parameters
+        spec = codec.CodecSpec.parse(spec)
+        if self.encoder is None or str(self.encoder.spec) != str(spec):
+            self.encoder = codec.UpdateEncoder(spec)
+        return self.encoder.encode(parameters, reference=self.reference,
+                                   base_round=self.reference_round, round_num=self.reference_round)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            return int(state.get("trained_offset", 0)), state.get("pending")
+        except (FileNotFoundError, ValueError, AttributeError):
+            return 0, None
+
+    def _save_state(self, offset: int, pending=None):
+        """pending: {"update_id", "offset"} of the update sent but not yet confirmed."""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"trained_offset": offset, "pending": pending}, f)
+        os.replace(tmp, self.state_path)
+        self.trained_offset, self.pending = offset, pending
+
+    def _settle_pending(self, config):
+        """Commit the last update's offset if the server confirms it received it, else retrain."""
+        if not self.pending:
+            return
+        if config.get("received_update") == self.pending["update_id"]:
+            self._save_state(int(self.pending["offset"]))
+        else:
+            print("↩️ Server didn't receive the last update; retraining its feedback records.")
+            self._save_state(self.trained_offset)
+
+    def load_tokens(self, start: int = 0, limit=None):
+        return self.token_cache.get(start, list(self.store.read(start, limit)))
 
     def fit(self, parameters, config):
         print("🔄 Syncing weights from Server...")
         self.set_parameters(parameters)
+        if self.unseen_only:
+            self._settle_pending(config)
         
-        with open(DATA_PATH, 'r') as f:
-            raw_data = json.load(f)
-        
-        texts = [f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{x['instruction']}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n{x['output']}<|eot_id|>" for x in raw_data]
+        # Stream only feedback appended since the last round this client trained on
+        start = self.trained_offset if self.unseen_only else 0
+        end = len(self.store)
+        token_ids = self.load_tokens(start, end - start)
+        if not token_ids:
+            print("💤 No new feedback since the last round, skipping local training.")
+            parameters = self.encode_update(self.get_parameters(config={}), config)
+            return parameters, 0, {"train_seconds": 0.0, "payload_bytes": payload_bytes(parameters),
+                                   "adapter_signature": adapter_signature(self.model)}
+        print(f"📚 Training on feedback records {start}..{end - 1} ({len(token_ids)} record(s), "
+              f"token cache {self.token_cache.hits} hits / {self.token_cache.misses} misses)")
         
-        dataset = Dataset.from_dict({"text": texts})
-        dataset = dataset.map(lambda x: self.tokenizer(x["text"], padding="max_length", truncation=True, max_length=128), batched=True)
+        dataset = build_dataset(token_ids, packed=PACK_SEQUENCES)
+        collator = PaddingCollator(self.tokenizer.pad_token_id,
+                                   mask_dtype=torch.float16 if self.use_cuda else torch.float32)
 
         training_args = TrainingArguments(
             output_dir="outputs",
-            per_device_train_batch_size=1, 
-            gradient_accumulation_steps=4, 
+            per_device_train_batch_size=TRAIN_BATCH_SIZE, 
+            gradient_accumulation_steps=GRAD_ACCUM_STEPS, 
+            group_by_length=not PACK_SEQUENCES,
+            length_column_name="length",
+            remove_unused_columns=False,  # the collator needs seq_lens for packed rows
             warmup_steps=2,
-            max_steps=10, 
+            max_steps=int(config.get("max_steps", self.max_steps)),
             learning_rate=2e-4,
-            fp16=True,
+            fp16=self.use_cuda,
             logging_steps=1,
-            optim="paged_adamw_8bit",
+            optim="paged_adamw_8bit" if self.quantize else "adamw_torch",
             save_strategy="no",
-            gradient_checkpointing=True,
+            gradient_checkpointing=self.quantize,
+            use_cpu=not self.use_cuda,
             report_to="none" # Disable WandB logging
         )
 
@@ -110,24 +225,52 @@ class SentinelClient(fl.client.NumPyClient):
             model=self.model,
             train_dataset=dataset,
             args=training_args,
-            data_collator=DataCollatorForLanguageModeling(self.tokenizer, mlm=False),
+            data_collator=collator,
         )
         
-        print("🏋️ Training locally on RTX 3050...")
+        print(f"🏋️ Training locally on {'GPU' if self.use_cuda else 'CPU'}...")
+        started = time.perf_counter()
         trainer.train()
+        train_seconds = time.perf_counter() - started
+        update_id = uuid.uuid4().hex
+        if self.unseen_only:
+            # Not trained_offset yet: the update may still be lost, failed or dropped as stale
+            self._save_state(self.trained_offset, {"update_id": update_id, "offset": end})
         
-        return self.get_parameters(config={}), len(dataset), {}
+        parameters = self.encode_update(self.get_parameters(config={}), config)
+        # FedAvg/FedBuff weight by examples, not by (packed) rows
+        return parameters, len(token_ids), {
+            "update_id": update_id,
+            "train_seconds": train_seconds,
+            "train_rows": len(dataset),
+            "payload_bytes": payload_bytes(parameters),
+            "adapter_signature": adapter_signature(self.model),
+        }
 
     def evaluate(self, parameters, config):
-        return 0.0, 1, {"accuracy": 0.0}
+        # Mean causal-LM loss of the global adapters on local data (convergence tracking)
+        self.set_parameters(parameters)
+        # Most recent records: the ones the latest rounds were trained on
+        samples = int(config.get("eval_samples", 32))
+        token_ids = self.load_tokens(max(0, len(self.store) - samples))
+        if not token_ids:
+            return 0.0, 0, {"loss": 0.0}
+        self.model.eval()
+        losses = []
+        with torch.no_grad():
+            for ids in token_ids:
+                input_ids = torch.tensor([ids], device=self.model.device)
+                losses.append(self.model(input_ids=input_ids, labels=input_ids).loss.item())
+        loss = sum(losses) / len(losses)
+        return loss, len(losses), {"loss": loss}
 
 def main():
     client = SentinelClient()
-    # Align client gRPC message cap with server (~2GB, within 32-bit signed)
+    # Align client gRPC message cap with server
     fl.client.start_numpy_client(
         server_address="127.0.0.1:8080", 
         client=client,
-        grpc_max_message_length=2_000_000_000,
+        grpc_max_message_length=GRPC_MAX_MESSAGE_LENGTH,
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+"""
+Compressed model-update transport
+A codec spec is a "+"-joined string:
+  fp32 | fp16 | int8   value precision (int8 = block-wise absmax scaling)
+  topk<ratio>          keep only the largest-magnitude fraction of entries
+  delta                encode the difference against a shared reference
+e.g. "fp16", "int8+delta", "int8+topk0.05+delta" (top-k implies delta).
+
+All adapter tensors are flattened into one vector and encoded as a short
+list of numpy arrays, so Flower's ndarray serialization applies unchanged:
+  [header, values, scales (int8 only), positions (top-k only)]
+The int64 header makes a payload self-describing; plain float arrays (the
+uncompressed protocol) are never mistaken for one.
+
+Positions are sent as uint32 indices or as a packed bitmask, whichever is
+smaller for the chosen ratio. UpdateEncoder keeps an error-feedback
+residual so entries dropped or rounded away in one round are sent later.
+"""
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+MAGIC = 0x5E17
+QUANT_CODES = {"fp32": 0, "fp16": 1, "int8": 2}
+QUANT_NAMES = {v: k for k, v in QUANT_CODES.items()}
+SPARSE_NONE, SPARSE_INDICES, SPARSE_BITMASK = 0, 1, 2
+INT8_BLOCK = 2048
+
+# header layout
+H_MAGIC, H_QUANT, H_SPARSE, H_DELTA, H_BASE_ROUND, H_ROUND, H_SIZE = range(7)
+
+
+class CodecSpec:
+    def __init__(self, quant: str = "fp32", topk: float = 0.0, delta: bool = False):
+        if quant not in QUANT_CODES:
+            raise ValueError(f"Unknown quantization '{quant}'. Use one of: {', '.join(QUANT_CODES)}")
+        if not 0.0 <= topk < 1.0:
+            raise ValueError(f"topk ratio must be in [0, 1), got {topk}")
+        self.quant = quant
+        self.topk = topk
+        # Sparsifying raw weights would zero the model; top-k only makes sense on deltas
+        self.delta = delta or topk > 0
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "CodecSpec":
+        quant, topk, delta = "fp32", 0.0, False
+        for token in (spec or "fp32").lower().replace(" ", "").split("+"):
+            if token in QUANT_CODES:
+                quant = token
+            elif token.startswith("topk"):
+                topk = float(token[4:])
+            elif token == "delta":
+                delta = True
+            elif token:
+                raise ValueError(f"Unknown codec option '{token}' in '{spec}'")
+        return cls(quant, topk, delta)
+
+    @property
+    def lossless(self) -> bool:
+        return self.quant == "fp32" and not self.topk
+
+    def __str__(self):
+        parts = [self.quant]
+        if self.topk:
+            parts.append(f"topk{self.topk:g}")
+        if self.delta:
+            parts.append("delta")
+        return "+".join(parts)
+
+
+def flatten(arrays: Sequence[np.ndarray]) -> np.ndarray:
+    if not arrays:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate([np.asarray(a, dtype=np.float32).ravel() for a in arrays])
+
+
+def unflatten(flat: np.ndarray, template: Sequence[np.ndarray]) -> List[np.ndarray]:
+    out, offset = [], 0
+    for t in template:
+        out.append(flat[offset:offset + t.size].reshape(t.shape).astype(np.float32, copy=False))
+        offset += t.size
+    if offset != flat.size:
+        raise ValueError(f"Payload has {flat.size} values, template expects {offset}")
+    return out
+
+
+def is_encoded(payload: Sequence[np.ndarray]) -> bool:
+    return (len(payload) >= 2 and payload[0].dtype == np.int64 and payload[0].ndim == 1
+            and payload[0].size > H_SIZE and int(payload[0][H_MAGIC]) == MAGIC)
+
+
+def read_header(payload: Sequence[np.ndarray]) -> dict:
+    h = payload[0]
+    return {
+        "quant": QUANT_NAMES[int(h[H_QUANT])],
+        "sparse": int(h[H_SPARSE]),
+        "delta": bool(h[H_DELTA]),
+        "base_round": int(h[H_BASE_ROUND]),
+        "round": int(h[H_ROUND]),
+        "size": int(h[H_SIZE]),
+    }
+
+
+def payload_bytes(payload: Sequence[np.ndarray]) -> int:
+    return int(sum(np.asarray(p).nbytes for p in payload))
+
+
+def _quantize(values: np.ndarray, quant: str) -> List[np.ndarray]:
+    if quant == "fp32":
+        return [values.astype(np.float32, copy=False)]
+    if quant == "fp16":
+        limit = np.finfo(np.float16).max
+        return [np.clip(values, -limit, limit).astype(np.float16)]
+    padded = np.zeros(math.ceil(values.size / INT8_BLOCK) * INT8_BLOCK, dtype=np.float32)
+    padded[:values.size] = values
+    blocks = padded.reshape(-1, INT8_BLOCK)
+    scales = np.abs(blocks).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(blocks / scales[:, None]), -127, 127).astype(np.int8)
+    return [q.ravel()[:values.size], scales.astype(np.float32)]
+
+
+def _dequantize(parts: List[np.ndarray], quant: str) -> np.ndarray:
+    if quant != "int8":
+        return parts[0].astype(np.float32)
+    q, scales = parts
+    return q.astype(np.float32) * np.repeat(scales, INT8_BLOCK)[:q.size]
+
+
+def encode_flat(flat: np.ndarray, spec: CodecSpec, base_round: int = 0, round_num: int = 0) -> List[np.ndarray]:
+    n = flat.size
+    sparse, positions, values = SPARSE_NONE, None, flat
+    if spec.topk and n:
+        k = max(1, math.ceil(spec.topk * n))
+        idx = np.sort(np.argpartition(np.abs(flat), n - k)[n - k:]) if k < n else np.arange(n)
+        values = flat[idx]
+        if k * 4 <= math.ceil(n / 8):
+            sparse, positions = SPARSE_INDICES, idx.astype(np.uint32)
+        else:
+            mask = np.zeros(n, dtype=bool)
+            mask[idx] = True
+            sparse, positions = SPARSE_BITMASK, np.packbits(mask)
+    header = np.array([MAGIC, QUANT_CODES[spec.quant], sparse, int(spec.delta), base_round, round_num, n], dtype=np.int64)
+    payload = [header] + _quantize(values, spec.quant)
+    if positions is not None:
+        payload.append(positions)
+    return payload
+
+
+def decode_flat(payload: Sequence[np.ndarray]) -> np.ndarray:
+    """Reconstruct the encoded vector (still a delta if the header says so)."""
+    h = read_header(payload)
+    n_quant = 2 if h["quant"] == "int8" else 1
+    values = _dequantize(list(payload[1:1 + n_quant]), h["quant"])
+    if h["sparse"] == SPARSE_NONE:
+        return values
+    flat = np.zeros(h["size"], dtype=np.float32)
+    positions = payload[1 + n_quant]
+    if h["sparse"] == SPARSE_INDICES:
+        flat[positions.astype(np.int64)] = values
+    else:
+        flat[np.unpackbits(positions, count=h["size"]).astype(bool)] = values
+    return flat
+
+
+def encode(arrays: Sequence[np.ndarray], spec: CodecSpec, reference: Optional[Sequence[np.ndarray]] = None,
+           base_round: int = 0, round_num: int = 0) -> List[np.ndarray]:
+    flat = flatten(arrays)
+    if spec.delta:
+        if reference is None:
+            raise ValueError("Delta encoding needs a reference")
+        flat = flat - flatten(reference)
+    return encode_flat(flat, spec, base_round, round_num)
+
+
+def decode(payload: Sequence[np.ndarray], template: Sequence[np.ndarray]) -> List[np.ndarray]:
+    """Decode into arrays shaped like template; for delta payloads template is the reference."""
+    flat = decode_flat(payload)
+    if read_header(payload)["delta"]:
+        flat = flatten(template) + flat
+    return unflatten(flat, template)
+
+
+class UpdateEncoder:
+    """Encodes successive updates for one sender, carrying an error-feedback residual."""
+
+    def __init__(self, spec: CodecSpec, error_feedback: bool = True):
+        self.spec = spec
+        self.error_feedback = error_feedback and not spec.lossless
+        self.residual = None
+
+    def encode(self, arrays: Sequence[np.ndarray], reference: Optional[Sequence[np.ndarray]] = None,
+               base_round: int = 0, round_num: int = 0) -> List[np.ndarray]:
+        flat = flatten(arrays)
+        if self.spec.delta:
+            if reference is None:
+                raise ValueError("Delta encoding needs a reference")
+            flat = flat - flatten(reference)
+        if self.error_feedback and self.residual is not None and self.residual.size == flat.size:
+            flat = flat + self.residual
+        payload = encode_flat(flat, self.spec, base_round, round_num)
+        if self.error_feedback:
+            self.residual = flat - decode_flat(payload)
+        return payload
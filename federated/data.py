@@ -0,0 +1,154 @@
+"""
+Training data pipeline for SentinelClient
+- TokenCache: token ids per feedback record number, persisted under
+  FL_TOKEN_CACHE_DIR so a record is tokenized once, not every round. The
+  log is append-only, so record numbers are stable; each cached entry also
+  keeps the record id and is re-tokenized if the log was replaced.
+- No fixed-length padding: examples are tokenized as-is (up to
+  FL_MAX_SEQ_LEN) and padded per batch. Trainer's group_by_length puts
+  similar lengths in the same batch.
+- Optional packing (FL_PACK_SEQUENCES): short examples are first-fit packed
+  into rows of up to FL_MAX_SEQ_LEN tokens. Each row gets a block-diagonal
+  causal mask (passed as a 4D additive mask) and per-example position ids,
+  so examples never attend to or predict each other.
+"""
+import os
+import json
+import hashlib
+from typing import List
+
+import torch
+
+TOKEN_CACHE_DIR = os.getenv("FL_TOKEN_CACHE_DIR", os.path.join(".cache", "federated"))
+# 128 tokens bounds activation memory on small GPUs; raise it (e.g. 512) to keep long
+# feedback untruncated, usually together with FL_PACK_SEQUENCES
+MAX_SEQ_LEN = int(os.getenv("FL_MAX_SEQ_LEN", 128))
+PACK_SEQUENCES = os.getenv("FL_PACK_SEQUENCES", "false").lower() == "true"
+# Bump when format_example changes so cached token ids are not reused
+TEMPLATE_VERSION = 1
+
+
+def format_example(record: dict) -> str:
+    return f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{record['instruction']}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n{record['output']}<|eot_id|>"
+
+
+class TokenCache:
+    def __init__(self, tokenizer, max_length: int = MAX_SEQ_LEN, cache_dir: str = TOKEN_CACHE_DIR):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        key = hashlib.sha1(f"{tokenizer.name_or_path}|{max_length}|{TEMPLATE_VERSION}".encode()).hexdigest()[:12]
+        self.path = os.path.join(cache_dir, f"tokens-{key}.jsonl")
+        self._entries = None  # record number -> (record id, token ids)
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        self._entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                        self._entries[e["n"]] = (e["id"], e["ids"])
+                    except (ValueError, KeyError):
+                        continue  # torn line from an interrupted run
+        except FileNotFoundError:
+            pass
+
+    def get(self, start: int, records: List[dict]) -> List[List[int]]:
+        """Token ids for records numbered start, start+1, ... (tokenizing only the misses)."""
+        if self._entries is None:
+            self._load()
+        out, missing = [], []
+        for n, rec in enumerate(records, start):
+            cached = self._entries.get(n)
+            if cached and cached[0] == rec.get("id"):
+                out.append(cached[1])
+            else:
+                out.append(None)
+                missing.append((n, rec))
+        self.hits += len(records) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            encoded = self.tokenizer([format_example(r) for _, r in missing], truncation=True,
+                                     max_length=self.max_length, add_special_tokens=True)["input_ids"]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for (n, rec), ids in zip(missing, encoded):
+                    self._entries[n] = (rec.get("id"), ids)
+                    out[n - start] = ids
+                    f.write(json.dumps({"n": n, "id": rec.get("id"), "ids": ids}) + "\n")
+        return out
+
+
+def pack(token_ids: List[List[int]], max_length: int = MAX_SEQ_LEN) -> List[List[int]]:
+    """First-fit decreasing: group example indices into rows of at most max_length tokens."""
+    rows, room = [], []
+    for i in sorted(range(len(token_ids)), key=lambda i: -len(token_ids[i])):
+        n = len(token_ids[i])
+        for r, free in enumerate(room):
+            if n <= free:
+                rows[r].append(i)
+                room[r] -= n
+                break
+        else:
+            rows.append([i])
+            room.append(max_length - n)
+    return rows
+
+
+def build_dataset(token_ids: List[List[int]], packed: bool = PACK_SEQUENCES, max_length: int = MAX_SEQ_LEN):
+    """Rows of input_ids plus their length (for group_by_length) and, if packed, per-example lengths."""
+    from datasets import Dataset
+
+    if not packed:
+        return Dataset.from_dict({"input_ids": token_ids, "length": [len(t) for t in token_ids]})
+    rows = pack(token_ids, max_length)
+    return Dataset.from_dict({
+        "input_ids": [[tok for i in row for tok in token_ids[i]] for row in rows],
+        "seq_lens": [[len(token_ids[i]) for i in row] for row in rows],
+        "length": [sum(len(token_ids[i]) for i in row) for row in rows],
+    })
+
+
+class PaddingCollator:
+    """Pads each batch to its own longest row (rounded to pad_to_multiple_of)."""
+
+    def __init__(self, pad_token_id: int, mask_dtype: torch.dtype = torch.float32, pad_to_multiple_of: int = 8):
+        self.pad_token_id = pad_token_id
+        self.mask_dtype = mask_dtype
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        lengths = [len(f["input_ids"]) for f in features]
+        m = self.pad_to_multiple_of
+        width = -(-max(lengths) // m) * m
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), width), -100, dtype=torch.long)
+        for r, f in enumerate(features):
+            input_ids[r, :lengths[r]] = torch.as_tensor(f["input_ids"])
+            labels[r, :lengths[r]] = input_ids[r, :lengths[r]]
+
+        if "seq_lens" not in features[0]:
+            attention = (torch.arange(width)[None, :] < torch.tensor(lengths)[:, None]).long()
+            return {"input_ids": input_ids, "attention_mask": attention, "labels": labels}
+
+        # Block-diagonal causal mask in additive form: 0 = attend, dtype min = blocked
+        blocked = torch.finfo(self.mask_dtype).min
+        mask = torch.full((len(features), 1, width, width), blocked, dtype=self.mask_dtype)
+        position_ids = torch.zeros((len(features), width), dtype=torch.long)
+        causal = torch.tril(torch.ones(width, width, dtype=torch.bool))
+        for r, f in enumerate(features):
+            start = 0
+            for n in f["seq_lens"]:
+                block = mask[r, 0, start:start + n, start:start + n]
+                block.masked_fill_(causal[:n, :n], 0)
+                position_ids[r, start:start + n] = torch.arange(n)
+                if start:
+                    labels[r, start] = -100  # first token of an example is not predicted from the previous one
+                start += n
+            # Padding rows attend to themselves only (avoids all-masked softmax rows)
+            idx = torch.arange(start, width)
+            mask[r, 0, idx, idx] = 0
+        return {"input_ids": input_ids, "attention_mask": mask, "position_ids": position_ids, "labels": labels}
+
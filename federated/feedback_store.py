@@ -0,0 +1,208 @@
+"""
+Append-only feedback log
+Corrections saved from the UI are appended as one JSON line each to
+FEEDBACK_LOG (default federated/feedback.jsonl) instead of rewriting a JSON
+array on every save.
+  - appends hold an exclusive flock, so concurrent Streamlit sessions and
+    processes can't interleave or lose records; readers open the log
+    read-only under a shared flock and don't block each other
+  - identical (instruction, output) pairs are stored once
+  - a sidecar index (<log>.idx, one little-endian uint64 byte offset per
+    record) lets readers seek straight to record N
+
+Record numbers are stable, so a reader can remember how many records it has
+consumed and later stream only the rest (see SentinelClient.fit). On first
+use the log is seeded from the legacy federated/train_data.json.
+
+Stdlib only: the UI imports this without the training stack.
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+import threading
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+FEEDBACK_LOG = os.getenv("FEEDBACK_LOG", os.path.join("federated", "feedback.jsonl"))
+LEGACY_JSON = os.path.join("federated", "train_data.json")
+OFFSET = struct.Struct("<Q")
+
+
+def record_id(instruction: str, output: str) -> str:
+    return hashlib.sha1(json.dumps([instruction.strip(), output.strip()], ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+class FeedbackStore:
+    def __init__(self, path: str = FEEDBACK_LOG, legacy_path: Optional[str] = LEGACY_JSON):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._offsets = []   # byte offset of every record
+        self._scanned = 0    # bytes of the log already reflected in _offsets
+        self._ids = None     # dedup set, built on first append (readers never need it)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+b")
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # released when the file is closed
+        return f
+
+    def _open_shared(self):
+        f = open(self.path, "rb")  # FileNotFoundError until the first append
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        return f
+
+    def _catch_up(self, f, persist: bool = True):
+        """Index records appended (by us or another process) since the last scan."""
+        size = os.fstat(f.fileno()).st_size
+        if size < self._scanned:  # log was truncated/replaced: start over
+            self._offsets, self._scanned, self._ids = [], 0, None
+        if not self._offsets:
+            self._load_index(f, size)
+        if size == self._scanned:
+            return
+        f.seek(self._scanned)
+        offset, added = self._scanned, 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn write from a crashed appender; see _append_locked
+            try:
+                rid = json.loads(line)["id"]
+                self._offsets.append(offset)
+                added += 1
+                if self._ids is not None:
+                    self._ids.add(rid)
+            except (ValueError, KeyError):
+                pass
+            offset += len(line)
+        self._scanned = offset
+        if added and persist:  # only writers rewrite the sidecar; readers just index in memory
+            self._write_index()
+
+    def _load_index(self, f, size: int):
+        """Trust the sidecar index if its last entry still points at a complete record."""
+        try:
+            with open(self.index_path, "rb") as idx:
+                raw = idx.read()
+        except FileNotFoundError:
+            return
+        offsets = [o for (o,) in OFFSET.iter_unpack(raw[: len(raw) - len(raw) % OFFSET.size])]
+        if not offsets or offsets[-1] >= size:
+            return
+        f.seek(offsets[-1])
+        line = f.readline()
+        try:
+            json.loads(line)["id"]
+        except (ValueError, KeyError):
+            return
+        if line.endswith(b"\n"):
+            self._offsets, self._scanned = offsets, offsets[-1] + len(line)
+
+    def _write_index(self):
+        try:
+            existing = os.path.getsize(self.index_path) // OFFSET.size
+        except FileNotFoundError:
+            existing = 0
+        if existing > len(self._offsets):
+            existing = 0
+        with open(self.index_path, "r+b" if existing else "wb") as idx:
+            idx.seek(existing * OFFSET.size)
+            idx.truncate()
+            idx.write(b"".join(OFFSET.pack(o) for o in self._offsets[existing:]))
+
+    def _load_ids(self, f):
+        self._ids = set()
+        f.seek(0)
+        for line in f:
+            try:
+                self._ids.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                pass
+
+    def _sync(self, f) -> int:
+        self._catch_up(f)
+        if not self._offsets and self.legacy_path:
+            self._seed_from_legacy(f)
+        return len(self._offsets)
+
+    def append(self, instruction: str, output: str, source: str = "ui") -> bool:
+        """Append one record; returns False if the same pair is already stored."""
+        return self.extend([{"instruction": instruction, "output": output}], source=source) == 1
+
+    def extend(self, records, source: str = "ui") -> int:
+        with self._lock, self._open() as f:
+            self._sync(f)
+            return self._append_locked(f, records, source)
+
+    def _append_locked(self, f, records, source) -> int:
+        if self._ids is None:
+            self._load_ids(f)
+        size = os.fstat(f.fileno()).st_size
+        # Terminate a torn tail so it becomes one skipped line instead of corrupting ours
+        chunks = [b"\n"] if size > self._scanned else []
+        offset = size + len(chunks)
+        offsets = []
+        for r in records:
+            rid = record_id(r["instruction"], r["output"])
+            if rid in self._ids:
+                continue
+            line = (json.dumps({"id": rid, "ts": round(time.time(), 3), "source": source,
+                                "instruction": r["instruction"], "output": r["output"]},
+                               ensure_ascii=False) + "\n").encode("utf-8")
+            self._ids.add(rid)
+            offsets.append(offset)
+            offset += len(line)
+            chunks.append(line)
+        if offsets:
+            os.write(f.fileno(), b"".join(chunks))  # O_APPEND + flock: one write at EOF
+            os.fsync(f.fileno())
+            self._offsets.extend(offsets)
+            self._scanned = offset
+            self._write_index()
+        return len(offsets)
+
+    def _seed_from_legacy(self, f) -> int:
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as legacy:
+                data = json.load(legacy)
+        except (FileNotFoundError, ValueError):
+            return 0
+        records = [r for r in data if isinstance(r, dict) and "instruction" in r and "output" in r]
+        added = self._append_locked(f, records, "legacy")
+        if added:
+            print(f"📥 Migrated {added} record(s) from {self.legacy_path} to {self.path}")
+        return added
+
+    def __len__(self) -> int:
+        with self._lock:
+            try:
+                with self._open_shared() as f:
+                    self._catch_up(f, persist=False)
+            except FileNotFoundError:
+                self._offsets, self._scanned, self._ids = [], 0, None
+            if self._offsets or not (self.legacy_path and os.path.exists(self.legacy_path)):
+                return len(self._offsets)
+            # Empty log with a legacy file to migrate: that's a write
+            with self._open() as f:
+                return self._sync(f)
+
+    def read(self, start: int = 0, limit: Optional[int] = None) -> Iterator[dict]:
+        """Stream records start, start+1, ... (record numbers are stable)."""
+        total = len(self)
+        end = total if limit is None else min(total, start + limit)
+        if start >= end:
+            return
+        # No lock while streaming: records up to end are complete and never rewritten
+        with open(self.path, "rb") as f:
+            for offset in self._offsets[start:end]:
+                f.seek(offset)  # skips torn/garbage lines between records
+                yield json.loads(f.readline())
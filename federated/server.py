@@ -1,24 +1,60 @@
+# Run from the repo root: python -m federated.server
+import os
 import flwr as fl
 
+from federated.async_server import BufferedAsyncServer
+from federated.strategy import CompressedFedAvg
+
+# Clients exchange only LoRA adapters (a few MB), so no need for a ~2GB cap
+GRPC_MAX_MESSAGE_LENGTH = int(os.getenv("FL_GRPC_MAX_MESSAGE_MB", 512)) * 1024 * 1024
+# Update compression, see federated/codec.py ("fp32" on both = uncompressed FedAvg)
+UPLINK_CODEC = os.getenv("FL_UPLINK_CODEC", "int8+delta")
+DOWNLINK_CODEC = os.getenv("FL_DOWNLINK_CODEC", "fp16+delta")
+# sync = FedAvg rounds; async = buffered aggregation (num_rounds counts aggregations)
+FL_MODE = os.getenv("FL_MODE", "sync").lower()
+
+
+def fit_metrics(results):
+    """Log adapter payload size and local training time reported by clients."""
+    payload = sum(m.get("payload_bytes", 0) for _, m in results)
+    train = max((m.get("train_seconds", 0.0) for _, m in results), default=0.0)
+    signatures = {m.get("adapter_signature") for _, m in results}
+    if len(signatures) > 1:
+        print(f"⚠️ Clients report different adapter layouts: {signatures}")
+    print(f"📦 Round payload: {payload / 1e6:.2f} MB from {len(results)} client(s), slowest local training {train:.1f}s")
+    return {"payload_bytes": payload, "max_train_seconds": train}
+
+
 def main():
     print("\n🚀 STARTING FEDERATED SERVER")
     print("Waiting for clients to connect on port 8080...\n")
 
-    strategy = fl.server.strategy.FedAvg(
+    strategy = CompressedFedAvg(
         fraction_fit=1.0,
         fraction_evaluate=1.0,
         min_fit_clients=1,
         min_evaluate_clients=1,
         min_available_clients=1,
+        fit_metrics_aggregation_fn=fit_metrics,
+        uplink_codec=UPLINK_CODEC,
+        downlink_codec=DOWNLINK_CODEC,
     )
 
-    # FIX: Increase message limit to 2GB
+    server = None
+    if FL_MODE == "async":
+        server = BufferedAsyncServer(
+            client_manager=fl.server.SimpleClientManager(),
+            strategy=strategy,
+            uplink_codec=UPLINK_CODEC,
+        )
+
     fl.server.start_server(
         server_address="0.0.0.0:8080",
+        server=server,
         config=fl.server.ServerConfig(num_rounds=3),
         strategy=strategy,
-        grpc_max_message_length=2_000_000_000,  # ~2GB, within 32-bit signed limit
+        grpc_max_message_length=GRPC_MAX_MESSAGE_LENGTH,
     )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
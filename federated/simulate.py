@@ -0,0 +1,234 @@
+"""
+Local federated simulation
+Runs N in-process SentinelClients against CompressedFedAvg with Flower's
+simulation engine and reports, per round, the bytes sent each way, the
+round wall time and the clients' evaluation loss (convergence). Defaults
+to a tiny random Llama on CPU so a full run takes seconds and needs no GPU
+or HF token.
+
+Clients are cached per cid inside each simulation actor, so the
+compressed-transport state (reference adapters, error-feedback residual)
+survives across rounds like a real long-lived client. With several actors
+a cid may land on a fresh one; --single-actor pins every client to one
+actor (clients then run one at a time).
+
+--client-delays adds a fixed sleep after local training per client
+(cycled over cids) to model slow devices. --compare-async runs synchronous
+FedAvg for --rounds, then buffered async aggregation (federated/async_server.py)
+over the same number of client updates, and compares wall-clock and loss.
+
+Usage (from the repo root):
+    python -m federated.simulate
+    python -m federated.simulate --clients 3 --rounds 5 --uplink int8+topk0.05 --downlink fp16+delta
+    python -m federated.simulate --compare fp32,fp16,int8+delta,int8+topk0.05 --single-actor --out fl_sim.json
+    python -m federated.simulate --clients 4 --client-delays 0,0,0,6 --compare-async --buffer-size 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import flwr as fl
+
+from federated.async_server import BufferedAsyncServer
+from federated.strategy import CompressedFedAvg
+
+TINY_MODEL = "hf-internal-testing/tiny-random-LlamaForCausalLM"
+
+# GLOBAL CACHE (per simulation actor process)
+_CLIENTS = {}
+
+
+def make_client_fn(model_name: str, quantize: bool, max_steps: int, delays=()):
+    from federated.client import SentinelClient
+
+    class DelayedClient(SentinelClient):
+        def __init__(self, *a, delay_s: float = 0.0, **kw):
+            super().__init__(*a, **kw)
+            self.delay_s = delay_s
+
+        def fit(self, parameters, config):
+            result = super().fit(parameters, config)
+            time.sleep(self.delay_s)  # simulated slow device / uplink
+            return result
+
+    def client_fn(cid: str):
+        if cid not in _CLIENTS:
+            delay = delays[int(cid) % len(delays)] if delays else 0.0
+            # Simulated clients retrain on the whole feedback log every round
+            _CLIENTS[cid] = DelayedClient(model_name=model_name, quantize=quantize, max_steps=max_steps,
+                                          unseen_only=False, delay_s=delay)
+        return _CLIENTS[cid].to_client()
+    return client_fn
+
+
+def simulation_kwargs(args) -> dict:
+    cpus = os.cpu_count() or 1
+    return {
+        "client_fn": make_client_fn(args.model, args.quantize, args.max_steps, args.delays),
+        "num_clients": args.clients,
+        # Fractional CPUs let every client train concurrently; one actor keeps per-cid state sticky
+        "client_resources": {"num_cpus": cpus if args.single_actor else cpus / args.clients, "num_gpus": 0.0},
+    }
+
+
+def run(args, uplink: str, downlink: str, initial) -> dict:
+    strategy = CompressedFedAvg(
+        fraction_fit=1.0,
+        fraction_evaluate=1.0,
+        min_fit_clients=args.clients,
+        min_evaluate_clients=args.clients,
+        min_available_clients=args.clients,
+        initial_parameters=fl.common.ndarrays_to_parameters(initial),
+        on_evaluate_config_fn=lambda server_round: {"eval_samples": args.eval_samples},
+        uplink_codec=uplink,
+        downlink_codec=downlink,
+    )
+    started = time.perf_counter()
+    fl.simulation.start_simulation(
+        config=fl.server.ServerConfig(num_rounds=args.rounds),
+        strategy=strategy,
+        **simulation_kwargs(args),
+    )
+    rounds = [strategy.rounds[r] for r in sorted(strategy.rounds)]
+    return {
+        "mode": "sync",
+        "client_updates": sum(r.get("clients", 0) for r in rounds),
+        "uplink": str(strategy.uplink),
+        "downlink": str(strategy.downlink),
+        "total_s": round(time.perf_counter() - started, 2),
+        # Fit rounds only (evaluation runs every round here but once at the end in async mode)
+        "train_s": round(sum(r.get("round_s", 0) for r in rounds), 2),
+        "upload_bytes": sum(r.get("upload_bytes", 0) for r in rounds),
+        "download_bytes": sum(r.get("download_bytes", 0) for r in rounds),
+        "final_loss": rounds[-1].get("loss") if rounds else None,
+        "rounds": rounds,
+    }
+
+
+def run_async(args, uplink: str, initial, aggregations: int) -> dict:
+    strategy = fl.server.strategy.FedAvg(
+        fraction_evaluate=1.0,
+        min_evaluate_clients=args.clients,
+        min_available_clients=args.clients,
+        initial_parameters=fl.common.ndarrays_to_parameters(initial),
+        on_evaluate_config_fn=lambda server_round: {"eval_samples": args.eval_samples},
+    )
+    server = BufferedAsyncServer(
+        client_manager=fl.server.SimpleClientManager(),
+        strategy=strategy,
+        buffer_size=args.buffer_size,
+        max_staleness=args.max_staleness,
+        uplink_codec=uplink,
+        min_clients=args.clients,
+    )
+    started = time.perf_counter()
+    history = fl.simulation.start_simulation(
+        server=server,
+        config=fl.server.ServerConfig(num_rounds=aggregations),
+        strategy=strategy,
+        **simulation_kwargs(args),
+    )
+    total_s = round(time.perf_counter() - started, 2)
+    losses = history.losses_distributed if history else []
+    return {
+        "mode": "async",
+        "uplink": str(server.uplink),
+        "downlink": "fp32",
+        "total_s": total_s,
+        "train_s": round(server.aggregations[-1]["elapsed_s"], 2) if server.aggregations else None,
+        "client_updates": server.accepted,
+        "dropped": server.dropped,
+        "final_loss": round(float(losses[-1][1]), 5) if losses else None,
+        "aggregations": server.aggregations,
+    }
+
+
+def print_run(result: dict):
+    if result["mode"] == "async":
+        print(f"\n--- async uplink={result['uplink']} ({result['total_s']}s) ---")
+        print(f"{'version':<9}{'updates':>8}{'staleness':>11}{'elapsed s':>11}")
+        for a in result["aggregations"]:
+            print(f"{a['version']:<9}{a['updates']:>8}{a['mean_staleness']:>11.2f}{a['elapsed_s']:>11.2f}")
+        return
+
+    print(f"\n--- uplink={result['uplink']} downlink={result['downlink']} ({result['total_s']}s) ---")
+    print(f"{'round':<7}{'clients':>8}{'down MB':>10}{'up MB':>9}{'round s':>9}{'train s':>9}{'loss':>9}")
+    for r in result["rounds"]:
+        loss = f"{r['loss']:.4f}" if "loss" in r else "-"
+        print(f"{r['round']:<7}{r.get('clients', 0):>8}{r.get('download_bytes', 0) / 1e6:>10.3f}"
+              f"{r.get('upload_bytes', 0) / 1e6:>9.3f}{r.get('round_s', 0):>9.2f}{r.get('max_train_s', 0):>9.2f}{loss:>9}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Simulate federated rounds locally and measure payload/round time/loss")
+    p.add_argument("--model", default=TINY_MODEL)
+    p.add_argument("--clients", type=int, default=2)
+    p.add_argument("--rounds", type=int, default=3)
+    p.add_argument("--max-steps", type=int, default=2, help="Local training steps per round")
+    p.add_argument("--eval-samples", type=int, default=16)
+    p.add_argument("--uplink", default="fp32", help="Uplink codec spec, see federated/codec.py")
+    p.add_argument("--downlink", default="fp32", help="Downlink codec spec")
+    p.add_argument("--compare", help="Comma-separated uplink specs to run back to back (downlink from --downlink)")
+    p.add_argument("--client-delays", default="", help="Comma-separated extra seconds per fit, cycled over clients")
+    p.add_argument("--single-actor", action="store_true", help="Run every client in one actor (sticky codec state)")
+    p.add_argument("--compare-async", action="store_true", help="Compare sync FedAvg with buffered async aggregation")
+    p.add_argument("--buffer-size", type=int, default=2, help="Async: updates per aggregation (K)")
+    p.add_argument("--max-staleness", type=int, default=4, help="Async: drop updates staler than this")
+    p.add_argument("--quantize", action="store_true", help="4-bit base model (needs CUDA + bitsandbytes)")
+    p.add_argument("--out", help="Write results JSON here")
+    args = p.parse_args(argv)
+    args.delays = [float(d) for d in args.client_delays.split(",") if d.strip()]
+
+    from federated.adapters import full_state_bytes, get_adapter_parameters, payload_bytes
+    from federated.client import SentinelClient
+
+    # Reference client: initial global adapters + size of the old full state_dict exchange
+    ref = SentinelClient(model_name=args.model, quantize=args.quantize, max_steps=args.max_steps, unseen_only=False)
+    initial = get_adapter_parameters(ref.model)
+    adapter_bytes, full_bytes = payload_bytes(initial), full_state_bytes(ref.model)
+    del ref
+
+    uplinks = [s.strip() for s in args.compare.split(",") if s.strip()] if args.compare else [args.uplink]
+    results = []
+    for uplink in uplinks:
+        _CLIENTS.clear()
+        results.append(run(args, uplink, args.downlink, initial))
+        print_run(results[-1])
+
+    print(f"\nDense adapter payload per client: {adapter_bytes / 1e6:.3f} MB "
+          f"(full state_dict: {full_bytes / 1e6:.1f} MB, {full_bytes / max(adapter_bytes, 1):.0f}x larger)")
+    if args.compare_async:
+        # Same number of client updates as the synchronous run
+        aggregations = max(1, args.rounds * args.clients // args.buffer_size)
+        _CLIENTS.clear()
+        results.append(run_async(args, uplinks[0], initial, aggregations))
+        print_run(results[-1])
+
+    if args.compare_async:
+        sync, buffered = results[0], results[-1]
+        print(f"\n{'mode':<8}{'updates':>9}{'train s':>9}{'final loss':>12}")
+        for r in (sync, buffered):
+            loss = f"{r['final_loss']:.4f}" if r["final_loss"] is not None else "-"
+            print(f"{r['mode']:<8}{r['client_updates']:>9}{r['train_s'] or 0:>9.2f}{loss:>12}")
+        print(f"Buffered async trained {sync['train_s'] / max(buffered['train_s'] or 0, 1e-9):.2f}x faster "
+              f"({buffered['dropped']} update(s) dropped as too stale)")
+    elif len(results) > 1:
+        base = results[0]
+        print(f"{'uplink':<24}{'up MB':>9}{'ratio':>8}{'total s':>9}{'final loss':>12}")
+        for r in results:
+            ratio = base["upload_bytes"] / max(r["upload_bytes"], 1)
+            loss = f"{r['final_loss']:.4f}" if r["final_loss"] is not None else "-"
+            print(f"{r['uplink']:<24}{r['upload_bytes'] / 1e6:>9.3f}{ratio:>7.1f}x{r['total_s']:>9.2f}{loss:>12}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "clients": args.clients, "adapter_bytes": adapter_bytes,
+                       "full_state_bytes": full_bytes, "runs": results}, f, indent=2)
+        print(f"💾 Results saved to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+FedAvg with compressed transport (see federated/codec.py)
+Downlink: the server keeps a reference copy of the global adapters that
+every in-sync client also holds. Clients that received the previous round
+get the new global as a compressed delta against it. New or out-of-sync
+clients get the reference losslessly. Either way they end up with the same
+reference, so client deltas can be decoded against it.
+
+Uplink: clients are told which codec to use through the fit config
+("uplink_codec"). Their updates are decoded against the reference and then
+averaged by example count, as in FedAvg. The next fit config tells each
+client the last update_id it sent that was aggregated ("received_update"),
+so it only then marks those feedback records as trained.
+
+Top-k applies to the uplink only. A sparse broadcast would need every
+client to hold the same base round, which sampling does not guarantee.
+"""
+import time
+from typing import Dict, List, Optional
+
+import flwr as fl
+from flwr.common import FitIns, ndarrays_to_parameters, parameters_to_ndarrays
+from flwr.server.strategy.aggregate import aggregate
+
+from federated import codec
+
+
+def wire_bytes(parameters) -> int:
+    return int(sum(len(t) for t in parameters.tensors))
+
+
+class CompressedFedAvg(fl.server.strategy.FedAvg):
+    def __init__(self, *args, uplink_codec: str = "fp32", downlink_codec: str = "fp32", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uplink = codec.CodecSpec.parse(uplink_codec)
+        self.downlink = codec.CodecSpec.parse(downlink_codec)
+        if self.downlink.topk:
+            raise ValueError("Top-k is only supported on the uplink")
+        self.reference: Optional[List] = None
+        self.reference_round = 0
+        self.client_rounds: Dict[str, int] = {}
+        self.received: Dict[str, str] = {}  # cid -> update_id of its last aggregated update
+        self.rounds: Dict[int, dict] = {}
+        print(f"📡 Compressed FedAvg: uplink={self.uplink}, downlink={self.downlink}")
+
+    def _stats(self, server_round: int) -> dict:
+        return self.rounds.setdefault(server_round, {"round": server_round})
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        if not instructions:
+            return instructions
+        started = time.perf_counter()
+        global_arrays = parameters_to_ndarrays(parameters)
+
+        delta_payload = None
+        if self.downlink.delta:
+            if self.reference is not None:
+                delta_payload = codec.encode(global_arrays, self.downlink, reference=self.reference,
+                                             base_round=self.reference_round, round_num=server_round)
+                new_reference = codec.decode(delta_payload, self.reference)
+            else:
+                # Nothing to diff against yet: everyone gets the global as-is
+                new_reference = [a.astype("float32") for a in global_arrays]
+            full_payload = codec.encode(new_reference, codec.CodecSpec("fp32"), round_num=server_round)
+        else:
+            full_payload = codec.encode(global_arrays, self.downlink, round_num=server_round)
+            new_reference = codec.decode(full_payload, global_arrays)
+
+        full_parameters = ndarrays_to_parameters(full_payload)
+        delta_parameters = ndarrays_to_parameters(delta_payload) if delta_payload is not None else None
+
+        configured, download = [], 0
+        for client, fit_ins in instructions:
+            in_sync = delta_parameters is not None and self.client_rounds.get(client.cid) == self.reference_round
+            sent = delta_parameters if in_sync else full_parameters
+            config = dict(fit_ins.config, uplink_codec=str(self.uplink), round=server_round,
+                          received_update=self.received.get(client.cid, ""))
+            configured.append((client, FitIns(sent, config)))
+            self.client_rounds[client.cid] = server_round
+            download += wire_bytes(sent)
+
+        self.reference, self.reference_round = new_reference, server_round
+        self._stats(server_round).update({
+            "started": started,
+            "clients": len(configured),
+            "download_bytes": download,
+            "dense_bytes": wire_bytes(parameters) * len(configured),
+        })
+        return configured
+
+    def aggregate_fit(self, server_round, results, failures):
+        for failure in failures:
+            # A failed client may not hold this round's reference; resync it next time
+            if isinstance(failure, tuple):
+                self.client_rounds.pop(failure[0].cid, None)
+        if not results or (failures and not self.accept_failures):
+            return None, {}
+
+        updates, received, upload = [], {}, 0
+        for client, fit_res in results:
+            upload += wire_bytes(fit_res.parameters)
+            if fit_res.num_examples == 0:
+                continue  # client had no new feedback this round
+            payload = parameters_to_ndarrays(fit_res.parameters)
+            if codec.is_encoded(payload):
+                header = codec.read_header(payload)
+                if header["delta"] and header["base_round"] != self.reference_round:
+                    print(f"⚠️ Dropping update from {client.cid}: based on round {header['base_round']}, "
+                          f"reference is {self.reference_round}")
+                    self.client_rounds.pop(client.cid, None)
+                    continue
+                payload = codec.decode(payload, self.reference)
+            updates.append((payload, fit_res.num_examples))
+            received[client.cid] = fit_res.metrics.get("update_id", "")
+        if not updates:
+            return None, {}
+        self.received.update(received)
+
+        aggregated = ndarrays_to_parameters(aggregate(updates))
+        metrics = {}
+        if self.fit_metrics_aggregation_fn:
+            metrics = self.fit_metrics_aggregation_fn([(res.num_examples, res.metrics) for _, res in results])
+
+        stats = self._stats(server_round)
+        stats.update({
+            "upload_bytes": upload,
+            "round_s": round(time.perf_counter() - stats.pop("started", time.perf_counter()), 3),
+            "max_train_s": round(max((res.metrics.get("train_seconds", 0.0) for _, res in results), default=0.0), 3),
+        })
+        print(f"📦 Round {server_round}: ↓ {stats['download_bytes'] / 1e6:.3f} MB, ↑ {upload / 1e6:.3f} MB "
+              f"({len(results)} client(s), {stats['round_s']:.2f}s)")
+        return aggregated, metrics
+
+    def aggregate_evaluate(self, server_round, results, failures):
+        loss, metrics = super().aggregate_evaluate(server_round, results, failures)
+        if loss is not None:
+            self._stats(server_round)["loss"] = round(float(loss), 5)
+        return loss, metrics
@@ -0,0 +1,30 @@
+"""
+Gunicorn config for multi-worker serving with pre-fork model preloading.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The master imports main, loads the embedding model and FAISS index (see
+app/prefork.py) and forks WEB_CONCURRENCY uvicorn workers that share them
+copy-on-write. Set PRELOAD_MODELS=false to load per worker instead.
+"""
+import os
+
+bind = f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+preload_app = os.getenv("PRELOAD_MODELS", "true").lower() == "true"
+
+
+def on_starting(server):
+    # Runs in the master after the app is imported (preload_app) and before any fork
+    if preload_app:
+        from app.prefork import preload_in_master
+        preload_in_master()
+
+
+def post_fork(server, worker):
+    from app.prefork import after_fork_in_worker
+    after_fork_in_worker()
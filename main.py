@@ -1,6 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
+import json
+import time
+import sys
 import os
 
 # Load environment variables
@@ -13,31 +20,134 @@ USE_MOCK = os.getenv("USE_MOCK", "false").lower() == "true"
 if not os.getenv("GOOGLE_API_KEY") and os.getenv("GEMINI_API_KEY"):
     os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
 
+from app.admission import admission, check_agents, AdmissionRejected
+from app.coalesce import coalescer, coalesce_key, FollowerTimeout
+from app.deadline import Deadline, parse_timeout
+from app.metrics import metrics
+
+# Merge concurrent identical queries into one graph execution
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+
+# /chat/batch: default per-batch concurrency and maximum queries per batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 500))
+
+# How often a waiting /chat checks whether its client is still connected
+DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", 0.5))
+
+from app.warmup import load_agent_app, parse_agents, start_warmup, warmup_status, is_warming
+
 if USE_MOCK:
-    print("⚠️  MOCK MODE ENABLED - Using offline implementations")
-    # Use mock implementations
-    from app.graph_mock import app as agent_app
+    print("⚠️  MOCK MODE ENABLED - Real graph with fake LLM, SQLite and stub search")
 else:
     llm_provider = os.getenv("LLM_PROVIDER", "gemini").upper()
     print(f"✅ PRODUCTION MODE - Using {llm_provider} LLM")
-    # Use real implementations
-    from app.graph import app as agent_app
+
+# The LangGraph app (and every agent's heavy deps) is loaded lazily on first
+# use so workers boot fast; tests/benchmarks may assign a replacement here.
+agent_app = None
+
+
+async def get_agent_app():
+    global agent_app
+    if agent_app is None:
+        # First import compiles the graph; keep it off the event loop
+        agent_app = await asyncio.to_thread(load_agent_app)
+    return agent_app
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Optional background preload, e.g. WARMUP_AGENTS="SQL_Agent,RAG_Agent" or "all"
+    agents = parse_agents(os.getenv("WARMUP_AGENTS"))
+    if agents:
+        print(f"[WARMUP] Preloading in background: {', '.join(agents)}")
+        start_warmup(agents)
+    # Background refresh of registered forecast series (FORECAST_REFRESH_INTERVAL seconds, 0 = off)
+    from app.forecast_store import start_scheduler, stop_scheduler
+    if start_scheduler():
+        print("[FORECAST] Background refresh of registered series started")
+    yield
+    # Lets an in-flight scheduled fit finish its write (bounded) without blocking the loop
+    await asyncio.to_thread(stop_scheduler)
 
 
 app = FastAPI(
     title="Sentinel AI Agent Framework",
     version="1.0.0",
-    description="Multi-agent AI system for SQL queries and forecasting"
+    description="Multi-agent AI system for SQL queries and forecasting",
+    lifespan=lifespan,
 )
 
 
 class ChatRequest(BaseModel):
     query: str
+    session_id: Optional[str] = None
+
+
+class BatchChatRequest(BaseModel):
+    queries: List[str]
+    session_id: Optional[str] = None
+    # Queries run at once (capped by BATCH_CONCURRENCY and MAX_IN_FLIGHT)
+    concurrency: Optional[int] = None
+
+
+class TableSummary(BaseModel):
+    table_id: str
+    columns: List[str]
+    dtypes: List[str] = []
+    total_rows: int
+    truncated: bool = False
+    sql: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
     agent_used: str = "unknown"
+    # Structured SQL results; fetch rows page by page from /tables/{table_id}
+    tables: Optional[List[TableSummary]] = None
+    # True when the request hit its deadline and this is the best answer available by then
+    partial: bool = False
+    trace_id: Optional[str] = None
+    trace: Optional[dict] = None
+
+
+def _trace_mode(http_request: Request) -> Optional[str]:
+    """
+    Opt-in tracing via `X-Sentinel-Trace` header or `?trace=` query flag.
+    "inline" returns the span tree in the response; any other truthy value
+    only stores it for retrieval via /traces/{id}.
+    """
+    flag = (http_request.headers.get("x-sentinel-trace") or http_request.query_params.get("trace") or "").lower()
+    if flag in ("", "0", "false", "no", "off"):
+        return None
+    return "inline" if flag == "inline" else "store"
+
+
+def _request_timeout(http_request: Request) -> float:
+    """Seconds from the `X-Sentinel-Timeout` header or `?timeout=`, else REQUEST_TIMEOUT."""
+    value = http_request.headers.get("x-sentinel-timeout") or http_request.query_params.get("timeout")
+    try:
+        return parse_timeout(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timeout {value!r}: expected seconds > 0")
+
+
+async def _until_disconnected(http_request: Request, work):
+    """Await work, cancelling it if the client goes away first (returns None then)."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                metrics.inc("client_disconnects_total")
+                task.cancel()
+                return None
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
 
 
 @app.get("/")
@@ -47,13 +157,20 @@ async def root():
         "message": "Sentinel AI Agent Framework",
         "version": "1.0.0",
         "mode": mode,
-        "endpoints": ["/", "/health", "/chat", "/docs"]
+        "endpoints": ["/", "/health", "/chat", "/chat/batch", "/metrics", "/warmup", "/traces/{trace_id}", "/tables/{table_id}", "/forecasts", "/docs"]
     }
 
 
 @app.get("/health")
 async def health():
     mode = "MOCK" if USE_MOCK else "PRODUCTION"
+    # Keep load balancers away until scheduled warm-up (WARMUP_AGENTS, /warmup) completes
+    if is_warming():
+        return JSONResponse(
+            status_code=503,
+            content={"status": "warming", "service": "sentinel-ai", "mode": mode, "agents": warmup_status()},
+            headers={"Retry-After": "5"},
+        )
     return {
         "status": "healthy",
         "service": "sentinel-ai",
@@ -62,7 +179,187 @@ async def health():
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request, response: Response):
+    trace_mode = _trace_mode(http_request)
+    # The clock starts on arrival, so time spent queued for admission counts too
+    deadline = Deadline(_request_timeout(http_request))
+    try:
+        result = await _until_disconnected(http_request, _chat(request, trace_mode, response, deadline))
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.reason},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    if result is None:
+        # Nobody to answer; 499 = client closed request (nginx convention), shows up in access logs
+        return Response(status_code=499)
+    return result
+
+
+async def _chat(request: ChatRequest, trace_mode: Optional[str], response: Response, deadline: Deadline) -> ChatResponse:
+    if trace_mode is None and COALESCE_REQUESTS:
+        result, shared = await _coalesced_chat(request, deadline)
+        if shared:
+            response.headers["X-Coalesced"] = "true"
+        return result
+    return await _admitted_chat(request, trace_mode, response, deadline=deadline)
+
+
+async def _coalesced_chat(request: ChatRequest, deadline: Deadline, route_hint: Optional[str] = None,
+                          rerun: bool = False) -> tuple:
+    """
+    Identical concurrent queries share one execution (and one admission slot),
+    but each caller only waits as long as its own deadline allows, and a
+    partial (timed-out) result is only accepted by the caller it timed out for.
+    Returns (response, shared).
+    """
+    key = coalesce_key(request.query, request.session_id)
+    if rerun:
+        key += ":rerun"  # followers re-running after a partial share one execution too
+    progress = {}
+    try:
+        result, shared = await coalescer.run(
+            key,
+            lambda: _admitted_chat(request, route_hint=route_hint, deadline=deadline, progress=progress),
+            timeout=deadline.remaining(),
+            progress=progress,
+        )
+    except FollowerTimeout as e:
+        return _follower_partial(e.progress, deadline), True
+    if shared and result.partial and not rerun and not deadline.expired:
+        # The leader ran out of its own (shorter) time; this caller still has budget for a full answer
+        metrics.inc("coalesce_partial_reruns_total")
+        return await _coalesced_chat(request, deadline, route_hint, rerun=True)
+    return result.model_copy(), shared
+
+
+async def _admitted_chat(request: ChatRequest, trace_mode: Optional[str] = None, response: Optional[Response] = None,
+                         route_hint: Optional[str] = None, deadline: Optional[Deadline] = None,
+                         progress: Optional[dict] = None) -> ChatResponse:
+    # Shed load before doing any work: saturated agent -> 429, full queue -> 503
+    check_agents(request.query)
+    async with admission.slot():
+        if trace_mode is None:
+            return await _run_chat(request, route_hint=route_hint, deadline=deadline, progress=progress)
+        return await _traced_chat(request, trace_mode, response, deadline)
+
+
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest, http_request: Request):
+    """
+    Run many queries through the graph with bounded concurrency. Streams NDJSON:
+    one line per query as it completes (with its index in the request), then a
+    summary line. A failed query is reported on its own line; the batch goes on.
+    X-Sentinel-Timeout / ?timeout= applies to each query, from when it starts.
+    """
+    timeout = _request_timeout(http_request)
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries must not be empty")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY, admission.max_in_flight))
+    return StreamingResponse(_stream_batch(request, concurrency, timeout), media_type="application/x-ndjson")
+
+
+async def _preroute(queries: List[str], concurrency: int) -> List[Optional[str]]:
+    """Supervisor decisions for the whole batch in one llm.abatch (real graph only)."""
+    graph = await get_agent_app()
+    graph_module = sys.modules.get("app.graph")
+    if graph_module is None or graph is not graph_module.app:
+        return [None] * len(queries)  # replaced app (benchmarks): it routes on its own
+    try:
+        return await graph_module.preroute(queries, max_concurrency=concurrency)
+    except Exception as e:
+        print(f"⚠️ [BATCH] Pre-routing failed, the Supervisor will route each query: {e}")
+        return [None] * len(queries)
+
+
+async def _batch_item(query: str, session_id: Optional[str], route_hint: Optional[str], timeout: float) -> ChatResponse:
+    request = ChatRequest(query=query, session_id=session_id)
+    deadline = Deadline(timeout)
+    if not COALESCE_REQUESTS:
+        return await _admitted_chat(request, route_hint=route_hint, deadline=deadline)
+    # Duplicates inside the batch (or matching live /chat requests) share one execution
+    result, _ = await _coalesced_chat(request, deadline, route_hint)
+    return result
+
+
+async def _stream_batch(request: BatchChatRequest, concurrency: int, timeout: float):
+    started = time.perf_counter()
+    hints = await _preroute(request.queries, concurrency)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, query: str) -> dict:
+        async with limit:
+            item_started = time.perf_counter()
+            item = {"index": index, "query": query}
+            try:
+                result = await _batch_item(query, request.session_id, hints[index], timeout)
+                item.update(result.model_dump(exclude_none=True))
+                item["status"] = "error" if result.agent_used == "error" else "ok"
+            except AdmissionRejected as e:
+                item.update(status="error", error=e.reason, status_code=e.status_code, retry_after=e.retry_after)
+            except Exception as e:
+                item.update(status="error", error=str(e))
+            item["latency_ms"] = round((time.perf_counter() - item_started) * 1000, 1)
+            metrics.inc("batch_items_total", status=item["status"])
+            return item
+
+    tasks = [asyncio.ensure_future(run_one(i, q)) for i, q in enumerate(request.queries)]
+    counts = {"ok": 0, "error": 0}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            counts[item["status"]] += 1
+            yield json.dumps(item) + "\n"
+    finally:
+        # Client went away mid-stream: don't keep running the rest of the batch
+        for task in tasks:
+            task.cancel()
+    yield json.dumps({
+        "done": True,
+        "total": len(request.queries),
+        "succeeded": counts["ok"],
+        "failed": counts["error"],
+        "prerouted": sum(1 for h in hints if h),
+        "concurrency": concurrency,
+        "elapsed_s": round(time.perf_counter() - started, 3),
+    }) + "\n"
+
+
+async def _traced_chat(request: ChatRequest, trace_mode: str, response: Response, deadline: Optional[Deadline] = None) -> ChatResponse:
+    from app.tracing import start_trace, span, trace_store, TraceCallbackHandler
+
+    with start_trace(request.query, store=False) as trace:
+        try:
+            with span("POST /chat", kind="request") as root:
+                handler = TraceCallbackHandler(trace, root_span=root)
+                result = await _run_chat(request, config={"callbacks": [handler], "run_name": "Sentinel"},
+                                         deadline=deadline)
+                root.attrs["agent_used"] = result.agent_used
+        finally:
+            # SQLite write (shared across workers): keep it off the event loop
+            await asyncio.to_thread(trace_store.put, trace)
+
+    response.headers["X-Trace-Id"] = trace.id
+    result.trace_id = trace.id
+    if trace_mode == "inline":
+        result.trace = trace.to_dict()
+    return result
+
+
+async def _run_chat(request: ChatRequest, config: Optional[dict] = None, route_hint: Optional[str] = None,
+                    deadline: Optional[Deadline] = None, progress: Optional[dict] = None) -> ChatResponse:
+    from app.deadline import DeadlineCallbackHandler, DeadlineExceeded
+
+    deadline = deadline or Deadline()
+    # Fails LLM/tool calls once time is up and keeps intermediate output for a partial answer
+    watcher = DeadlineCallbackHandler(deadline)
+    config = {**(config or {}), "callbacks": [*((config or {}).get("callbacks") or []), watcher]}
+    # Shared with coalesced followers, which may have to answer before this run finishes
+    latest = progress if progress is not None else {}
+    latest["watcher"] = watcher
     try:
         from langchain_core.messages import HumanMessage
         
@@ -72,14 +369,25 @@ async def chat(request: ChatRequest):
             "query": request.query,
             "next": "",
             "agent_decision": "",
+            "route_hint": route_hint,
             "sql_data": [],
             "sql_context": [],
+            "tables": [],
             "forecast_result": None,
-            "supervisor_count": 0
+            "supervisor_count": 0,
+            "deadline": deadline,
         }
         
+        graph = await get_agent_app()
+
+        async def run_graph():
+            # Keep the state after every step so a timeout can answer from the last one
+            async for state in graph.astream(inputs, config=config, stream_mode="values"):
+                latest["state"] = state
+
         # Invoke LangGraph
-        result = await agent_app.ainvoke(inputs)
+        await asyncio.wait_for(run_graph(), timeout=deadline.remaining())
+        result = latest["state"]
         
         # Extract final answer
         last_msg = result["messages"][-1]
@@ -87,8 +395,20 @@ async def chat(request: ChatRequest):
         
         return ChatResponse(
             response=response_text,
-            agent_used=result.get("agent_decision") or result.get("next", "unknown")
+            agent_used=result.get("agent_decision") or result.get("next", "unknown"),
+            tables=result.get("tables") or None,
         )
+    except (asyncio.TimeoutError, DeadlineExceeded):
+        # Worker threads notice at their next LLM/tool/SQL call and stop
+        deadline.cancel("timeout")
+        return _partial_response(latest.get("state") or {}, watcher, deadline)
+    except asyncio.CancelledError:
+        # Client disconnected (or the batch stream closed): stop the graph's remaining work
+        deadline.cancel("cancelled")
+        raise
+    except AdmissionRejected:
+        # A bulkhead inside the graph shed this request; let /chat turn it into a 429
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -98,6 +418,158 @@ async def chat(request: ChatRequest):
         )
 
 
+def _follower_partial(progress: Optional[dict], deadline: Deadline) -> ChatResponse:
+    """A coalesced follower's own timeout: answer from the shared execution's progress so far."""
+    from app.deadline import DeadlineCallbackHandler
+
+    progress = progress or {}
+    return _partial_response(progress.get("state") or {}, progress.get("watcher") or DeadlineCallbackHandler(deadline),
+                             deadline)
+
+
+def _partial_response(state: dict, watcher, deadline: Deadline) -> ChatResponse:
+    """Best answer available at the deadline: last completed node, else the latest LLM/tool output."""
+    from langchain_core.messages import AIMessage
+
+    messages = state.get("messages") or []
+    answer, source = None, "none"
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].content:
+        answer, source = messages[-1].content, "graph"
+    elif watcher.partial_answer():
+        answer, source = watcher.partial_answer(), "intermediate"
+    metrics.inc("partial_responses_total", source=source)
+    print(f"⏱️ Request timed out after {deadline.timeout:.0f}s, returning partial answer (source={source})")
+
+    tables = {t["table_id"]: t for t in [*(state.get("tables") or []), *watcher.tables]}
+    note = f"⏱️ Timed out after {deadline.timeout:.0f}s"
+    return ChatResponse(
+        response=f"{answer}\n\n({note}; this answer may be incomplete.)" if answer
+        else f"{note} before an answer was ready. Try a narrower question or a longer timeout.",
+        agent_used=state.get("agent_decision") or "timeout",
+        tables=list(tables.values()) or None,
+        partial=True,
+    )
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: str = "tree"):
+    """Fetch a stored request trace as a span tree or Chrome trace-event JSON."""
+    from app.tracing import trace_store
+
+    trace = await asyncio.to_thread(trace_store.get, trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found (expired or never recorded)")
+    if format == "chrome":
+        return JSONResponse(
+            trace.to_chrome(),
+            headers={"Content-Disposition": f'attachment; filename="sentinel-trace-{trace_id}.json"'},
+        )
+    return trace.to_dict()
+
+
+@app.get("/tables/{table_id}")
+async def get_table(table_id: str, offset: int = 0, limit: Optional[int] = None, format: str = "json"):
+    """One page of a captured SQL result: columnar JSON, or Arrow IPC stream with format=arrow."""
+    from app.tables import table_store, TABLE_PAGE_SIZE
+
+    table = await asyncio.to_thread(table_store.get, table_id)
+    if table is None:
+        raise HTTPException(status_code=404, detail=f"Table {table_id} not found (expired or never recorded)")
+    limit = limit or TABLE_PAGE_SIZE
+    if format == "arrow":
+        try:
+            body = table.to_arrow(offset, limit)
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Arrow output needs pyarrow installed on the server")
+        return Response(content=body, media_type="application/vnd.apache.arrow.stream")
+    return table.page(offset, limit)
+
+
+@app.get("/forecasts")
+async def list_forecasts():
+    """Registered forecast series and the state of their materialized forecasts."""
+    from app.forecast_store import get_forecast_store
+
+    store = get_forecast_store()
+    states = await asyncio.to_thread(lambda: {name: store.state(name) for name in store.registry})
+    return {
+        "series": [
+            {"name": name, "description": spec.get("description"), "horizon": spec["horizon"], "freq": spec["freq"],
+             "state": {k: v for k, v in (states[name] or {}).items() if k not in ("name", "params")} or None}
+            for name, spec in store.registry.items()
+        ]
+    }
+
+
+@app.get("/forecasts/{name}")
+async def get_forecast(name: str):
+    """Materialized forecast points of one registered series."""
+    from app.forecast_store import get_forecast_store
+
+    store = get_forecast_store()
+    if name not in store.registry:
+        raise HTTPException(status_code=404, detail=f"Forecast series {name} is not registered")
+    points = await asyncio.to_thread(store.points, name)
+    if not points:
+        raise HTTPException(status_code=404, detail=f"Forecast series {name} has not been fitted yet")
+    columns = ["ds", "yhat", "yhat_lower", "yhat_upper", "trend"]
+    return {"name": name, "columns": columns, "data": [list(col) for col in zip(*points)]}
+
+
+class ForecastRefreshRequest(BaseModel):
+    series: Optional[List[str]] = None
+    force: bool = False
+
+
+@app.post("/forecasts/refresh")
+async def refresh_forecasts(request: Optional[ForecastRefreshRequest] = None):
+    """Refresh registered series now (default: all); refits only those whose data changed unless force."""
+    from app.forecast_store import get_forecast_store
+
+    store = get_forecast_store()
+    names = (request.series if request and request.series else None) or list(store.registry)
+    unknown = [n for n in names if n not in store.registry]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast series: {', '.join(unknown)}")
+    force = bool(request and request.force)
+    outcomes = {}
+    for name in names:
+        outcomes[name] = await asyncio.to_thread(store.refresh, name, force)
+    return {"outcomes": outcomes}
+
+
+class WarmupRequest(BaseModel):
+    agents: Optional[List[str]] = None
+
+
+@app.post("/warmup", status_code=202)
+async def warmup(request: Optional[WarmupRequest] = None):
+    """Preload agents (default: all) in the background; poll GET /warmup for progress."""
+    agents = (request.agents if request and request.agents else None) or parse_agents("all")
+    try:
+        scheduled = start_warmup(agents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"scheduled": scheduled, "agents": warmup_status()}
+
+
+@app.get("/warmup")
+async def get_warmup():
+    return {"agents": warmup_status()}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Admission queue depth, bulkhead occupancy, rejection counters and LLM circuit breakers."""
+    from app.admission import admission_state
+    from app.metrics import metrics
+
+    snapshot = {"admission": admission_state(), **metrics.snapshot()}
+    if "app.hedging" in sys.modules:
+        snapshot["llm_breakers"] = sys.modules["app.hedging"].breaker_states()
+    return snapshot
+
+
 @app.get("/ws/socket.io/")
 async def socket_io_handler():
     """Prevent 404 errors from Socket.IO polling"""
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from anywhere: the app/ and federated/ packages live at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
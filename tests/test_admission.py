@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected, Bulkhead
+
+
+def test_admits_up_to_limit_then_sheds_when_queue_full():
+    async def scenario():
+        ctrl = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+        await ctrl.acquire()
+        queued = asyncio.ensure_future(ctrl.acquire())
+        await asyncio.sleep(0)
+        assert ctrl.queue_depth == 1
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctrl.acquire()
+        assert exc.value.status_code == 503
+        assert exc.value.retry_after >= 1
+        # Releasing hands the slot straight to the queued request
+        ctrl.release()
+        await queued
+        assert ctrl.in_flight == 1 and ctrl.queue_depth == 0
+        ctrl.release()
+        assert ctrl.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_sheds_after_queue_timeout():
+    async def scenario():
+        ctrl = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        await ctrl.acquire()
+        with pytest.raises(AdmissionRejected, match="no capacity"):
+            await ctrl.acquire()
+        assert ctrl.queue_depth == 0
+        ctrl.release()
+        assert ctrl.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        ctrl = AdmissionController(max_in_flight=1, max_queue=4, queue_timeout=5)
+        await ctrl.acquire()
+        waiter = asyncio.ensure_future(ctrl.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert ctrl.queue_depth == 0
+        ctrl.release()
+        assert ctrl.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_bulkhead_rejects_with_429_when_saturated():
+    async def scenario():
+        bulkhead = Bulkhead("Test_Agent", limit=1, max_waiting=1, timeout=5)
+        await bulkhead.aacquire()
+        queued = asyncio.ensure_future(bulkhead.aacquire())
+        await asyncio.sleep(0)
+        assert bulkhead.saturated()
+        with pytest.raises(AdmissionRejected) as exc:
+            await bulkhead.aacquire()
+        assert exc.value.status_code == 429
+        bulkhead.release()
+        await queued
+        assert bulkhead.state()["active"] == 1 and bulkhead.waiting == 0
+        bulkhead.release()
+        assert bulkhead.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_bulkhead_queue_timeout():
+    async def scenario():
+        bulkhead = Bulkhead("Test_Agent", limit=1, max_waiting=4, timeout=0.05)
+        await bulkhead.aacquire()
+        with pytest.raises(AdmissionRejected, match="waited"):
+            await bulkhead.aacquire()
+        assert bulkhead.waiting == 0
+        bulkhead.release()
+
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.coalesce import FollowerTimeout, RequestCoalescer, coalesce_key
+
+
+def test_key_ignores_case_and_whitespace_but_not_session():
+    assert coalesce_key("Total  Salary ", "s1") == coalesce_key("total salary", "s1")
+    assert coalesce_key("total salary", "s1") != coalesce_key("total salary", "s2")
+
+
+def test_concurrent_callers_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        results = await asyncio.gather(*(coalescer.run("k", work) for _ in range(3)))
+        assert [r for r, _ in results] == ["answer"] * 3
+        assert sorted(shared for _, shared in results) == [False, True, True]
+        assert coalescer.in_flight == 0
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_follower_timeout_carries_leader_progress():
+    progress = {"partial": None}
+
+    async def work():
+        progress["partial"] = "halfway"
+        await asyncio.sleep(0.3)
+        return "done"
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        leader = asyncio.ensure_future(coalescer.run("k", work, progress=progress))
+        await asyncio.sleep(0.01)
+        with pytest.raises(FollowerTimeout) as exc:
+            await coalescer.run("k", work, timeout=0.05)
+        assert exc.value.progress == {"partial": "halfway"}
+        # The follower giving up doesn't cancel the leader's execution
+        assert await leader == ("done", False)
+
+    asyncio.run(scenario())
+
+
+def test_execution_cancelled_once_every_caller_left():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def scenario():
+        coalescer = RequestCoalescer()
+        caller = asyncio.ensure_future(coalescer.run("k", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.01)
+        assert coalescer.in_flight == 0
+
+    asyncio.run(scenario())
+    assert cancelled == [True]
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from federated import codec  # noqa: E402
+
+
+def _arrays(seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal((16, 8)).astype(np.float32), rng.standard_normal(5).astype(np.float32)]
+
+
+def test_spec_parse_round_trips():
+    spec = codec.CodecSpec.parse("int8+topk0.05")
+    assert (spec.quant, spec.topk, spec.delta) == ("int8", 0.05, True)  # top-k implies delta
+    assert str(codec.CodecSpec.parse(str(spec))) == str(spec)
+    with pytest.raises(ValueError):
+        codec.CodecSpec.parse("int4")
+
+
+@pytest.mark.parametrize("spec, tol", [("fp32", 0.0), ("fp16", 1e-2), ("int8", 5e-2), ("fp16+delta", 1e-2)])
+def test_dense_round_trip(spec, tol):
+    arrays, reference = _arrays(0), _arrays(1)
+    payload = codec.encode(arrays, codec.CodecSpec.parse(spec), reference=reference, base_round=3, round_num=4)
+    assert codec.is_encoded(payload)
+    header = codec.read_header(payload)
+    assert (header["base_round"], header["round"]) == (3, 4)
+    decoded = codec.decode(payload, reference)
+    assert [d.shape for d in decoded] == [a.shape for a in arrays]
+    assert np.allclose(codec.flatten(decoded), codec.flatten(arrays), atol=tol)
+
+
+def test_plain_arrays_are_not_mistaken_for_payloads():
+    assert not codec.is_encoded(_arrays())
+
+
+@pytest.mark.parametrize("spec", ["int8+topk0.1", "fp16+topk0.5"])
+def test_error_feedback_carries_what_was_dropped(spec):
+    reference = [np.zeros_like(a) for a in _arrays()]
+    encoder = codec.UpdateEncoder(codec.CodecSpec.parse(spec))
+    sent, total = 0.0, 0.0
+    for step in range(5):
+        update = _arrays(step)
+        payload = encoder.encode(update, reference=reference)
+        sent = sent + codec.decode_flat(payload)
+        total = total + codec.flatten(update)
+        # Nothing is lost: what was sent plus what is still owed equals what was produced
+        assert np.allclose(sent + encoder.residual, total, atol=1e-4)
+    # A top-k payload only carries a fraction of the entries
+    assert np.count_nonzero(codec.decode_flat(payload)) < total.size
+
+
+def test_lossless_encoder_keeps_no_residual():
+    encoder = codec.UpdateEncoder(codec.CodecSpec.parse("fp32"))
+    encoder.encode(_arrays())
+    assert encoder.residual is None
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from app.deadline import (  # noqa: E402
+    Deadline,
+    DeadlineExceeded,
+    check_deadline,
+    current_deadline,
+    parse_timeout,
+    with_deadline,
+)
+
+
+def test_expires_after_timeout():
+    deadline = Deadline(0.05)
+    assert not deadline.expired and deadline.remaining() > 0
+    deadline.check("start")
+    time.sleep(0.06)
+    assert deadline.expired and deadline.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded) as exc:
+        deadline.check("llm")
+    assert (exc.value.stage, exc.value.reason) == ("llm", "timeout")
+
+
+def test_cancel_expires_self_and_children_only():
+    parent = Deadline(10)
+    child = parent.child()
+    child.cancel("mispredicted")
+    assert child.expired and not parent.expired
+    other = parent.child()
+    parent.cancel("client_disconnected")
+    with pytest.raises(DeadlineExceeded) as exc:
+        other.check("tool:sql")
+    assert exc.value.reason == "client_disconnected"
+
+
+def test_parse_timeout():
+    assert parse_timeout("2.5") == 2.5
+    assert parse_timeout("100000") == parse_timeout("1e9")  # clamped to MAX_REQUEST_TIMEOUT
+    for bad in ("0", "-1", "nan"):
+        with pytest.raises(ValueError):
+            parse_timeout(bad)
+    with pytest.raises(ValueError):
+        parse_timeout("soon")
+
+
+def test_node_is_skipped_once_expired():
+    calls = []
+
+    @with_deadline("SQL_Agent")
+    def node(state):
+        calls.append(current_deadline())
+        check_deadline("tool:sql")
+        return {"ok": True}
+
+    live = Deadline(10)
+    assert node({"deadline": live}) == {"ok": True}
+    assert calls == [live] and current_deadline() is None
+
+    expired = Deadline(10)
+    expired.cancel("timeout")
+    with pytest.raises(DeadlineExceeded):
+        node({"deadline": expired})
+    assert len(calls) == 1
+
+
+def test_check_deadline_is_noop_outside_requests():
+    assert current_deadline() is None
+    check_deadline("anything")
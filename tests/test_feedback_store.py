@@ -0,0 +1,71 @@
+import json
+import os
+
+from federated.feedback_store import FeedbackStore
+
+
+def _store(tmp_path, **kwargs):
+    kwargs.setdefault("legacy_path", None)
+    return FeedbackStore(str(tmp_path / "feedback.jsonl"), **kwargs)
+
+
+def test_empty_log_reads_nothing(tmp_path):
+    store = _store(tmp_path)
+    assert len(store) == 0
+    assert list(store.read()) == []
+    assert not os.path.exists(store.path)  # reading never creates the log
+
+
+def test_append_dedups_across_handles(tmp_path):
+    writer, other = _store(tmp_path), _store(tmp_path)
+    assert writer.append("q1", "a1")
+    assert not other.append(" q1 ", "a1 ")  # same pair after stripping, seen by another handle
+    assert other.append("q2", "a2")
+    assert writer.extend([{"instruction": "q2", "output": "a2"}, {"instruction": "q3", "output": "a3"}]) == 1
+    for store in (writer, other, _store(tmp_path)):
+        assert len(store) == 3
+        assert [r["instruction"] for r in store.read()] == ["q1", "q2", "q3"]
+
+
+def test_read_from_record_number(tmp_path):
+    store = _store(tmp_path)
+    store.extend([{"instruction": f"q{i}", "output": f"a{i}"} for i in range(5)])
+    reader = _store(tmp_path)
+    assert [r["instruction"] for r in reader.read(2)] == ["q2", "q3", "q4"]
+    assert [r["instruction"] for r in reader.read(1, limit=2)] == ["q1", "q2"]
+    assert list(reader.read(5)) == []
+
+
+def test_reader_sees_records_appended_later(tmp_path):
+    writer, reader = _store(tmp_path), _store(tmp_path)
+    writer.append("q1", "a1")
+    assert len(reader) == 1
+    writer.append("q2", "a2")
+    assert [r["instruction"] for r in reader.read(1)] == ["q2"]
+
+
+def test_torn_tail_is_skipped(tmp_path):
+    store = _store(tmp_path)
+    store.append("q1", "a1")
+    with open(store.path, "ab") as f:
+        f.write(b'{"id": "torn", "instr')  # crashed appender
+    fresh = _store(tmp_path)
+    assert len(fresh) == 1
+    assert fresh.append("q2", "a2")
+    assert [r["instruction"] for r in _store(tmp_path).read()] == ["q1", "q2"]
+
+
+def test_index_sidecar_is_reused(tmp_path):
+    store = _store(tmp_path)
+    store.extend([{"instruction": f"q{i}", "output": "a"} for i in range(3)])
+    assert os.path.getsize(store.index_path) == 3 * 8
+    assert [r["instruction"] for r in _store(tmp_path).read(2)] == ["q2"]
+
+
+def test_seeds_from_legacy_json_once(tmp_path):
+    legacy = tmp_path / "train_data.json"
+    legacy.write_text(json.dumps([{"instruction": "old", "output": "x"}, {"bogus": True}]))
+    store = _store(tmp_path, legacy_path=str(legacy))
+    assert len(store) == 1
+    assert next(store.read())["source"] == "legacy"
+    assert len(_store(tmp_path, legacy_path=str(legacy))) == 1
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from app import forecast_store
+from app.forecast_store import ForecastStore
+
+ROWS = [(f"2024-{m:02d}-01", 100.0 + m) for m in range(1, 13)]
+REGISTRY = {
+    "payroll": {"description": "Total salary paid per month", "sql": "SELECT ds, y FROM payroll",
+                "keywords": ["payroll"], "filters": None, "horizon": 6, "freq": "MS"},
+}
+
+
+@pytest.fixture
+def fits(monkeypatch):
+    """Replace Prophet with a straight line; records (rows, horizon, init) of every fit."""
+    calls = []
+
+    def fake_fit(rows, horizon, freq, init=None):
+        calls.append((len(rows), horizon, init))
+        last = rows[-1][1]
+        points = [(f"2025-{i + 1:02d}-01", last + i + 1, last + i, last + i + 2, last + i + 1) for i in range(horizon)]
+        return points, {"k": 1.0}, init is not None
+
+    monkeypatch.setattr(forecast_store, "fit_prophet", fake_fit)
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_core")  # refresh() reads the request deadline
+    store = ForecastStore(str(tmp_path / "forecasts.sqlite"), registry={k: dict(v) for k, v in REGISTRY.items()})
+    rows = list(ROWS)
+    monkeypatch.setattr(store, "series_rows", lambda name: rows)
+    store.rows = rows
+    return store
+
+
+def test_match_and_requested_periods(tmp_path):
+    store = ForecastStore(str(tmp_path / "f.sqlite"), registry={k: dict(v) for k, v in REGISTRY.items()})
+    assert store.match("Forecast payroll for the next 3 months") == "payroll"
+    assert store.match("What is the payroll?") is None  # not a forecast question
+    assert store.match("Forecast payroll for the sales department") is None  # narrowed: ad-hoc
+    assert store.requested_periods("payroll", "forecast payroll for the next quarter") == 3
+    assert store.requested_periods("payroll", "forecast payroll for 90 days") == 3
+    assert store.requested_periods("payroll", "forecast payroll") == 6
+
+
+def test_answer_is_served_from_the_store(store, fits):
+    first = store.answer("payroll", "forecast payroll for the next 2 months")
+    assert first["periods"] == 2 and len(first["points"]) == 2
+    assert "Materialized series 'payroll'" in first["text"]
+    assert store.answer("payroll", "forecast payroll for 4 months")["periods"] == 4
+    assert len(fits) == 1  # the second question reused the stored fit
+
+
+def test_unchanged_rows_skip_the_refit_and_appended_rows_warm_start(store, fits):
+    assert store.refresh("payroll") == "full"
+    assert store.refresh("payroll", force=False) == "unchanged"
+    store.rows.append(("2025-01-01", 120.0))
+    assert store.refresh("payroll") == "incremental"
+    assert fits[-1][2] == {"k": 1.0}
+
+
+def test_beyond_horizon_falls_back_to_a_live_fit(store, fits):
+    query = "forecast payroll for the next 12 months"
+    assert store.answer("payroll", query) is None
+    live = store.live_answer("payroll", query)
+    assert live["periods"] == 12 and len(live["points"]) == 12
+    assert "fitted live" in live["text"]
+    assert fits == [(len(ROWS), 12, None)]
+    assert store.points("payroll") == []  # live fits aren't stored
+
+
+def test_busy_refresh_serves_the_previous_forecast(store, fits, monkeypatch):
+    assert store.refresh("payroll") == "full"
+    store.rows.append(("2025-01-01", 120.0))
+    monkeypatch.setattr(forecast_store, "FORECAST_LOCK_TIMEOUT", 0.05)
+    with store._locked("payroll", 1) as acquired:
+        assert acquired
+        # Another thread (standing in for another worker) can't get the lock
+        result = {}
+        t = threading.Thread(target=lambda: result.update(
+            answer=store.answer("payroll", "forecast payroll"), outcome=store.refresh("payroll", force=True)))
+        t.start()
+        t.join()
+    assert result["outcome"] == "busy"
+    assert result["answer"]["points"] == [tuple(p) for p in store.points("payroll")]
+    assert len(fits) == 1
+
+
+def test_failed_refresh_is_not_served(store, fits, monkeypatch):
+    def broken(name):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(store, "series_rows", broken)
+    assert store.answer("payroll", "forecast payroll") is None
+    assert store.state("payroll")["error"] == "database is down"
+    with pytest.raises(RuntimeError):
+        store.live_answer("payroll", "forecast payroll")
+
+
+def test_forecast_node_falls_back_to_a_live_fit(store, fits, monkeypatch):
+    pytest.importorskip("langgraph")
+    from app import graph, tables
+
+    saved = []
+    monkeypatch.setattr(graph, "get_forecast_store", lambda: store)
+    monkeypatch.setattr(tables.table_store, "put", lambda table: saved.append(table) or table)
+    out = graph._forecast_series("payroll", {"query": "forecast payroll for the next 12 months"})
+    assert "fitted live" in out["messages"][0].content
+    assert out["forecast_result"] == out["messages"][0].content
+    assert saved[0].total_rows == 12 and out["next"] == "Forecast_Agent"
@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import AIMessage  # noqa: E402
+
+from app import hedging  # noqa: E402
+from app.hedging import CircuitBreaker, HedgedChatModel, ProvidersUnavailable  # noqa: E402
+
+
+class FakeModel:
+    def __init__(self, text, delay=0.0, error=None):
+        self.text, self.delay, self.error = text, delay, error
+        self.calls = 0
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return AIMessage(content=self.text)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(hedging, "_breakers", {})
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("p", failure_threshold=2, cooldown=0.05)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.status == "closed"
+    breaker.record_failure()
+    assert breaker.status == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.status == "half_open"
+    assert not breaker.allow()  # one probe at a time
+    breaker.record_success(0.1)
+    assert breaker.status == "closed" and breaker.failures == 0
+
+
+def test_failed_probe_reopens_and_released_probe_can_retry():
+    breaker = CircuitBreaker("p", failure_threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()  # cancelled attempt: no verdict
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.status == "open" and not breaker.allow()
+
+
+def test_backup_wins_when_primary_is_slow():
+    primary, backup = FakeModel("slow", delay=0.5), FakeModel("fast")
+    model = HedgedChatModel(models=[primary, backup], names=["primary", "backup"], hedge_delay=0.05)
+    started = time.monotonic()
+    assert model.invoke("hi").content == "fast"
+    assert time.monotonic() - started < 0.4
+    assert backup.calls == 1
+
+
+def test_fails_over_without_waiting_for_the_hedge_delay():
+    primary, backup = FakeModel("x", error=RuntimeError("boom")), FakeModel("ok")
+    model = HedgedChatModel(models=[primary, backup], names=["primary", "backup"], hedge_delay=5, max_retries=0)
+    started = time.monotonic()
+    assert model.invoke("hi").content == "ok"
+    assert time.monotonic() - started < 1
+    assert hedging.get_breaker("primary").failures == 1
+
+
+def test_rate_limits_are_retried():
+    class Flaky(FakeModel):
+        def invoke(self, messages, config=None, **kwargs):
+            if self.calls == 0:
+                self.calls += 1
+                raise RuntimeError("429 Too Many Requests")
+            return super().invoke(messages, config, **kwargs)
+
+    flaky = Flaky("ok")
+    model = HedgedChatModel(models=[flaky], names=["only"], max_retries=2)
+    assert model.invoke("hi").content == "ok"
+    assert flaky.calls == 2
+    assert hedging.get_breaker("only").status == "closed"
+
+
+def test_all_circuits_open():
+    model = HedgedChatModel(models=[FakeModel("a")], names=["only"])
+    breaker = hedging.get_breaker("only")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    with pytest.raises(ProvidersUnavailable):
+        model.invoke("hi")
@@ -1,25 +1,42 @@
 import os
 import json
+import math
 import requests
 import streamlit as st
 
-API_URL = "http://127.0.0.1:8000/chat"
-DATA_PATH = os.path.join("federated", "train_data.json")
+from federated.feedback_store import FeedbackStore
+
+API_BASE = os.getenv("SENTINEL_API_URL", "http://127.0.0.1:8000")
+API_URL = f"{API_BASE}/chat"
+TABLE_PAGE_SIZE = 50
+REQUEST_TIMEOUT = 60
+# Ask the server to answer (partially, if need be) a little before we give up waiting
+SERVER_DEADLINE = REQUEST_TIMEOUT - 5
 
 st.set_page_config(page_title="Sentinel V2 - Autonomous AI System", layout="wide")
 
-def save_feedback(user_input: str, ideal_response: str) -> None:
-    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-    try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if not isinstance(data, list):
-                data = []
-    except FileNotFoundError:
-        data = []
-    data.append({"instruction": user_input, "output": ideal_response})
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+@st.cache_resource
+def get_feedback_store() -> FeedbackStore:
+    # One store per server process: keeps the offset index and dedup set warm
+    return FeedbackStore()
+
+def save_feedback(user_input: str, ideal_response: str) -> bool:
+    return get_feedback_store().append(user_input, ideal_response)
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # One keep-alive connection pool shared by every session instead of a new connection per message
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_table_page(table_id: str, offset: int, limit: int) -> dict:
+    resp = get_http_session().get(f"{API_BASE}/tables/{table_id}", params={"offset": offset, "limit": limit}, timeout=30)
+    resp.raise_for_status()
+    return resp.json()
 
 # Sidebar
 st.sidebar.header("System Status")
@@ -39,13 +56,6 @@ if st.sidebar.button("Reset Conversation", type="primary"):
 st.title("Sentinel V2 - Autonomous AI System")
 st.caption("Chat UI powered by Streamlit; backend served by FastAPI.")
 
-# Display chat history
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-
-user_input = st.chat_input("Ask Sentinel...")
-
 def render_response(content: str):
     """Render JSON/Tabular responses nicely; fallback to markdown."""
     try:
@@ -59,18 +69,50 @@ def render_response(content: str):
     except Exception:
         st.markdown(content)
 
+def render_table(table: dict, key: str):
+    """Show one structured SQL result, fetching only the page being viewed."""
+    total = table.get("total_rows", 0)
+    pages = max(1, math.ceil(total / TABLE_PAGE_SIZE))
+    note = " (truncated by the server)" if table.get("truncated") else ""
+    st.caption(f"📊 {total} row(s) × {len(table.get('columns', []))} column(s){note}")
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=f"{key}-page") if pages > 1 else 1
+    try:
+        data = fetch_table_page(table["table_id"], (page - 1) * TABLE_PAGE_SIZE, TABLE_PAGE_SIZE)
+    except requests.RequestException as e:
+        st.warning(f"Could not load table rows: {e}")
+        return
+    st.dataframe(dict(zip(data["columns"], data["data"])), use_container_width=True)
+
+def render_message(msg: dict, key: str):
+    if msg["role"] == "assistant":
+        render_response(msg["content"])
+    else:
+        st.markdown(msg["content"])
+    for i, table in enumerate(msg.get("tables") or []):
+        render_table(table, f"{key}-table{i}")
+
+# Display chat history
+for idx, msg in enumerate(st.session_state.messages):
+    with st.chat_message(msg["role"]):
+        render_message(msg, f"msg{idx}")
+
+user_input = st.chat_input("Ask Sentinel...")
+
 if user_input:
     st.session_state.messages.append({"role": "user", "content": user_input})
     with st.chat_message("user"):
         st.markdown(user_input)
 
     assistant_reply = ""
+    tables = None
     with st.spinner("Contacting backend..."):
         try:
-            resp = requests.post(API_URL, json={"query": user_input}, timeout=60)
+            resp = get_http_session().post(API_URL, json={"query": user_input},
+                                          headers={"X-Sentinel-Timeout": str(SERVER_DEADLINE)}, timeout=REQUEST_TIMEOUT)
             resp.raise_for_status()
             payload = resp.json()
             assistant_reply = payload.get("response", "No response received.")
+            tables = payload.get("tables")
             agent_used = payload.get("agent_used")
             if agent_used:
                 assistant_reply = f"{assistant_reply}\n\n_Agent: {agent_used}_"
@@ -82,9 +124,9 @@ if user_input:
             except Exception:
                 assistant_reply = f"Error contacting backend: {e}"
 
-    st.session_state.messages.append({"role": "assistant", "content": assistant_reply})
+    st.session_state.messages.append({"role": "assistant", "content": assistant_reply, "tables": tables})
     with st.chat_message("assistant"):
-        render_response(assistant_reply)
+        render_message(st.session_state.messages[-1], f"msg{len(st.session_state.messages) - 1}")
 
 # Feedback & Data Collection
 if st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
@@ -102,5 +144,7 @@ if st.session_state.messages and st.session_state.messages[-1]["role"] == "assis
             key="ideal_response_feedback"
         )
         if st.button("💾 Save to Training Data", key="save_feedback_button"):
-            save_feedback(last_user, ideal_response)
-            st.success("✅ Data saved! The model will learn this in the next Federated round.")
+            if save_feedback(last_user, ideal_response):
+                st.success("✅ Data saved! The model will learn this in the next Federated round.")
+            else:
+                st.info("ℹ️ This correction is already in the training data.")